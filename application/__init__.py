@@ -11,6 +11,7 @@ from .converters import *
 
 from .avalanche_ext import *
 from .data_managing import *
+from .inference import *
 from .models import *
 from .resources import *
 from .mongo import *
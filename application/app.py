@@ -7,10 +7,28 @@ from .config import *
 from .database import db
 from .utils import *
 from .converters import *
+from .experiment_queue import experiment_runner
+from .experiment_isolation import experiment_processes
+from .avalanche_ext import checkpoint_writer
+from .experiment_events import experiment_events
+from .inference import model_cache, batch_scheduler, decode_pool, prediction_jobs, result_cache, transform_cache, \
+    deployment_warmer, inflight_requests, latency_recorder, inference_workers
 
 _NAME = get_env('SERVER_NAME', 'SERVER')
 
 
+def preload_deployments(app: Flask):
+    """
+    Loads and warms up all the hot deployments before the server starts accepting requests.
+    """
+    from application.mongo.resources.deployed_models import MongoDeployedModelConfig
+
+    with app.app_context():
+        for config in MongoDeployedModelConfig.hot_deployments():
+            for record in config.warm_up():
+                app.logger.info(f"Warmed up deployment '{config.claas_urn}': {record}")
+
+
 def create_app(config_class=MongoConfig, use_logger=True):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -18,6 +36,20 @@ def create_app(config_class=MongoConfig, use_logger=True):
     db.init_app(app)
     executor.init_app(app)
     linker.init_app(app)
+    model_cache.init_app(app)
+    batch_scheduler.init_app(app)
+    decode_pool.init_app(app)
+    prediction_jobs.init_app(app)
+    result_cache.init_app(app)
+    transform_cache.init_app(app)
+    deployment_warmer.init_app(app)
+    inflight_requests.init_app(app)
+    latency_recorder.init_app(app)
+    inference_workers.init_app(app)
+    experiment_runner.init_app(app)
+    experiment_processes.init_app(app)
+    checkpoint_writer.init_app(app)
+    experiment_events.init_app(app)
 
     # Put HERE the custom converters!
     app.url_map.converters['user'] = UsernameConverter
@@ -28,9 +60,18 @@ def create_app(config_class=MongoConfig, use_logger=True):
 
     from application.routes import blueprints
 
+    from application.routes.auth import rate_limiter
+
+    rate_limiter.init_app(app)
     for bp in blueprints:
         app.register_blueprint(bp)
 
+    if deployment_warmer.preload:
+        preload_deployments(app)
+
+    if experiment_runner.enabled:
+        experiment_runner.start()
+
     if not app.debug and not app.testing:
 
         os.makedirs('logs', exist_ok=True)
@@ -83,4 +124,5 @@ def create_app(config_class=MongoConfig, use_logger=True):
 
 __all__ = [
     'create_app',
+    'preload_deployments',
 ]
\ No newline at end of file
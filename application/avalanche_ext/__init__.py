@@ -1 +1,2 @@
-from .models import *
\ No newline at end of file
+from .models import *
+from .checkpoints import *
@@ -0,0 +1,247 @@
+"""
+Asynchronous per-experience checkpoints of Avalanche strategies.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import copy
+import shutil
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import torch
+from flask import Flask
+
+from application.utils import t, TDesc
+from application.data_managing import BaseDataManager
+
+if t.TYPE_CHECKING:
+    from avalanche.training.templates import SupervisedTemplate
+
+
+CHECKPOINTS_DIR = 'checkpoints'
+CHECKPOINT_FILE_NAME = 'checkpoint.pt'
+
+
+_SCALARS = (bool, int, float, str, type(None))
+
+
+class _NotState(Exception):
+    pass
+
+
+def _to_cpu(obj):
+    """
+    :return: A CPU copy of a (nested dict, list or tuple of) tensors and scalars.
+    :raise _NotState: If obj contains anything else.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    elif isinstance(obj, _SCALARS):
+        return obj
+    elif isinstance(obj, dict):
+        return {key: _to_cpu(value) for key, value in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(value) for value in obj)
+    raise _NotState(type(obj).__name__)
+
+
+def _plugin_state(strategy: SupervisedTemplate, plugin) -> TDesc:
+    """
+    :return: The state of a plugin: its attributes that are tensors or scalars (also in nested
+    containers) and the state dicts of its attributes that have one (e.g. copies of the model).
+    Any other attribute (e.g. datasets, loggers or references to the strategy and its model)
+    is not state and is skipped.
+    """
+    attributes, state_dicts = {}, {}
+    for name, value in vars(plugin).items():
+        if value is strategy or value is strategy.model or value is strategy.optimizer:
+            continue
+        try:
+            if callable(getattr(value, 'state_dict', None)) and callable(getattr(value, 'load_state_dict', None)):
+                state_dicts[name] = _to_cpu(value.state_dict())
+            else:
+                attributes[name] = _to_cpu(value)
+        except _NotState:
+            pass
+    return {'attributes': attributes, 'state_dicts': state_dicts}
+
+
+def _plugin_key(index: int, plugin) -> str:
+    return f"{index}:{type(plugin).__name__}"
+
+
+def _stateful_plugins(strategy: SupervisedTemplate) -> t.Iterator[tuple[str, t.Any]]:
+    # evaluator (with loggers) and clock are not plugin state
+    for i, plugin in enumerate(strategy.plugins):
+        if plugin is not getattr(strategy, 'evaluator', None) and plugin is not getattr(strategy, 'clock', None):
+            yield _plugin_key(i, plugin), plugin
+
+
+def strategy_state(strategy: SupervisedTemplate, experience: int, results: list[TDesc]) -> TDesc:
+    """
+    Takes a snapshot (on CPU) of the state of a strategy after a training experience: model and
+    optimizer state dicts, training clock, plugins state (see _plugin_state) and evaluation
+    results so far. The snapshot is independent of the strategy, which
+    can go on training while it is being written.
+    :param strategy:
+    :param experience: Number of completed training experiences.
+    :param results: Evaluation results of the completed experiences.
+    :return:
+    """
+    plugins = {key: _plugin_state(strategy, plugin) for key, plugin in _stateful_plugins(strategy)}
+    clock = getattr(strategy, 'clock', None)
+    return {
+        'experience': experience,
+        'results': copy.deepcopy(results),
+        'model': _to_cpu(strategy.model.state_dict()),
+        'optimizer': _to_cpu(strategy.optimizer.state_dict()),
+        'clock': {
+            name: value for name, value in vars(clock).items() if isinstance(value, (int, float))
+        } if clock is not None else {},
+        'plugins': plugins,
+    }
+
+
+def load_strategy_state(strategy: SupervisedTemplate, state: TDesc) -> tuple[int, list[TDesc]]:
+    """
+    Restores a strategy from a snapshot taken by strategy_state().
+    :return: A pair (number of completed training experiences, their evaluation results).
+    """
+    strategy.model.load_state_dict(state['model'])
+    strategy.optimizer.load_state_dict(state['optimizer'])
+    clock = getattr(strategy, 'clock', None)
+    if clock is not None:
+        for name, value in state['clock'].items():
+            setattr(clock, name, value)
+    plugins = dict(_stateful_plugins(strategy))
+    for key, plugin_state in state['plugins'].items():
+        plugin = plugins.get(key)
+        if plugin is not None:
+            for name, value in plugin_state['attributes'].items():
+                setattr(plugin, name, value)
+            for name, value in plugin_state['state_dicts'].items():
+                target = getattr(plugin, name, None)
+                if callable(getattr(target, 'load_state_dict', None)):     # e.g. not None since restart
+                    target.load_state_dict(value)
+    return state['experience'], state['results']
+
+
+def checkpoint_dir(model_directory: list[str]) -> list[str]:
+    return model_directory + [CHECKPOINTS_DIR]
+
+
+def _checkpoint_path(model_directory: list[str]) -> str:
+    manager = BaseDataManager.get()
+    return os.path.join(manager.get_root(), *checkpoint_dir(model_directory), CHECKPOINT_FILE_NAME)
+
+
+def has_checkpoint(model_directory: list[str]) -> bool:
+    return os.path.exists(_checkpoint_path(model_directory))
+
+
+def read_checkpoint(model_directory: list[str]) -> TDesc | None:
+    """
+    :return: The last checkpoint of the execution with the given directory, or None if there is none.
+    """
+    fpath = _checkpoint_path(model_directory)
+    if not os.path.exists(fpath):
+        return None
+    return torch.load(fpath, map_location='cpu')
+
+
+def remove_checkpoint(model_directory: list[str]):
+    """
+    Removes the checkpoints of the execution with the given directory (e.g., once its final
+    model has been saved, since a completed execution is never resumed).
+    """
+    manager = BaseDataManager.get()
+    shutil.rmtree(os.path.join(manager.get_root(), *checkpoint_dir(model_directory)), ignore_errors=True)
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints in a background thread, so that training never waits for the disk.
+    Each checkpoint replaces the previous one of the same execution atomically (it is first
+    written to a temporary file), thus a crash while writing leaves the previous one intact.
+    """
+
+    def __init__(self, app: Flask = None, enabled: bool = True):
+        self.enabled = enabled
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.enabled = app.config.get('EXPERIMENT_CHECKPOINTS', self.enabled)
+
+    def _write(self, state: TDesc, model_directory: list[str]):
+        try:
+            dirs = checkpoint_dir(model_directory)
+            BaseDataManager.get().create_subdir(dirs[-1], dirs[:-1])
+            fpath = _checkpoint_path(model_directory)
+            torch.save(state, fpath + '.tmp')
+            os.replace(fpath + '.tmp', fpath)
+            with self._lock:
+                self.written += 1
+        except Exception:
+            traceback.print_exception(*sys.exc_info())
+            with self._lock:
+                self.failed += 1
+
+    def submit(self, strategy: SupervisedTemplate, experience: int, results: list[TDesc],
+               model_directory: list[str] | None) -> Future | None:
+        """
+        Takes a snapshot of the strategy in the calling thread and writes it under the given
+        execution directory in the background.
+        :return: A future of the write, or None if checkpoints are disabled.
+        """
+        if not self.enabled or model_directory is None:
+            return None
+        state = strategy_state(strategy, experience, results)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoints')
+            executor = self._executor
+        return executor.submit(self._write, state, model_directory)
+
+    def wait(self):
+        """
+        Waits for the pending checkpoints to be written.
+        """
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            executor.submit(lambda: None).result()
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'written': self.written,
+                'failed': self.failed,
+            }
+
+
+checkpoint_writer = CheckpointWriter()
+
+
+__all__ = [
+    'CHECKPOINTS_DIR',
+    'CHECKPOINT_FILE_NAME',
+    'strategy_state',
+    'load_strategy_state',
+    'checkpoint_dir',
+    'has_checkpoint',
+    'read_checkpoint',
+    'remove_checkpoint',
+    'CheckpointWriter',
+    'checkpoint_writer',
+]
@@ -54,6 +54,99 @@ class SimpleConfig(object):
 
     EXECUTOR_TYPE = get_env("EXECUTOR_TYPE", 'thread')
 
+    # Persistent queue of experiment runs: whether this server process also runs queued experiments (off by
+    # default, runs are executed by worker.py), how many at once in each process (each gunicorn worker consuming
+    # the queue is a separate node), lease (renewed while running) and retry policy of queued runs, and name of
+    # this node (defaults to host:pid)
+    EXPERIMENT_QUEUE_CONSUMER = bool(get_env("EXPERIMENT_QUEUE_CONSUMER", 0, int))
+    EXPERIMENT_NODE_CONCURRENCY = get_env("EXPERIMENT_NODE_CONCURRENCY", 1, int)
+    EXPERIMENT_QUEUE_POLL_INTERVAL = get_env("EXPERIMENT_QUEUE_POLL_INTERVAL", 2, float)
+    EXPERIMENT_JOB_LEASE = get_env("EXPERIMENT_JOB_LEASE", 60, float)
+    EXPERIMENT_JOB_MAX_ATTEMPTS = get_env("EXPERIMENT_JOB_MAX_ATTEMPTS", 1, int)
+    EXPERIMENT_JOB_RETRY_BACKOFF = get_env("EXPERIMENT_JOB_RETRY_BACKOFF", 30, float)
+    EXPERIMENT_NODE_NAME = get_env("EXPERIMENT_NODE_NAME", None)
+
+    # Experiment runs in the runner thread ('thread') or each in a child process ('process'), with optional caps
+    # on its memory (MB of address space, ignored if CUDA is available) and CPU time (seconds), torch threads and
+    # timeout (seconds) (0 = none)
+    EXPERIMENT_RUN_ISOLATION = get_env("EXPERIMENT_RUN_ISOLATION", 'thread')
+    EXPERIMENT_RUN_MAX_MEMORY_MB = get_env("EXPERIMENT_RUN_MAX_MEMORY_MB", 0, int)
+    EXPERIMENT_RUN_MAX_CPU_SECONDS = get_env("EXPERIMENT_RUN_MAX_CPU_SECONDS", 0, int)
+    EXPERIMENT_RUN_TORCH_THREADS = get_env("EXPERIMENT_RUN_TORCH_THREADS", 0, int)
+    EXPERIMENT_RUN_TIMEOUT = get_env("EXPERIMENT_RUN_TIMEOUT", 0, float)
+
+    # Asynchronous checkpoints of experiment runs after each training experience (for resuming them)
+    EXPERIMENT_CHECKPOINTS = bool(get_env("EXPERIMENT_CHECKPOINTS", 1, int))
+
+    # Live experiment events ('local' for this process only, 'mongo' for standalone workers and isolated runs)
+    EXPERIMENT_EVENTS = bool(get_env("EXPERIMENT_EVENTS", 1, int))
+    EXPERIMENT_EVENTS_BACKEND = get_env("EXPERIMENT_EVENTS_BACKEND", 'local')
+    EXPERIMENT_EVENTS_QUEUE_SIZE = get_env("EXPERIMENT_EVENTS_QUEUE_SIZE", 1000, int)
+    EXPERIMENT_EVENTS_HEARTBEAT = get_env("EXPERIMENT_EVENTS_HEARTBEAT", 15, float)
+
+    # In-process cache of loaded models for predictions
+    MODEL_CACHE_MAX_ENTRIES = get_env("MODEL_CACHE_MAX_ENTRIES", 16, int)
+    MODEL_CACHE_MAX_BYTES = get_env("MODEL_CACHE_MAX_BYTES", 2 * 1024 ** 3, int)
+    EXECUTION_MODEL_CACHE_MAX_BYTES = get_env("EXECUTION_MODEL_CACHE_MAX_BYTES", 512 * 1024 ** 2, int)
+
+    # Dynamic micro-batching of concurrent prediction requests
+    PREDICTION_BATCHING = bool(get_env("PREDICTION_BATCHING", 1, int))
+    PREDICTION_MAX_BATCH_SIZE = get_env("PREDICTION_MAX_BATCH_SIZE", 32, int)
+    PREDICTION_MAX_BATCH_WAIT_MS = get_env("PREDICTION_MAX_BATCH_WAIT_MS", 5, float)
+
+    # Number of files per forward pass of prediction requests in any transfer mode, not only 'zip'
+    # (the next chunk is decoded meanwhile)
+    PREDICTION_ZIP_BATCH_SIZE = get_env("PREDICTION_ZIP_BATCH_SIZE", 64, int)
+
+    # Pool for decoding and transforming prediction inputs ('thread' or 'process', 0 workers for no pool)
+    PREDICTION_DECODE_WORKERS = get_env("PREDICTION_DECODE_WORKERS", 4, int)
+    PREDICTION_DECODE_POOL_TYPE = get_env("PREDICTION_DECODE_POOL_TYPE", 'thread')
+
+    # Server-side batch prediction jobs over data repository folders
+    PREDICTION_JOB_BATCH_SIZE = get_env("PREDICTION_JOB_BATCH_SIZE", 64, int)
+    PREDICTION_JOB_LOADER_WORKERS = get_env("PREDICTION_JOB_LOADER_WORKERS", 2, int)
+    PREDICTION_JOBS_MAX_RETAINED = get_env("PREDICTION_JOBS_MAX_RETAINED", 100, int)
+    # Seconds after which finished jobs and their results are removed, and after which running jobs
+    # with no progress are considered interrupted
+    PREDICTION_JOB_RESULTS_TTL = get_env("PREDICTION_JOB_RESULTS_TTL", 7 * 24 * 3600, int)
+    PREDICTION_JOB_STALE_TIMEOUT = get_env("PREDICTION_JOB_STALE_TIMEOUT", 600, int)
+
+    # Cache of per-file prediction results keyed by model version, transform and input content hash
+    PREDICTION_RESULT_CACHE = bool(get_env("PREDICTION_RESULT_CACHE", 0, int))
+    PREDICTION_RESULT_CACHE_MAX_ENTRIES = get_env("PREDICTION_RESULT_CACHE_MAX_ENTRIES", 10000, int)
+    PREDICTION_RESULT_CACHE_DISK = bool(get_env("PREDICTION_RESULT_CACHE_DISK", 0, int))
+
+    # Maximum number of compiled input transforms kept in memory
+    PREDICTION_TRANSFORM_CACHE_MAX_ENTRIES = get_env("PREDICTION_TRANSFORM_CACHE_MAX_ENTRIES", 256, int)
+
+    # Preloading and warm-up of hot deployments at server start (they are always warmed up after deploys)
+    PREDICTION_PRELOAD_DEPLOYMENTS = bool(get_env("PREDICTION_PRELOAD_DEPLOYMENTS", 0, int))
+    PREDICTION_WARMUP_ITERATIONS = get_env("PREDICTION_WARMUP_ITERATIONS", 3, int)
+
+    # Retirement of replaced deployment versions: maximum wait for in-flight requests, and further delay
+    PREDICTION_DRAIN_TIMEOUT = get_env("PREDICTION_DRAIN_TIMEOUT", 60, float)
+    PREDICTION_RETIRE_DELAY = get_env("PREDICTION_RETIRE_DELAY", 5, float)
+
+    # Per-stage latency histograms of prediction requests, and their echo in a Server-Timing header
+    PREDICTION_LATENCY_STATS = bool(get_env("PREDICTION_LATENCY_STATS", 1, int))
+    PREDICTION_SERVER_TIMING = bool(get_env("PREDICTION_SERVER_TIMING", 0, int))
+
+    # Inference worker processes running forward passes on shared-memory models (0 = in the web process),
+    # torch intra-op threads of each of them (0 = cpu count / processes), and their start method
+    PREDICTION_WORKER_PROCESSES = get_env("PREDICTION_WORKER_PROCESSES", 0, int)
+    PREDICTION_WORKER_THREADS = get_env("PREDICTION_WORKER_THREADS", 0, int)
+    PREDICTION_WORKER_START_METHOD = get_env("PREDICTION_WORKER_START_METHOD", 'spawn')
+
+    # Per-user rate limits (requests per second and burst) of prediction and upload endpoints,
+    # with process-local ('local') or shared ('mongo') counters, and concurrent requests per deployment (0 = no cap)
+    RATE_LIMITS = bool(get_env("RATE_LIMITS", 0, int))
+    RATE_LIMIT_BACKEND = get_env("RATE_LIMIT_BACKEND", 'local')
+    RATE_LIMIT_PREDICT_RATE = get_env("RATE_LIMIT_PREDICT_RATE", 20, float)
+    RATE_LIMIT_PREDICT_BURST = get_env("RATE_LIMIT_PREDICT_BURST", 40, float)
+    RATE_LIMIT_UPLOAD_RATE = get_env("RATE_LIMIT_UPLOAD_RATE", 0.5, float)
+    RATE_LIMIT_UPLOAD_BURST = get_env("RATE_LIMIT_UPLOAD_BURST", 5, float)
+    PREDICTION_MAX_CONCURRENCY = get_env("PREDICTION_MAX_CONCURRENCY", 0, int)
+
 
 # Configuration class for using a SQL database (e.g. PostgreSQL)
 class SQLConfig(SimpleConfig):
@@ -147,6 +147,13 @@ class BaseDataManager:
     def get_file_pointer(self, file_name: str, dir_names: list[str], binary=True) -> t.TextIO | t.BinaryIO | None:
         pass
 
+    @abstractmethod
+    def get_file_info(self, file_name: str, dir_names: list[str]) -> tuple[float, int] | None:
+        """
+        Retrieves (last modification time, size in bytes) of a file, or None if it does not exist.
+        """
+        pass
+
     def read_from_files(self, files: t.Iterable[TFRead],
                         base_dir: list[str] = None, binary=True) -> t.Iterable[TFContent]:
         return FilesContentReader(self, files, base_dir, binary)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import schema as sch
 
-from application.utils import TDesc, TBoolStr, abstractmethod, auto_tboolstr
+from application.utils import TDesc, TBoolStr, Module, abstractmethod, auto_tboolstr
 from application.resources.contexts import ResourceContext
 
 
@@ -12,6 +12,15 @@ class BaseModelDeployer:
     """
     __CONFIGS__: TDesc = {}
 
+    # extension of the stored model artifact (a pickled nn.Module by default)
+    MODEL_EXTENSION = '.pt'
+
+    # inference backend that runs the stored model (see application.inference.InferenceBackend)
+    BACKEND = 'torch'
+
+    # variant name -> suffix of the (pickled) artifacts stored beside the main one, e.g. '<name>.int8.pt'
+    VARIANTS: dict[str, str] = {}
+
     @staticmethod
     def register_model_deployer(name: str = None):
         def registerer(cls):
@@ -41,6 +50,47 @@ class BaseModelDeployer:
                 return name
         return None
 
+    @classmethod
+    def model_file_name(cls, name: str) -> str:
+        return name + cls.MODEL_EXTENSION
+
+    @classmethod
+    def backend_options(cls, data: TDesc) -> TDesc | None:
+        """
+        Options of the inference backend (e.g. session settings) given in the deployment data.
+        """
+        return None
+
+    @classmethod
+    def variant_file_name(cls, name: str, variant: str) -> str:
+        return name + cls.VARIANTS[variant] + BaseModelDeployer.MODEL_EXTENSION
+
+    @classmethod
+    def artifact_file_names(cls, name: str) -> list[str]:
+        """
+        Names of all the files stored by this deployer for a model with the given name.
+        """
+        return [cls.model_file_name(name)] + [cls.variant_file_name(name, variant) for variant in cls.VARIANTS]
+
+    @staticmethod
+    def model_variants() -> dict[str, str]:
+        variants = {}
+        for deployer in BaseModelDeployer.__CONFIGS__.values():
+            variants.update(deployer.VARIANTS)
+        return variants
+
+    @staticmethod
+    def model_extensions() -> list[str]:
+        """
+        Extensions of the model artifacts of all registered deployers, default one last.
+        """
+        extensions = []
+        for deployer in BaseModelDeployer.__CONFIGS__.values():
+            if deployer.MODEL_EXTENSION not in extensions:
+                extensions.append(deployer.MODEL_EXTENSION)
+        extensions.sort(key=lambda ext: ext == BaseModelDeployer.MODEL_EXTENSION)
+        return extensions
+
     @classmethod
     @abstractmethod
     def schema_dict(cls) -> dict:
@@ -56,9 +106,23 @@ class BaseModelDeployer:
         schema.validate(data)
         return True, None
 
+    @classmethod
+    def build_model(cls, data: TDesc, context: ResourceContext) -> tuple[Module | None, str | None]:
+        """
+        Builds the model to deploy without storing it, for deployers that can be used
+        as source of other ones (e.g. TorchScriptExport).
+        :return: A (model, None) pair on success, (None, error message) otherwise.
+        """
+        return None, f"Deployer '{cls.get_key()}' cannot be used as a model source."
+
     @classmethod
     @abstractmethod
-    def deploy_model(cls, data: TDesc, context: ResourceContext, name: str, path: str) -> TBoolStr:
+    def deploy_model(cls, data: TDesc, context: ResourceContext, name: str, path: str,
+                     report: TDesc = None) -> TBoolStr:
+        """
+        Builds and stores the model(s) to deploy.
+        :param report: If given, deployment information (e.g. evaluation results) is stored in it.
+        """
         pass
 
 
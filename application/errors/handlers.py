@@ -188,6 +188,13 @@ ResourceInUse = ServerResponseError(
     "Resource '{resource}' in use by another one.",
 )
 
+# Too Many Requests (429)
+TooManyRequests = ServerResponseError(
+    HTTPStatus.TOO_MANY_REQUESTS,
+    'TooManyRequests',
+    "Too many requests: retry later.",
+)
+
 # Server Errors 500, 503
 InternalFailure = ServerResponseError(
     HTTPStatus.INTERNAL_SERVER_ERROR,
@@ -236,6 +243,7 @@ __all__ = [
     'ResourceNotFound',
     'MissingFile',
     'ResourceInUse',
+    'TooManyRequests',
 
     'InternalFailure',
     'ServiceUnavailable',
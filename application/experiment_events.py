@@ -0,0 +1,220 @@
+"""
+Publish/subscribe of live experiment events, streamed to clients as server-sent events.
+"""
+from __future__ import annotations
+
+import sys
+import json
+import time
+import queue
+import itertools
+import threading
+import traceback
+from contextlib import contextmanager
+from flask import Flask
+
+from .utils import t, TDesc
+
+
+class ExperimentEventBus:
+    """
+    Delivers the events of experiment runs (epoch and experience ends, evaluation results and
+    status transitions) to the subscribers of their channel (the experiment urn). Each
+    subscriber has a bounded queue: a slow subscriber loses its oldest events instead of
+    blocking the publisher (i.e., training). With the 'local' backend (default), events
+    are delivered only within this process; with the 'mongo' backend, they are stored in a
+    capped collection that is tailed by all the server processes, which is needed when runs
+    are executed by standalone workers or isolated child processes.
+    """
+
+    LOCAL = 'local'
+    MONGO = 'mongo'
+
+    END = 'end'     # last event of a run
+
+    _DFL_QUEUE_SIZE = 1000
+    _DFL_HEARTBEAT = 15
+    _TAIL_RETRY = 1
+
+    def __init__(self, app: Flask = None, enabled: bool = True, backend: str = LOCAL,
+                 queue_size: int = _DFL_QUEUE_SIZE, heartbeat: float = _DFL_HEARTBEAT):
+        self.app = app
+        self.enabled = enabled
+        self.backend = backend
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._subscribers: dict[str, set[queue.Queue]] = {}
+        self._ids = itertools.count(1)
+        self._tailer: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.failed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.app = app
+        self.enabled = app.config.get('EXPERIMENT_EVENTS', self.enabled)
+        self.backend = app.config.get('EXPERIMENT_EVENTS_BACKEND', self.backend)
+        if self.backend not in (self.LOCAL, self.MONGO):
+            raise ValueError(f"Unknown experiment events backend '{self.backend}'")
+        self.queue_size = app.config.get('EXPERIMENT_EVENTS_QUEUE_SIZE', self.queue_size)
+        self.heartbeat = app.config.get('EXPERIMENT_EVENTS_HEARTBEAT', self.heartbeat)
+
+    def publish(self, channel: str | None, event: str, data: TDesc = None):
+        """
+        Publishes an event to the subscribers of the given channel. Never raises, since
+        events are not worth failing a run for.
+        """
+        if not self.enabled or channel is None:
+            return
+        try:
+            if self.backend == self.MONGO:
+                from application.mongo.events import MongoExperimentEvent
+
+                MongoExperimentEvent.publish(channel, event, data)    # delivered by the tailers
+            else:
+                self._dispatch({'id': str(next(self._ids)), 'channel': channel, 'event': event, 'data': data})
+            with self._lock:
+                self.published += 1
+        except Exception:
+            traceback.print_exception(*sys.exc_info())
+            with self._lock:
+                self.failed += 1
+
+    def _dispatch(self, message: TDesc):
+        with self._lock:
+            subscribers = list(self._subscribers.get(message['channel'], ()))
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(message)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                        with self._lock:
+                            self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def _tail(self):
+        from application.mongo.events import MongoExperimentEvent
+
+        last_id = None
+        while True:
+            try:
+                with self.app.app_context():
+                    if last_id is None:     # only the events published from now on
+                        last_id = MongoExperimentEvent.last_id()
+                    cursor = MongoExperimentEvent.tail(last_id, self.heartbeat)
+                    while cursor.alive:
+                        for doc in cursor:
+                            last_id = doc['_id']
+                            self._dispatch({
+                                'id': str(doc['_id']), 'channel': doc['channel'],
+                                'event': doc['event'], 'data': doc.get('data'),
+                            })
+            except Exception:
+                traceback.print_exception(*sys.exc_info())
+            time.sleep(self._TAIL_RETRY)   # the cursor dies if the collection is empty
+
+    def _start_tailer(self):
+        with self._lock:
+            if self._tailer is None:
+                self._tailer = threading.Thread(target=self._tail, name='experiment-events', daemon=True)
+                self._tailer.start()
+
+    @contextmanager
+    def subscribe(self, channel: str):
+        """
+        Subscribes to a channel for the duration of the context.
+        :return: The queue of the subscriber.
+        """
+        if self.backend == self.MONGO:
+            self._start_tailer()
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            yield subscriber
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(channel)
+                subscribers.discard(subscriber)
+                if len(subscribers) == 0:
+                    self._subscribers.pop(channel, None)
+
+    def replay(self, channel: str, last_event_id: str | None) -> t.Iterable[TDesc]:
+        """
+        :return: Events of the channel published after the given one and still stored
+        (always none with the 'local' backend).
+        """
+        if last_event_id is None or self.backend != self.MONGO:
+            return []
+        from application.mongo.events import MongoExperimentEvent
+
+        return [event.to_dict() for event in MongoExperimentEvent.since(channel, last_event_id)]
+
+    @staticmethod
+    def format(message: TDesc) -> str:
+        """
+        :return: The message encoded as a server-sent event.
+        """
+        lines = []
+        if message.get('id') is not None:
+            lines.append(f"id: {message['id']}")
+        lines.append(f"event: {message['event']}")
+        lines.append(f"data: {json.dumps(message.get('data'), default=str)}")
+        return '\n'.join(lines) + '\n\n'
+
+    def stream(self, channel: str, snapshot: t.Callable[[], TDesc] = None,
+               last_event_id: str = None) -> t.Iterator[str]:
+        """
+        Encodes the events of a channel as server-sent events until the end of a run (the
+        stream is closed after its 'end' event) or the client disconnects, sending a comment
+        every heartbeat seconds to keep the connection alive (and notice disconnected clients).
+        :param snapshot: Function returning the data of an initial 'status' event (e.g., the current
+        experiment status), called after subscribing so that no transition is lost in between.
+        :param last_event_id: Id of the last event received by a reconnecting client.
+        """
+        with self.subscribe(channel) as subscriber:
+            for message in self.replay(channel, last_event_id):
+                yield self.format(message)
+                if message['event'] == self.END:
+                    return
+            if snapshot is not None:
+                yield self.format({'event': 'status', 'data': snapshot()})
+            while True:
+                try:
+                    message = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield self.format(message)
+                if message['event'] == self.END:
+                    return
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'backend': self.backend,
+                'channels': len(self._subscribers),
+                'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values()),
+                'published': self.published,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+
+experiment_events = ExperimentEventBus()
+
+
+__all__ = [
+    'ExperimentEventBus',
+    'experiment_events',
+]
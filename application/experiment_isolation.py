@@ -0,0 +1,197 @@
+"""
+Execution of experiment runs in dedicated child processes.
+"""
+from __future__ import annotations
+
+import sys
+import pickle
+import signal
+import resource
+import traceback
+import multiprocessing as mp
+from flask import Flask
+
+from .utils import t, TDesc
+
+
+def _apply_limits(max_memory_mb: int, max_cpu_seconds: int, threads: int):
+    # address space, since RSS limits are not enforced by Linux (never applied with CUDA, see init_app)
+    if max_memory_mb > 0:
+        limit = max_memory_mb * 1024 ** 2
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if max_cpu_seconds > 0:     # SIGXCPU at the soft limit, SIGKILL at the hard one
+        resource.setrlimit(resource.RLIMIT_CPU, (max_cpu_seconds, max_cpu_seconds + 5))
+    if threads > 0:
+        import torch
+
+        torch.set_num_threads(threads)
+
+
+def _run_child(config: dict, limits: tuple[int, int, int], username: str, wname: str, name: str,
+               base_dir: list[str], resume_directory: list[str] | None, conn):
+    # Module-level for being usable as a spawned process target
+    try:
+        _apply_limits(*limits)
+        from application import create_app
+        from application.resources.base import DataType
+        from application.resources.contexts import UserWorkspaceResourceContext
+        from application.resources.datatypes import BaseCLExperiment
+
+        app = create_app(type('ExperimentProcessConfig', (), config), use_logger=False)
+        with app.app_context():
+            config_type = DataType.get_type(BaseCLExperiment.canonical_typename()).config_type()
+            experiment_config = config_type.get_one(username, wname, name)
+            if experiment_config is None:
+                conn.send((None, None))
+                return
+            # the parent process holds the experiment lock
+            experiment = experiment_config.build(UserWorkspaceResourceContext(username, wname), locked=True)
+            if experiment is None:
+                conn.send((False, "Failed to initialize experiment!"))
+                return
+            success, results = experiment.run(base_dir, resume_directory)
+            conn.send((success, None if success else str(results)))
+    except BaseException as ex:
+        traceback.print_exception(*sys.exc_info())
+        conn.send((False, f"{type(ex).__name__}: {ex}"))
+    finally:
+        conn.close()
+
+
+class ExperimentProcessRunner:
+    """
+    Runs each experiment in a dedicated (spawned) child process, so that memory leaks, deadlocks
+    and native crashes of a run do not affect the server, and runs do not compete for its GIL.
+    Child processes have an optional cap on their memory (address space, only when CUDA is not
+    available) and CPU time, a fixed number of torch threads and a timeout after which they are terminated, and report back only
+    the outcome of the run: the parent keeps the experiment lock and execution status.
+    With 'thread' isolation (default), runs are executed by the calling thread.
+    """
+
+    THREAD = 'thread'
+    PROCESS = 'process'
+
+    _DFL_TIMEOUT = 0
+    _TERMINATE_GRACE = 10
+
+    def __init__(self, app: Flask = None, isolation: str = THREAD, max_memory_mb: int = 0,
+                 max_cpu_seconds: int = 0, threads: int = 0, timeout: float = _DFL_TIMEOUT):
+        self.isolation = isolation
+        self.max_memory_mb = max_memory_mb
+        self.max_cpu_seconds = max_cpu_seconds
+        self.threads = threads
+        self.timeout = timeout
+        self._config: dict[str, t.Any] = {}
+        self.runs = 0
+        self.failures = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.isolation = app.config.get('EXPERIMENT_RUN_ISOLATION', self.isolation)
+        if self.isolation not in (self.THREAD, self.PROCESS):
+            raise ValueError(f"Unknown experiment run isolation '{self.isolation}'")
+        self.max_memory_mb = app.config.get('EXPERIMENT_RUN_MAX_MEMORY_MB', self.max_memory_mb)
+        if self.max_memory_mb > 0 and self._cuda_available():
+            # the CUDA runtime reserves far more virtual address space than the physical memory it uses,
+            # thus any realistic RLIMIT_AS makes its initialization (and every GPU run) fail
+            app.logger.warning("EXPERIMENT_RUN_MAX_MEMORY_MB is ignored since CUDA is available")
+            self.max_memory_mb = 0
+        self.max_cpu_seconds = app.config.get('EXPERIMENT_RUN_MAX_CPU_SECONDS', self.max_cpu_seconds)
+        self.threads = app.config.get('EXPERIMENT_RUN_TORCH_THREADS', self.threads)
+        self.timeout = app.config.get('EXPERIMENT_RUN_TIMEOUT', self.timeout)
+        # configuration of the child processes' application, that does not serve nor run queued experiments
+        self._config = {}
+        for key, value in app.config.items():
+            try:
+                pickle.dumps(value)
+                self._config[key] = value
+            except Exception:
+                pass
+        self._config.update({
+            'EXPERIMENT_QUEUE_CONSUMER': False,
+            'PREDICTION_PRELOAD_DEPLOYMENTS': False,
+            'EXPERIMENT_RUN_ISOLATION': self.THREAD,
+        })
+
+    @staticmethod
+    def _cuda_available() -> bool:
+        import torch
+
+        return torch.cuda.is_available()
+
+    @property
+    def isolated(self) -> bool:
+        return self.isolation == self.PROCESS
+
+    @staticmethod
+    def _exit_reason(exitcode: int) -> str:
+        if exitcode is not None and exitcode < 0:
+            try:
+                return f"killed by {signal.Signals(-exitcode).name}"
+            except ValueError:
+                pass
+        return f"exited with code {exitcode}"
+
+    def run(self, username: str, wname: str, name: str, base_dir: list[str],
+            resume_directory: list[str] = None) -> tuple[bool | None, t.Any]:
+        """
+        Builds and runs an experiment in a child process, waiting for it.
+        :return: The same (success, results) pair of BaseCLExperiment.run(), where results
+        is the error in case of failure.
+        """
+        context = mp.get_context('spawn')
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        limits = (self.max_memory_mb, self.max_cpu_seconds, self.threads)
+        process = context.Process(
+            target=_run_child,
+            args=(self._config, limits, username, wname, name, base_dir, resume_directory, child_conn),
+            name=f"experiment<{username}:{wname}:{name}>",
+        )
+        process.start()
+        child_conn.close()
+        self.runs += 1
+        result = None
+        try:
+            if parent_conn.poll(self.timeout if self.timeout > 0 else None):
+                result = parent_conn.recv()
+            else:
+                result = (False, RuntimeError(f"Experiment run timed out after {self.timeout} seconds"))
+        except EOFError:    # child crashed
+            pass
+        finally:
+            parent_conn.close()
+            process.join(timeout=self._TERMINATE_GRACE)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=self._TERMINATE_GRACE)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+        if result is None:
+            result = (False, RuntimeError(f"Experiment process {self._exit_reason(process.exitcode)}"))
+        if not result[0]:
+            self.failures += 1
+        return result
+
+    def stats(self) -> TDesc:
+        return {
+            'isolation': self.isolation,
+            'max_memory_mb': self.max_memory_mb,
+            'max_cpu_seconds': self.max_cpu_seconds,
+            'threads': self.threads,
+            'timeout': self.timeout,
+            'runs': self.runs,
+            'failures': self.failures,
+        }
+
+
+experiment_processes = ExperimentProcessRunner()
+
+
+__all__ = [
+    'ExperimentProcessRunner',
+    'experiment_processes',
+]
@@ -0,0 +1,196 @@
+"""
+Runner of queued experiment runs.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import socket
+import traceback
+import threading
+from flask import Flask, Response
+
+from .utils import t, TDesc
+
+
+class ExperimentQueueRunner:
+    """
+    Claims queued experiment runs (see MongoExperimentJob) and executes up to concurrency of
+    them at once in this process (a "node" of the queue), renewing their leases while they run.
+    The concurrency is per process: server processes are consumers only if enabled, since
+    every (gunicorn) worker process would otherwise be a separate node.
+    Runs are executed by the task registered with the task() decorator, that is given the
+    claimed job and returns the response to be stored in the experiment execution.
+    """
+
+    _DFL_CONCURRENCY = 1
+    _DFL_LEASE = 60
+    _DFL_POLL_INTERVAL = 2
+    _DFL_RETRY_BACKOFF = 30
+    _DFL_MAX_ATTEMPTS = 1
+
+    def __init__(self, app: Flask = None, enabled: bool = False, concurrency: int = _DFL_CONCURRENCY,
+                 lease: float = _DFL_LEASE, poll_interval: float = _DFL_POLL_INTERVAL,
+                 retry_backoff: float = _DFL_RETRY_BACKOFF, max_attempts: int = _DFL_MAX_ATTEMPTS,
+                 node: str = None):
+        self.app = app
+        self.enabled = enabled
+        self.concurrency = concurrency
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.max_attempts = max_attempts
+        self.node = node or f"{socket.gethostname()}:{os.getpid()}"
+        self._task: t.Callable[[t.Any], Response | None] | None = None
+        self._running: dict[str, t.Any] = {}
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.app = app
+        self.enabled = app.config.get('EXPERIMENT_QUEUE_CONSUMER', self.enabled)
+        self.concurrency = app.config.get('EXPERIMENT_NODE_CONCURRENCY', self.concurrency)
+        self.lease = app.config.get('EXPERIMENT_JOB_LEASE', self.lease)
+        self.poll_interval = app.config.get('EXPERIMENT_QUEUE_POLL_INTERVAL', self.poll_interval)
+        self.retry_backoff = app.config.get('EXPERIMENT_JOB_RETRY_BACKOFF', self.retry_backoff)
+        self.max_attempts = app.config.get('EXPERIMENT_JOB_MAX_ATTEMPTS', self.max_attempts)
+        self.node = app.config.get('EXPERIMENT_NODE_NAME', None) or self.node
+
+    def task(self, f: t.Callable[[t.Any], Response | None]):
+        """
+        Decorator that registers the function executing a claimed job.
+        """
+        self._task = f
+        return f
+
+    def submit(self, owner: str, workspace: str, experiment: str, priority: int = 0, resume_from: int = None):
+        """
+        Queues a run of the given experiment.
+        :param resume_from: If given, the run resumes the last checkpoint of the execution with this id.
+        :return: The queued job.
+        """
+        from application.mongo.resources.experiments import MongoExperimentJob
+
+        job = MongoExperimentJob.submit(owner, workspace, experiment, priority, self.max_attempts, resume_from)
+        self._wakeup.set()  # no need to wait for the next poll if this process is a consumer
+        return job
+
+    def start(self):
+        """
+        Starts claiming jobs in a background thread.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._poll, name='experiment-queue', daemon=True)
+                self._thread.start()
+
+    def stop(self, wait: bool = False):
+        """
+        Stops claiming jobs; if wait is True, also waits for the running ones to complete.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and wait:
+            thread.join()
+
+    def serve_forever(self):
+        """
+        Claims and runs jobs in the calling thread until stop() is called.
+        """
+        self._stopped.clear()
+        self._poll()
+
+    def _poll(self):
+        from application.mongo.resources.experiments import MongoExperimentJob
+
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    MongoExperimentJob.requeue_expired()
+                    while len(self._running) < self.concurrency and not self._stopped.is_set():
+                        job = MongoExperimentJob.claim(self.node, self.lease)
+                        if job is None:
+                            break
+                        with self._lock:
+                            self._running[str(job.id)] = job
+                        threading.Thread(target=self._run, args=(job,), name=f"experiment-job<{job.id}>").start()
+            except Exception:
+                traceback.print_exception(*sys.exc_info())
+            self._wakeup.wait(timeout=self.poll_interval)
+            self._wakeup.clear()
+        while len(self._running) > 0:   # waits for the running jobs
+            self._wakeup.wait(timeout=self.poll_interval)
+            self._wakeup.clear()
+
+    def _heartbeat(self, job, done: threading.Event):
+        while not done.wait(timeout=self.lease / 3):
+            try:
+                with self.app.app_context():
+                    if not job.renew(self.node, self.lease):
+                        self.app.logger.warning(f"Lost the lease of experiment job {job.id}")
+                        return
+            except Exception:
+                traceback.print_exception(*sys.exc_info())
+
+    def _run(self, job):
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job, done), daemon=True).start()
+        success, error = False, None
+        try:
+            with self.app.app_context():
+                response = self._task(job)
+                if response is None:
+                    error = "Experiment run returned no response"
+                else:
+                    success = response.status_code < 400
+                    if not success:
+                        error = (response.get_json(silent=True) or {}).get('message', response.status)
+        except Exception as ex:
+            traceback.print_exception(*sys.exc_info())
+            error = f"{type(ex).__name__}: {ex}"
+        finally:
+            done.set()
+            try:
+                with self.app.app_context():
+                    job.complete(self.node, success, error, backoff=self.retry_backoff)
+            except Exception:
+                traceback.print_exception(*sys.exc_info())
+            with self._lock:
+                self._running.pop(str(job.id), None)
+                if success:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            self._wakeup.set()  # a slot is free
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'node': self.node,
+                'consumer': self.enabled,
+                'started': self._thread is not None,
+                'concurrency': self.concurrency,
+                'running': list(self._running.keys()),
+                'completed': self.completed,
+                'failed': self.failed,
+            }
+
+
+experiment_runner = ExperimentQueueRunner()
+
+
+__all__ = [
+    'ExperimentQueueRunner',
+    'experiment_runner',
+]
@@ -0,0 +1,17 @@
+from .caches import *
+from .transforms import *
+from .results import *
+from .engine import *
+from .backends import *
+from .batching import *
+from .decoding import *
+from .tensors import *
+from .datasets import *
+from .predictors import *
+from .encoding import *
+from .jobs import *
+from .warmup import *
+from .draining import *
+from .latency import *
+from .workers import *
+from .quantization import *
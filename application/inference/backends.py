@@ -0,0 +1,130 @@
+"""
+Inference backends, i.e. runtimes that load a stored model artifact into a callable model.
+"""
+from __future__ import annotations
+
+import torch
+
+from application.utils import t, TDesc, get_device
+
+
+class InferenceBackend:
+    """
+    Base class for inference backends. A backend loads a model artifact into an object
+    that maps an input batch tensor to an output (logits) tensor, so that predictions
+    do not depend on the backend that runs the model.
+    """
+    __BACKENDS__: TDesc = {}
+
+    @staticmethod
+    def register_backend(name: str = None):
+        def registerer(cls):
+            nonlocal name
+            if name is None:
+                name = cls.__name__
+            InferenceBackend.__BACKENDS__[name] = cls
+            return cls
+
+        return registerer
+
+    @classmethod
+    def get_by_name(cls, name: str) -> t.Type[InferenceBackend] | None:
+        return cls.__BACKENDS__.get(name)
+
+    @classmethod
+    def load(cls, model_fd: t.BinaryIO, file_name: str, options: TDesc = None) -> t.Callable:
+        """
+        :param model_fd: File pointer to the model artifact.
+        :param file_name: Name of the model artifact.
+        :param options: Backend options stored with the deployment.
+        :return: The loaded model.
+        """
+        raise NotImplementedError
+
+
+@InferenceBackend.register_backend('torch')
+class TorchBackend(InferenceBackend):
+    """
+    Eager PyTorch: pickled modules ('.pt') or TorchScript archives (any other extension).
+    Options:
+    {
+        "device": <str> (optional, defaults to the training device, e.g. "cpu" for quantized models)
+    }
+    """
+
+    @classmethod
+    def load(cls, model_fd: t.BinaryIO, file_name: str, options: TDesc = None) -> t.Callable:
+        device = (options or {}).get('device') or get_device()
+        if file_name.endswith('.pt'):
+            model = torch.load(model_fd, map_location=device)
+        else:
+            model = torch.jit.load(model_fd, map_location=device)
+        model.eval()
+        return model
+
+
+class OnnxRuntimeModel:
+    """
+    Wrapper of an ONNX Runtime session with the same calling convention of a model.
+    """
+
+    training = False
+    multi_task = False      # exported with a single input, thus forward(x, task_label) is not available
+
+    def __init__(self, session, size_bytes: int = 0):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.size_bytes = size_bytes
+
+    def eval(self):
+        return self
+
+    def __call__(self, inputs: torch.Tensor) -> torch.Tensor:
+        outputs = self.session.run(None, {self.input_name: inputs.detach().cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+
+@InferenceBackend.register_backend('onnxruntime')
+class OnnxRuntimeBackend(InferenceBackend):
+    """
+    ONNX Runtime CPU session. Options:
+    {
+        "intra_op_threads": <int>, (optional)
+        "inter_op_threads": <int>, (optional)
+        "graph_optimization_level": "disable"/"basic"/"extended"/"all" (optional, defaults to "all")
+    }
+    """
+
+    GRAPH_OPTIMIZATION_LEVELS = ('disable', 'basic', 'extended', 'all')
+
+    @classmethod
+    def load(cls, model_fd: t.BinaryIO, file_name: str, options: TDesc = None) -> t.Callable:
+        try:
+            import onnxruntime as ort
+        except ImportError as ex:
+            raise RuntimeError("The 'onnxruntime' backend requires the onnxruntime package") from ex
+        options = options or {}
+        levels = {
+            'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = levels[options.get('graph_optimization_level', 'all')]
+        if options.get('intra_op_threads') is not None:
+            session_options.intra_op_num_threads = options['intra_op_threads']
+        if options.get('inter_op_threads') is not None:
+            session_options.inter_op_num_threads = options['inter_op_threads']
+            session_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        model_bytes = model_fd.read()
+        session = ort.InferenceSession(model_bytes, session_options, providers=['CPUExecutionProvider'])
+        return OnnxRuntimeModel(session, size_bytes=len(model_bytes))
+
+
+__all__ = [
+    'InferenceBackend',
+    'TorchBackend',
+    'OnnxRuntimeModel',
+    'OnnxRuntimeBackend',
+]
@@ -0,0 +1,197 @@
+"""
+Dynamic micro-batching of concurrent prediction requests.
+"""
+from __future__ import annotations
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import torch
+from flask import Flask
+
+from application.utils import t, TDesc, Module
+from .engine import inference_engine
+from .workers import inference_workers
+
+
+class _BatchItem:
+
+    def __init__(self, model: Module, inputs: torch.Tensor, task_labels: torch.Tensor = None):
+        self.model = model
+        self.inputs = inputs
+        self.task_labels = task_labels
+        self.future: Future = Future()
+
+    def compatible(self, other: _BatchItem) -> bool:
+        return self.model is other.model and self.inputs.shape[1:] == other.inputs.shape[1:] \
+            and (self.task_labels is None) == (other.task_labels is None)
+
+
+class _ModelBatcher:
+    """
+    Queue of pending requests for a single model, served by a dedicated worker thread.
+    """
+
+    def __init__(self, scheduler: BatchScheduler, key: str):
+        self.scheduler = scheduler
+        self.key = key
+        self.pending: deque[_BatchItem] = deque()
+        self.condition = threading.Condition(scheduler.lock)
+        self.thread = threading.Thread(target=self._work, name=f"batcher<{key}>", daemon=True)
+        self.batches = 0
+        self.items = 0
+
+    def _collect(self) -> list[_BatchItem] | None:
+        """
+        Waits for a first request, then coalesces compatible requests (same model object and
+        input shape) until either max_batch_size samples are collected or max_wait elapses.
+        Must be called with scheduler lock held.
+        """
+        scheduler = self.scheduler
+        while len(self.pending) == 0:
+            if not self.condition.wait(timeout=scheduler.idle_timeout) and len(self.pending) == 0:
+                scheduler.batchers.pop(self.key, None)
+                return None
+        deadline = time.monotonic() + scheduler.max_wait
+        while True:
+            size = 0
+            for item in self.pending:
+                if item.compatible(self.pending[0]):
+                    size += item.inputs.shape[0]
+            remaining = deadline - time.monotonic()
+            if size >= scheduler.max_batch_size or remaining <= 0:
+                break
+            self.condition.wait(timeout=remaining)
+
+        first = self.pending[0]
+        batch: list[_BatchItem] = []
+        others: list[_BatchItem] = []
+        size = 0
+        while len(self.pending) > 0:
+            item = self.pending.popleft()
+            if item.compatible(first) and (len(batch) == 0 or size + item.inputs.shape[0] <= scheduler.max_batch_size):
+                batch.append(item)
+                size += item.inputs.shape[0]
+            else:
+                others.append(item)
+        self.pending.extendleft(reversed(others))
+        return batch
+
+    def _work(self):
+        while True:
+            with self.scheduler.lock:
+                batch = self._collect()
+            if batch is None:
+                return
+            self._run(batch)
+
+    def _run(self, batch: list[_BatchItem]):
+        try:
+            inputs = torch.cat([item.inputs for item in batch])
+            task_labels = None
+            if batch[0].task_labels is not None:
+                task_labels = torch.cat([item.task_labels for item in batch])
+            outputs: torch.Tensor = self.scheduler.forward(batch[0].model, inputs, task_labels, key=self.key)
+            offset = 0
+            for item in batch:
+                length = item.inputs.shape[0]
+                item.future.set_result(outputs[offset:offset + length])
+                offset += length
+            self.batches += 1
+            self.items += len(batch)
+        except Exception as ex:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(ex)
+
+
+class BatchScheduler:
+    """
+    Coalesces forward passes of concurrent requests on the same model into a single batch,
+    up to max_batch_size samples or max_wait seconds after the first pending request, and
+    scatters back the outputs to each caller. Each model (identified by a key, e.g. its
+    claas_urn) gets a worker thread that retires after idle_timeout seconds without requests.
+    """
+
+    _DFL_MAX_BATCH_SIZE = 32
+    _DFL_MAX_WAIT_MS = 5
+    _DFL_IDLE_TIMEOUT = 60
+
+    def __init__(self, app: Flask = None, enabled: bool = True, max_batch_size: int = _DFL_MAX_BATCH_SIZE,
+                 max_wait_ms: float = _DFL_MAX_WAIT_MS, idle_timeout: float = _DFL_IDLE_TIMEOUT):
+        self.enabled = enabled
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.batchers: dict[str, _ModelBatcher] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.enabled = app.config.get('PREDICTION_BATCHING', self.enabled)
+        self.max_batch_size = app.config.get('PREDICTION_MAX_BATCH_SIZE', self.max_batch_size)
+        self.max_wait = app.config.get('PREDICTION_MAX_BATCH_WAIT_MS', self.max_wait * 1000) / 1000
+
+    @staticmethod
+    def forward(model: Module, inputs: torch.Tensor, task_labels: torch.Tensor = None,
+                key: str = None) -> torch.Tensor:
+        # Inputs are moved to the device of the model (e.g. quantized models are CPU-only),
+        # then handed to the inference worker processes if enabled
+        inputs = inputs.to(inference_engine.device(model))
+        return inference_workers.forward(key, model, inputs, task_labels)
+
+    def submit(self, key: str, model: Module, inputs: torch.Tensor, task_labels: torch.Tensor = None) -> Future:
+        item = _BatchItem(model, inputs, task_labels)
+        with self.lock:
+            batcher = self.batchers.get(key)
+            if batcher is None:
+                batcher = _ModelBatcher(self, key)
+                self.batchers[key] = batcher
+                batcher.thread.start()
+            batcher.pending.append(item)
+            batcher.condition.notify()
+        return item.future
+
+    def run(self, model: Module, inputs: torch.Tensor, key: str = None,
+            task_labels: torch.Tensor = None) -> torch.Tensor:
+        """
+        Runs the model on the given inputs batch, coalescing with concurrent requests
+        for the same key if batching is enabled, otherwise directly.
+        :param model:
+        :param inputs: A tensor whose first dimension is the batch one.
+        :param key: Model identifier; if None, batching is skipped.
+        :param task_labels: Task label of each input, for multi-task models.
+        :return: Model outputs for the given inputs only.
+        """
+        if not self.enabled or key is None or inputs.shape[0] >= self.max_batch_size:
+            return self.forward(model, inputs, task_labels, key=key)
+        return self.submit(key, model, inputs, task_labels).result()
+
+    def stats(self) -> TDesc:
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'models': {
+                    key: {
+                        'pending': len(batcher.pending),
+                        'batches': batcher.batches,
+                        'requests': batcher.items,
+                    } for key, batcher in self.batchers.items()
+                },
+            }
+
+
+batch_scheduler = BatchScheduler()
+
+
+__all__ = [
+    'BatchScheduler',
+    'batch_scheduler',
+]
@@ -0,0 +1,230 @@
+"""
+In-process caches of ready-to-run models for the prediction routes.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from flask import Flask
+
+from application.utils import t, TDesc, Module
+
+
+def model_size_bytes(model: Module) -> int:
+    """
+    Approximate resident size of a model (parameters + buffers) in bytes.
+    :param model:
+    :return:
+    """
+    if not isinstance(model, Module):     # e.g. models run by other backends
+        return getattr(model, 'size_bytes', 0)
+    size = sum(p.numel() * p.element_size() for p in model.parameters())
+    size += sum(b.numel() * b.element_size() for b in model.buffers())
+    return size
+
+
+class _CacheEntry:
+
+    def __init__(self, version: t.Hashable, model: Module, size: int, namespace: str = None):
+        self.version = version
+        self.model = model
+        self.size = size
+        self.namespace = namespace
+
+
+class ModelCache:
+    """
+    Thread-safe LRU cache of loaded models, bounded both in number of entries and
+    in total (parameters + buffers) size. Entries are identified by a key (usually
+    a claas_urn) and a version (e.g. (mtime, size) of the model file): a lookup with
+    a different version than the cached one is a miss and replaces the entry.
+    Entries can be grouped into namespaces with their own byte budget: a namespace
+    over budget evicts its own least recently used entries, while the global bounds
+    evict across all namespaces.
+    """
+
+    _DFL_MAX_ENTRIES = 16
+    _DFL_MAX_BYTES = 2 * 1024 ** 3
+
+    # namespace -> configuration key of its byte budget
+    _NAMESPACE_BUDGET_KEYS = {
+        'executions': 'EXECUTION_MODEL_CACHE_MAX_BYTES',
+    }
+
+    def __init__(self, app: Flask = None, max_entries: int = None, max_bytes: int = None):
+        self.max_entries = max_entries if max_entries is not None else self._DFL_MAX_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else self._DFL_MAX_BYTES
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._budgets: dict[str, int] = {}
+        self._namespace_bytes: dict[str, int] = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.max_entries = app.config.get('MODEL_CACHE_MAX_ENTRIES', self.max_entries)
+        self.max_bytes = app.config.get('MODEL_CACHE_MAX_BYTES', self.max_bytes)
+        for namespace, config_key in self._NAMESPACE_BUDGET_KEYS.items():
+            max_bytes = app.config.get(config_key)
+            if max_bytes is not None:
+                self.set_budget(namespace, max_bytes)
+        with self._lock:
+            self._shrink()
+
+    def set_budget(self, namespace: str, max_bytes: int | None):
+        """
+        Sets (or removes, if max_bytes is None) the byte budget of a namespace.
+        :param namespace:
+        :param max_bytes:
+        :return:
+        """
+        with self._lock:
+            if max_bytes is None:
+                self._budgets.pop(namespace, None)
+            else:
+                self._budgets[namespace] = max_bytes
+                self._shrink(namespace)
+
+    def _load_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            lock = self._load_locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._load_locks[key] = lock
+            return lock
+
+    def _lookup(self, key: str, version: t.Hashable) -> Module | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.model
+        return None
+
+    def _remove(self, key: str) -> _CacheEntry | None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.size
+            if entry.namespace is not None:
+                self._namespace_bytes[entry.namespace] -= entry.size
+        return entry
+
+    def _shrink(self, namespace: str = None):
+        budget = self._budgets.get(namespace) if namespace is not None else None
+        if budget is not None:
+            keys = [key for key, entry in self._entries.items() if entry.namespace == namespace]
+            for key in keys:
+                if self._namespace_bytes.get(namespace, 0) <= budget:
+                    break
+                self._remove(key)
+                self.evictions += 1
+        while len(self._entries) > 0 and \
+                (len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def get(self, key: str, version: t.Hashable = None) -> Module | None:
+        with self._lock:
+            model = self._lookup(key, version)
+            if model is None:
+                self.misses += 1
+            return model
+
+    def put(self, key: str, model: Module, version: t.Hashable = None, namespace: str = None) -> Module:
+        size = model_size_bytes(model)
+        with self._lock:
+            self._remove(key)
+            max_bytes = min(self.max_bytes, self._budgets.get(namespace, self.max_bytes))
+            if size <= max_bytes:
+                self._entries[key] = _CacheEntry(version, model, size, namespace)
+                self.current_bytes += size
+                if namespace is not None:
+                    self._namespace_bytes[namespace] = self._namespace_bytes.get(namespace, 0) + size
+                self._shrink(namespace)
+        return model
+
+    def get_or_load(self, key: str, loader: t.Callable[[], Module], version: t.Hashable = None,
+                    namespace: str = None) -> Module:
+        """
+        Returns the cached model for (key, version), or loads it with `loader` and caches it.
+        Concurrent misses on the same key are serialized, so that the model is loaded only once.
+        :param key:
+        :param loader:
+        :param version:
+        :param namespace: Namespace whose byte budget applies to the entry (if any).
+        :return:
+        """
+        with self._lock:
+            model = self._lookup(key, version)
+            if model is not None:
+                return model
+        with self._load_lock(key):
+            with self._lock:
+                model = self._lookup(key, version)
+                if model is not None:
+                    return model
+                self.misses += 1
+            model = loader()
+            return self.put(key, model, version, namespace)
+
+    def invalidate(self, key: str) -> bool:
+        with self._lock:
+            self._load_locks.pop(key, None)
+            return self._remove(key) is not None
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [key for key in self._entries.keys() if key.startswith(prefix)]
+            for key in keys:
+                self.invalidate(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._load_locks.clear()
+            self._namespace_bytes.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'namespaces': {
+                    namespace: {
+                        'bytes': self._namespace_bytes.get(namespace, 0),
+                        'max_bytes': self._budgets.get(namespace),
+                    } for namespace in set(self._budgets.keys()).union(self._namespace_bytes.keys())
+                },
+                'keys': list(self._entries.keys()),
+            }
+
+    def __repr__(self):
+        return f"{type(self).__name__} <{len(self._entries)} entries, {self.current_bytes} bytes>"
+
+    def __str__(self):
+        return self.__repr__()
+
+
+model_cache = ModelCache()
+
+
+__all__ = [
+    'model_size_bytes',
+    'ModelCache',
+    'model_cache',
+]
@@ -0,0 +1,44 @@
+"""
+Datasets over files already stored on the server, for server-side inference.
+"""
+from __future__ import annotations
+
+import os
+
+from torch.utils.data import Dataset
+
+
+class RepositoryFilesDataset(Dataset):
+    """
+    Files of a data repository (given as paths relative to its absolute path), read as
+    bytes and transformed as prediction inputs. The label of each file is the name of its
+    parent folder if it is an integer (as in <root>/<label>/<file>), otherwise -1.
+    Only plain paths are kept, so that the dataset can be sent to DataLoader workers.
+    """
+
+    def __init__(self, base_path: str, files: list[str], transform):
+        self.base_path = base_path
+        self.files = files
+        self.transform = transform
+
+    @staticmethod
+    def label(file: str) -> int:
+        parent = os.path.basename(os.path.dirname(file))
+        try:
+            return int(parent)
+        except ValueError:
+            return -1
+
+    def __getitem__(self, index: int):
+        file = self.files[index]
+        with open(os.path.join(self.base_path, file), 'rb') as fp:
+            data = fp.read()
+        return self.transform(data), self.label(file)
+
+    def __len__(self):
+        return len(self.files)
+
+
+__all__ = [
+    'RepositoryFilesDataset',
+]
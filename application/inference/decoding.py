@@ -0,0 +1,126 @@
+"""
+Shared worker pool for decoding and transforming prediction inputs.
+"""
+from __future__ import annotations
+
+import time
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+import torch
+from flask import Flask
+
+from application.utils import t, TDesc
+
+
+def _timed_transform(transform, data) -> tuple[torch.Tensor, float]:
+    # Module-level for being picklable by process pools
+    start = time.perf_counter()
+    tensor = transform(data)
+    return tensor, time.perf_counter() - start
+
+
+class DecodedBatch:
+    """
+    A batch whose items are being decoded by the pool.
+    """
+
+    def __init__(self, futures: list[Future]):
+        self.futures = futures
+
+    def result(self, timings: TDesc = None) -> torch.Tensor:
+        """
+        Waits for all the items and returns them as a single (N, ...) tensor.
+        :param timings: If given, 'decode' (total worker time) and 'decode_wait'
+        (time spent waiting for the workers) are added to it.
+        :return:
+        """
+        start = time.perf_counter()
+        results = [future.result() for future in self.futures]
+        if timings is not None:
+            timings['decode_wait'] = timings.get('decode_wait', 0.0) + (time.perf_counter() - start)
+            timings['decode'] = timings.get('decode', 0.0) + sum(elapsed for _, elapsed in results)
+        return torch.cat([tensor.unsqueeze(0) for tensor, _ in results])
+
+
+class DecodePool:
+    """
+    Pool of workers for decoding and transforming input files, shared by all requests.
+    Threads are the default since PIL releases the GIL while decoding; processes can
+    be used for transforms that hold it (the transform must then be picklable).
+    With 0 workers, items are decoded synchronously by the caller.
+    """
+
+    THREAD = 'thread'
+    PROCESS = 'process'
+
+    _DFL_WORKERS = 4
+
+    def __init__(self, app: Flask = None, workers: int = _DFL_WORKERS, pool_type: str = THREAD):
+        self.workers = workers
+        self.pool_type = pool_type
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+        self.items = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.workers = app.config.get('PREDICTION_DECODE_WORKERS', self.workers)
+        self.pool_type = app.config.get('PREDICTION_DECODE_POOL_TYPE', self.pool_type)
+        if self.pool_type not in (self.THREAD, self.PROCESS):
+            raise ValueError(f"Unknown decode pool type '{self.pool_type}'")
+        self.shutdown()
+
+    def _get_executor(self) -> Executor | None:
+        # Created lazily, so that (pre-)forked web workers do not share it
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                if self.pool_type == self.PROCESS:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='decode')
+            return self._executor
+
+    def submit(self, transform: t.Callable, items: t.Iterable) -> DecodedBatch:
+        executor = self._get_executor()
+        futures: list[Future] = []
+        for data in items:
+            if executor is not None:
+                futures.append(executor.submit(_timed_transform, transform, data))
+            else:
+                future = Future()
+                future.set_result(_timed_transform(transform, data))
+                futures.append(future)
+        with self._lock:
+            self.items += len(futures)
+        return DecodedBatch(futures)
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pool_type': self.pool_type,
+                'started': self._executor is not None,
+                'items': self.items,
+            }
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+decode_pool = DecodePool()
+
+
+__all__ = [
+    'DecodedBatch',
+    'DecodePool',
+    'decode_pool',
+]
@@ -0,0 +1,126 @@
+"""
+Tracking of in-flight prediction requests, for retiring replaced model versions.
+"""
+from __future__ import annotations
+
+import sys
+import time
+import threading
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import Flask
+
+from application.utils import t, TDesc
+
+
+class RetiredVersionError(RuntimeError):
+    """
+    Raised when tracking a request on a version that has already been retired, i.e. when the
+    request has read the version pointer of a deployment before a concurrent redeploy.
+    """
+    pass
+
+
+class InflightTracker:
+    """
+    Counts in-flight requests per model version key, so that the artifacts and cache
+    entries of a replaced version are retired only after all the requests that were
+    using it have completed (or drain_timeout seconds have elapsed). Since counters are
+    per process, retirement is further delayed by retire_delay seconds, to let requests
+    of other server processes that still point to the old version complete. Requests
+    can no longer be tracked on a drained version (see RetiredVersionError).
+    """
+
+    _DFL_DRAIN_TIMEOUT = 60
+    _DFL_RETIRE_DELAY = 5
+    _MAX_RETIRED = 1024     # retired keys that are remembered
+
+    def __init__(self, app: Flask = None, drain_timeout: float = _DFL_DRAIN_TIMEOUT,
+                 retire_delay: float = _DFL_RETIRE_DELAY):
+        self.drain_timeout = drain_timeout
+        self.retire_delay = retire_delay
+        self._counts: dict[str, int] = {}
+        self._retiring: set[str] = set()
+        self._retired: OrderedDict[str, None] = OrderedDict()
+        self._condition = threading.Condition()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.drain_timeout = app.config.get('PREDICTION_DRAIN_TIMEOUT', self.drain_timeout)
+        self.retire_delay = app.config.get('PREDICTION_RETIRE_DELAY', self.retire_delay)
+
+    @contextmanager
+    def track(self, key: str):
+        """
+        Context manager that marks a request on the given version key as in-flight.
+        :raise RetiredVersionError: If the version has already been retired.
+        """
+        with self._condition:
+            if key in self._retired:
+                raise RetiredVersionError(f"Model version '{key}' has been retired")
+            self._counts[key] = self._counts.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._counts[key] -= 1
+                if self._counts[key] <= 0:
+                    self._counts.pop(key)
+                    self._condition.notify_all()
+
+    def wait_idle(self, key: str, timeout: float = None) -> bool:
+        """
+        Waits until there are no in-flight requests on the given version key.
+        :return: True if drained, False on timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._counts.get(key, 0) == 0, timeout=timeout)
+
+    def _retire(self, key: str, callback: t.Callable[[], t.Any]):
+        try:
+            time.sleep(self.retire_delay)
+            with self._condition:
+                self._condition.wait_for(lambda: self._counts.get(key, 0) == 0, timeout=self.drain_timeout)
+                # no request can start using the version from now on
+                self._retired[key] = None
+                while len(self._retired) > self._MAX_RETIRED:
+                    self._retired.popitem(last=False)
+            callback()
+        except Exception:
+            traceback.print_exception(*sys.exc_info())
+        finally:
+            with self._condition:
+                self._retiring.discard(key)
+
+    def retire(self, key: str, callback: t.Callable[[], t.Any]) -> threading.Thread:
+        """
+        Calls callback in a background thread once the given version key has drained.
+        """
+        with self._condition:
+            self._retiring.add(key)
+        thread = threading.Thread(target=self._retire, args=(key, callback), name=f"retire<{key}>", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> TDesc:
+        with self._condition:
+            return {
+                'drain_timeout': self.drain_timeout,
+                'retire_delay': self.retire_delay,
+                'inflight': dict(self._counts),
+                'retiring': sorted(self._retiring),
+            }
+
+
+inflight_requests = InflightTracker()
+
+
+__all__ = [
+    'RetiredVersionError',
+    'InflightTracker',
+    'inflight_requests',
+]
@@ -0,0 +1,77 @@
+"""
+Compact binary encodings of prediction results.
+"""
+from __future__ import annotations
+
+import io
+import struct
+
+import msgpack
+import numpy as np
+
+from application.utils import t, TDesc
+
+
+JSON = 'json'
+NPY = 'npy'
+MSGPACK = 'msgpack'
+RESPONSE_FORMATS = (JSON, NPY, MSGPACK)
+
+RESPONSE_MIMETYPES = {
+    JSON: 'application/json',
+    NPY: 'application/x-npy',
+    MSGPACK: 'application/x-msgpack',
+}
+
+
+def validate_response_format(fmt: str):
+    """
+    :raise ValueError: If the given response format is unknown.
+    """
+    if fmt not in RESPONSE_FORMATS:
+        raise ValueError(f"Unknown response format '{fmt}'")
+
+
+def results_to_npy(files: t.Sequence[str], class_ids: t.Sequence, scores: t.Sequence | None = None) -> bytes:
+    """
+    Encodes prediction results as a '.npy' structured array with 'file' and 'class_id' fields,
+    or 'file', 'class_ids' and 'scores' fields when class_ids are top-k lists.
+    """
+    name_length = max([len(file) for file in files], default=1)
+    if scores is None:
+        dtype = [('file', f'U{name_length}'), ('class_id', 'i8')]
+        rows = list(zip(files, class_ids))
+    else:
+        top_k = len(class_ids[0]) if len(class_ids) > 0 else 0
+        dtype = [('file', f'U{name_length}'), ('class_ids', 'i8', (top_k,)), ('scores', 'f4', (top_k,))]
+        rows = list(zip(files, class_ids, scores))
+    buffer = io.BytesIO()
+    np.save(buffer, np.array(rows, dtype=dtype))
+    return buffer.getvalue()
+
+
+def results_to_msgpack(files: t.Sequence[str], class_ids: t.Sequence, scores: t.Sequence | None = None,
+                       timings: TDesc = None) -> bytes:
+    """
+    Encodes prediction results as a msgpack map {"files": [...], "class_ids": [...], "scores": [...] | nil,
+    "timings": {...} | nil}, prefixed by its length as a 4-byte big-endian unsigned integer.
+    """
+    payload = msgpack.packb({
+        'files': list(files),
+        'class_ids': list(class_ids),
+        'scores': list(scores) if scores is not None else None,
+        'timings': timings,
+    }, use_bin_type=True)
+    return struct.pack('>I', len(payload)) + payload
+
+
+__all__ = [
+    'JSON',
+    'NPY',
+    'MSGPACK',
+    'RESPONSE_FORMATS',
+    'RESPONSE_MIMETYPES',
+    'validate_response_format',
+    'results_to_npy',
+    'results_to_msgpack',
+]
@@ -0,0 +1,104 @@
+"""
+Execution of forward passes and output post-processing for predictions.
+"""
+from __future__ import annotations
+
+from itertools import chain
+
+import torch
+
+from application.utils import Module
+
+
+class InferenceEngine:
+    """
+    Runs models for predictions under torch.inference_mode() (so that no autograd state
+    is recorded or kept alive) and with the model pinned in eval() mode.
+    """
+
+    @staticmethod
+    def device(model: Module) -> torch.device:
+        """
+        :return: The device on which the model runs, i.e. that of its parameters, or the CPU for
+        models without any (e.g. fully quantized modules and ONNX Runtime models).
+        """
+        if isinstance(model, torch.nn.Module):
+            for tensor in chain(model.parameters(), model.buffers()):
+                return tensor.device
+        return torch.device('cpu')
+
+    @staticmethod
+    def prepare(model: Module) -> Module:
+        if model.training:
+            model.eval()
+        return model
+
+    @staticmethod
+    def check_task_labels(model: Module):
+        """
+        :raise ValueError: If the model does not accept task labels (e.g. an ONNX model).
+        """
+        if not getattr(model, 'multi_task', True):
+            raise ValueError(f"Task labels are not supported by {type(model).__name__} models")
+
+    @classmethod
+    def forward(cls, model: Module, inputs: torch.Tensor, task_labels: torch.Tensor = None) -> torch.Tensor:
+        """
+        :param model: Model to run.
+        :param inputs: Input batch.
+        :param task_labels: If given, a (N,) tensor with the task label of each input, for
+        multi-task (multi-head) models whose forward is forward(x, task_label).
+        """
+        with torch.inference_mode():
+            model = cls.prepare(model)
+            if task_labels is None:
+                return model(inputs)
+            cls.check_task_labels(model)
+            return cls.forward_grouped(model, inputs, task_labels)
+
+    @staticmethod
+    def forward_grouped(model: Module, inputs: torch.Tensor, task_labels: torch.Tensor) -> torch.Tensor:
+        """
+        Runs a multi-task model once per task label, on the contiguous sub-batch of the inputs
+        with that label, and reassembles the outputs in the original order. Heads with fewer
+        classes than the widest one are padded with -inf logits, which are never selected.
+        """
+        task_labels = task_labels.to(inputs.device)
+        labels = torch.unique(task_labels).tolist()
+        if len(labels) == 1:
+            return model(inputs, labels[0])
+        groups = []
+        for label in labels:
+            indices = (task_labels == label).nonzero(as_tuple=True)[0]
+            groups.append((indices, model(inputs[indices], label)))
+        width = max(group_outputs.shape[1] for _, group_outputs in groups)
+        outputs = groups[0][1].new_full((inputs.shape[0], width), float('-inf'))
+        for indices, group_outputs in groups:
+            outputs[indices, :group_outputs.shape[1]] = group_outputs
+        return outputs
+
+    @staticmethod
+    def postprocess(outputs: torch.Tensor, top_k: int = None) -> tuple[torch.Tensor, torch.Tensor | None]:
+        """
+        Converts a batch of logits into class ids.
+        :param outputs: A (N, C) logits tensor.
+        :param top_k: If given, the k most probable classes are returned for each sample
+        together with their softmax scores, otherwise only the argmax.
+        :return: A pair (class ids, scores), with shape (N,) and None if top_k is None,
+        otherwise (N, k) and (N, k).
+        """
+        with torch.inference_mode():
+            if top_k is None:
+                return outputs.argmax(1).cpu(), None
+            top_k = min(top_k, outputs.shape[1])
+            scores, class_ids = torch.softmax(outputs, dim=1).topk(top_k, dim=1)
+            return class_ids.cpu(), scores.cpu()
+
+
+inference_engine = InferenceEngine()
+
+
+__all__ = [
+    'InferenceEngine',
+    'inference_engine',
+]
@@ -0,0 +1,276 @@
+"""
+Asynchronous batch prediction jobs over files already stored on the server.
+"""
+from __future__ import annotations
+
+import io
+import csv
+import sys
+import traceback
+from uuid import uuid4
+from datetime import datetime
+
+import torch
+from flask import Flask
+from torch.utils.data import DataLoader
+
+from application.utils import t, TDesc
+from application.data_managing import BaseDataManager
+
+from .batching import batch_scheduler
+from .datasets import RepositoryFilesDataset
+from .encoding import results_to_npy
+from .engine import inference_engine
+
+
+class PredictionJob:
+    """
+    Prediction of all the files of a data repository folder with a deployed model (with the
+    given task label for multi-head models). Results are
+    written into a file of the workspace predictions directory: a CSV with (file, class id) rows,
+    or a NPY structured array with 'file' and 'class_id' fields ('class_ids' and 'scores' if top_k
+    is given).
+    """
+
+    _STATE = (
+        'id', 'owner', 'workspace', 'deployment', 'data_repository', 'root', 'result_format', 'result_dirs',
+        'top_k', 'variant', 'task_label', 'status', 'total', 'processed', 'error', 'created', 'started', 'ended',
+    )
+
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+
+    CSV = 'csv'
+    NPY = 'npy'
+    FORMATS = (CSV, NPY)
+
+    def __init__(self, owner: str, workspace: str, deployment: str, data_repository: str, root: str,
+                 result_format: str = CSV, top_k: int = None, variant: str = None, task_label: int = None):
+        if result_format not in self.FORMATS:
+            raise ValueError(f"Unknown result format '{result_format}'")
+        self.id = uuid4().hex
+        self.owner = owner
+        self.workspace = workspace
+        self.deployment = deployment
+        self.data_repository = data_repository
+        self.root = root
+        self.result_format = result_format
+        self.top_k = top_k
+        self.variant = variant
+        self.task_label = task_label
+        self.result_dirs: list[str] | None = None
+        self.status = self.QUEUED
+        self.total: int | None = None
+        self.processed = 0
+        self.error: str | None = None
+        self.created = datetime.utcnow()
+        self.started: datetime | None = None
+        self.ended: datetime | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.COMPLETED, self.FAILED)
+
+    @classmethod
+    def from_state(cls, state: TDesc) -> PredictionJob:
+        job = cls.__new__(cls)
+        for name in cls._STATE:
+            setattr(job, name, state.get(name))
+        return job
+
+    def state(self) -> TDesc:
+        """
+        :return: The stored state of the job (as restored by from_state).
+        """
+        return {name: getattr(self, name) for name in self._STATE}
+
+    def result_file_name(self) -> str:
+        return f"{self.id}.{self.result_format}"
+
+    def to_dict(self) -> TDesc:
+        return {
+            'id': self.id,
+            'deployment': self.deployment,
+            'variant': self.variant,
+            'task_label': self.task_label,
+            'data_repository': self.data_repository,
+            'root': self.root,
+            'format': self.result_format,
+            'top_k': self.top_k,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'ended': self.ended,
+        }
+
+    def _write_csv(self, manager: BaseDataManager, result_dirs: list[str], files: list[str],
+                   class_ids: list, scores: list | None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for i, file in enumerate(files):
+            if scores is None:
+                writer.writerow([file, class_ids[i]])
+            else:
+                writer.writerow([file, ' '.join(map(str, class_ids[i])), ' '.join(f"{s:.6f}" for s in scores[i])])
+        result, exc = manager.write_to_file((self.result_file_name(), result_dirs, buffer.getvalue()), binary=False)
+        if not result:
+            raise exc
+
+    def _write_npy(self, manager: BaseDataManager, result_dirs: list[str], files: list[str],
+                   class_ids: list, scores: list | None):
+        content = results_to_npy(files, class_ids, scores)
+        result, exc = manager.write_to_file((self.result_file_name(), result_dirs, content), append=False)
+        if not result:
+            raise exc
+
+    def run(self, model, dataset: RepositoryFilesDataset, result_dirs: list[str],
+            batch_size: int, num_workers: int = 0, report: t.Callable[[PredictionJob], t.Any] = None):
+        """
+        Runs the job, writing its results in the given directory.
+        :param model: Model to use (as returned by the deployment).
+        :param dataset: Dataset of the files to predict.
+        :param result_dirs: Directory (as list of its parents and itself) of the result file.
+        :param batch_size: Number of files per forward pass.
+        :param num_workers: Number of DataLoader worker processes that read and transform files.
+        :param report: If given, called with the job when it starts, after each batch and when it ends.
+        """
+        report = report if report is not None else (lambda job: None)
+        self.status, self.started, self.total = self.RUNNING, datetime.utcnow(), len(dataset)
+        self.result_dirs = result_dirs
+        manager = BaseDataManager.get()
+        try:
+            report(self)
+            result, exc = manager.create_file((self.result_file_name(), [manager.get_root()] + result_dirs, None))
+            if not result:
+                raise exc
+            loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+            all_class_ids, all_scores = [], []
+            for inputs, _ in loader:
+                task_labels = None
+                if self.task_label is not None:
+                    task_labels = torch.full((inputs.shape[0],), self.task_label, dtype=torch.long)
+                outputs = batch_scheduler.run(model, inputs, task_labels=task_labels)
+                class_ids, scores = inference_engine.postprocess(outputs, top_k=self.top_k)
+                class_ids = class_ids.tolist()
+                scores = scores.tolist() if scores is not None else None
+                files = dataset.files[self.processed:self.processed + len(class_ids)]
+                if self.result_format == self.CSV:
+                    self._write_csv(manager, result_dirs, files, class_ids, scores)
+                else:
+                    all_class_ids.extend(class_ids)
+                    if scores is not None:
+                        all_scores.extend(scores)
+                self.processed += len(class_ids)
+                report(self)
+            if self.result_format == self.NPY:
+                self._write_npy(manager, result_dirs, dataset.files, all_class_ids,
+                                all_scores if self.top_k is not None else None)
+            self.status = self.COMPLETED
+        except Exception as ex:
+            traceback.print_exception(*sys.exc_info())
+            self.status, self.error = self.FAILED, f"{type(ex).__name__}: {ex}"
+        finally:
+            self.ended = datetime.utcnow()
+            report(self)
+
+
+class PredictionJobRegistry:
+    """
+    Registry of prediction jobs, whose state is stored in MongoDB so that it is shared by all
+    the server processes. Finished jobs are removed together with their results file after
+    results_ttl seconds, or when their workspace has more than max_retained finished jobs;
+    running jobs whose progress has not been updated for stale_timeout seconds (i.e., whose
+    process died) are marked as failed.
+    """
+
+    _DFL_BATCH_SIZE = 64
+    _DFL_LOADER_WORKERS = 2
+    _DFL_MAX_RETAINED = 100
+    _DFL_RESULTS_TTL = 7 * 24 * 3600
+    _DFL_STALE_TIMEOUT = 600
+
+    def __init__(self, app: Flask = None, batch_size: int = _DFL_BATCH_SIZE,
+                 loader_workers: int = _DFL_LOADER_WORKERS, max_retained: int = _DFL_MAX_RETAINED,
+                 results_ttl: float = _DFL_RESULTS_TTL, stale_timeout: float = _DFL_STALE_TIMEOUT):
+        self.batch_size = batch_size
+        self.loader_workers = loader_workers
+        self.max_retained = max_retained
+        self.results_ttl = results_ttl
+        self.stale_timeout = stale_timeout
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.batch_size = app.config.get('PREDICTION_JOB_BATCH_SIZE', self.batch_size)
+        self.loader_workers = app.config.get('PREDICTION_JOB_LOADER_WORKERS', self.loader_workers)
+        self.max_retained = app.config.get('PREDICTION_JOBS_MAX_RETAINED', self.max_retained)
+        self.results_ttl = app.config.get('PREDICTION_JOB_RESULTS_TTL', self.results_ttl)
+        self.stale_timeout = app.config.get('PREDICTION_JOB_STALE_TIMEOUT', self.stale_timeout)
+
+    @staticmethod
+    def store(job: PredictionJob):
+        from application.mongo.predictions import MongoPredictionJob
+
+        MongoPredictionJob.store(job.state())
+
+    def expire(self, owner: str = None, workspace: str = None) -> int:
+        """
+        Fails stale running jobs and removes expired jobs together with their results file.
+        :return: Number of removed jobs.
+        """
+        from application.mongo.predictions import MongoPredictionJob
+
+        MongoPredictionJob.fail_stale(PredictionJob.RUNNING, PredictionJob.FAILED, self.stale_timeout)
+        expired = MongoPredictionJob.expired(
+            (PredictionJob.COMPLETED, PredictionJob.FAILED), self.results_ttl,
+            owner=owner, workspace=workspace, max_retained=self.max_retained,
+        )
+        manager = BaseDataManager.get()
+        for document in expired:
+            job = PredictionJob.from_state(document.to_dict())
+            try:
+                if job.result_dirs is not None:
+                    manager.delete_file(job.result_file_name(), job.result_dirs)
+            except Exception:
+                traceback.print_exception(*sys.exc_info())
+            document.delete()
+        return len(expired)
+
+    def add(self, job: PredictionJob) -> PredictionJob:
+        self.store(job)
+        self.expire(job.owner, job.workspace)
+        return job
+
+    def get(self, owner: str, workspace: str, job_id: str) -> PredictionJob | None:
+        from application.mongo.predictions import MongoPredictionJob
+
+        document = MongoPredictionJob.get_by_id(job_id)
+        if document is not None and document.owner == owner and document.workspace == workspace:
+            return PredictionJob.from_state(document.to_dict())
+        return None
+
+    def list(self, owner: str, workspace: str) -> list[PredictionJob]:
+        from application.mongo.predictions import MongoPredictionJob
+
+        self.expire()
+        return [PredictionJob.from_state(document.to_dict()) for document in MongoPredictionJob.get_jobs(owner, workspace)]
+
+    def run(self, job: PredictionJob, model, dataset: RepositoryFilesDataset, result_dirs: list[str]):
+        job.run(model, dataset, result_dirs, self.batch_size, self.loader_workers, report=self.store)
+
+
+prediction_jobs = PredictionJobRegistry()
+
+
+__all__ = [
+    'PredictionJob',
+    'PredictionJobRegistry',
+    'prediction_jobs',
+]
@@ -0,0 +1,205 @@
+"""
+Per-stage latency instrumentation of prediction requests.
+"""
+from __future__ import annotations
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import Flask, g, has_app_context
+
+from application.utils import t, TDesc
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of durations: values are counted in logarithmic buckets whose
+    width is a fixed fraction (precision) of their lower bound, so that percentiles have
+    a bounded relative error with constant memory and O(1) recording.
+    """
+
+    _MIN_VALUE = 1e-6   # 1 microsecond
+
+    def __init__(self, precision: float = 0.01):
+        self._log_base = math.log1p(precision)
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _bucket(self, value: float) -> int:
+        return int(math.log(max(value, self._MIN_VALUE) / self._MIN_VALUE) / self._log_base)
+
+    def _bucket_value(self, bucket: int) -> float:
+        # upper bound of the bucket
+        return self._MIN_VALUE * math.exp((bucket + 1) * self._log_base)
+
+    def record(self, value: float):
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float | None:
+        """
+        :param q: Percentile in [0, 100].
+        :return: (An upper bound of) the q-th percentile, or None if no value has been recorded.
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self._bucket_value(bucket), self.max)
+        return self.max
+
+    def summary(self) -> TDesc:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count > 0 else None,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class RequestSpans:
+    """
+    Monotonic per-stage timers of a single request. Durations of a stage that is timed
+    more than once are summed.
+    """
+
+    def __init__(self, key: str = None):
+        self.key = key
+        self.spans: dict[str, float] = {}
+        self.start = time.perf_counter()
+
+    def add(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def update(self, timings: TDesc | None, prefix: str = ''):
+        for name, seconds in (timings or {}).items():
+            self.add(prefix + name, seconds)
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def server_timing(self) -> str:
+        """
+        :return: The value of a 'Server-Timing' header with the spans (in milliseconds).
+        """
+        return ', '.join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.spans.items())
+
+
+def current_spans() -> RequestSpans | None:
+    """
+    :return: The spans of the current request, if it is instrumented.
+    """
+    return g.get('request_spans', None) if has_app_context() else None
+
+
+@contextmanager
+def request_span(name: str):
+    """
+    Times a stage of the current request (no-op if the request is not instrumented).
+    """
+    spans = current_spans()
+    if spans is None:
+        yield
+    else:
+        with spans.span(name):
+            yield
+
+
+class LatencyRecorder:
+    """
+    Aggregates request spans per key (e.g. deployment) and stage into latency histograms.
+    """
+
+    def __init__(self, app: Flask = None, enabled: bool = True, server_timing: bool = False,
+                 precision: float = 0.01):
+        self.enabled = enabled
+        self.server_timing = server_timing
+        self.precision = precision
+        self._histograms: dict[str, dict[str, LatencyHistogram]] = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.enabled = app.config.get('PREDICTION_LATENCY_STATS', self.enabled)
+        self.server_timing = app.config.get('PREDICTION_SERVER_TIMING', self.server_timing)
+
+    def record(self, key: str, spans: dict[str, float]):
+        with self._lock:
+            stages = self._histograms.setdefault(key, {})
+            for name, seconds in spans.items():
+                histogram = stages.get(name)
+                if histogram is None:
+                    histogram = LatencyHistogram(self.precision)
+                    stages[name] = histogram
+                histogram.record(seconds)
+
+    def instrument(self, route: t.Callable) -> t.Callable:
+        """
+        Decorator of prediction routes (to be applied before authentication decorators) that
+        collects the spans of each request into g.request_spans, records them with the key
+        set by the route ('total' is the whole request time) and, if enabled, echoes them in
+        a 'Server-Timing' header.
+        """
+        @wraps(route)
+        def instrumented(*args, **kwargs):
+            if not self.enabled and not self.server_timing:
+                return route(*args, **kwargs)
+            spans = RequestSpans()
+            g.request_spans = spans
+            response = route(*args, **kwargs)
+            spans.add('total', time.perf_counter() - spans.start)
+            if self.enabled and spans.key is not None:
+                self.record(spans.key, spans.spans)
+            if self.server_timing and hasattr(response, 'headers'):
+                response.headers['Server-Timing'] = spans.server_timing()
+            return response
+
+        return instrumented
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'server_timing': self.server_timing,
+                'keys': {
+                    key: {name: histogram.summary() for name, histogram in stages.items()}
+                    for key, stages in self._histograms.items()
+                },
+            }
+
+
+latency_recorder = LatencyRecorder()
+
+
+__all__ = [
+    'LatencyHistogram',
+    'RequestSpans',
+    'current_spans',
+    'request_span',
+    'LatencyRecorder',
+    'latency_recorder',
+]
@@ -0,0 +1,284 @@
+"""
+Common prediction routine for deployed models and experiment executions.
+"""
+from __future__ import annotations
+
+import io
+import time
+from zipfile import ZipFile
+
+import torch
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+
+from application.utils import t, TDesc, Module
+from .batching import batch_scheduler
+from .decoding import DecodedBatch, decode_pool
+from .engine import inference_engine
+from .results import ResultCacheScope
+from .tensors import TENSOR_INPUT_FORMATS, tensor_from_bytes
+
+_DFL_CHUNK_SIZE = 64
+
+
+def _iter_chunks(items: t.Iterable[tuple[str, bytes]], size: int) -> t.Iterator[list[tuple[str, bytes]]]:
+    chunk: list[tuple[str, bytes]] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def _task_labels(names: list[str], task_labels: int | dict[str, int] | None) -> torch.Tensor | None:
+    """
+    :return: A tensor with the task label of each of the given names (0 for names without
+    a label), or None if no task labels are given.
+    """
+    if task_labels is None:
+        return None
+    if isinstance(task_labels, int):
+        return torch.full((len(names),), task_labels, dtype=torch.long)
+    return torch.tensor([int(task_labels.get(name, 0)) for name in names], dtype=torch.long)
+
+
+class _PendingChunk:
+
+    def __init__(self, names: list[str], decoded: DecodedBatch, digests: list[str] = None,
+                 task_labels: torch.Tensor = None):
+        self.names = names
+        self.decoded = decoded
+        self.digests = digests
+        self.task_labels = task_labels
+
+
+def _forward_chunk(model: Module, chunk: _PendingChunk, key: str = None, timings: TDesc = None,
+                   top_k: int = None, scores: TDesc = None,
+                   result_cache: ResultCacheScope = None) -> dict[str, int | list[int]]:
+    batch_tensor = chunk.decoded.result(timings)
+    start = time.perf_counter()
+    outputs: torch.Tensor = batch_scheduler.run(model, batch_tensor, key=key, task_labels=chunk.task_labels)
+    class_ids, chunk_scores = inference_engine.postprocess(outputs, top_k=top_k)
+    class_ids = class_ids.tolist()
+    chunk_scores = chunk_scores.tolist() if chunk_scores is not None else None
+    if timings is not None:
+        timings['forward'] = timings.get('forward', 0.0) + (time.perf_counter() - start)
+    if scores is not None and chunk_scores is not None:
+        scores.update({filename: chunk_scores[i] for i, filename in enumerate(chunk.names)})
+    if result_cache is not None:
+        for i, digest in enumerate(chunk.digests):
+            result_cache.put(digest, (class_ids[i], chunk_scores[i] if chunk_scores is not None else None))
+    return {filename: class_ids[i] for i, filename in enumerate(chunk.names)}
+
+
+def _lookup_chunk(chunk: list[tuple[str, bytes]], result: TDesc, scores: TDesc = None,
+                  result_cache: ResultCacheScope = None,
+                  task_labels: int | dict[str, int] = None) -> tuple[list[tuple[str, bytes]], list[str] | None]:
+    """
+    Fills result (and scores) with the cached results of the given chunk. Entries of the
+    items that are not cached are added too (as None), so that result keeps the input order.
+    :return: The items that are not cached, together with their digests.
+    """
+    if result_cache is None:
+        return chunk, None
+    misses, digests = [], []
+    for name, data in chunk:
+        digest = result_cache.digest(data)
+        if task_labels is not None:     # results of multi-task models depend on the task label
+            digest = f"{digest}:{_task_labels([name], task_labels).item()}"
+        value = result_cache.get(digest)
+        if value is None:
+            result[name] = None     # filled in by _forward_chunk()
+            misses.append((name, data))
+            digests.append(digest)
+        else:
+            result[name] = value[0]
+            if scores is not None and value[1] is not None:
+                scores[name] = value[1]
+    return misses, digests
+
+
+def _predict_pipelined(model: Module, items: t.Iterable[tuple[str, bytes]], transform, chunk_size: int,
+                       key: str = None, timings: TDesc = None, scores: TDesc = None,
+                       result_cache: ResultCacheScope = None, task_labels: int | dict[str, int] = None,
+                       **kwargs) -> dict[str, int | list[int]]:
+    """
+    Two-stage pipeline: while chunk N is forwarded, chunk N+1 is already being read
+    and decoded by the decode pool. Inputs whose results are cached skip both stages.
+    """
+    result: dict[str, int | list[int]] = {}
+    pending: _PendingChunk | None = None
+    chunks = _iter_chunks(items, chunk_size)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        if chunk is not None:
+            chunk, digests = _lookup_chunk(
+                chunk, result, scores=scores, result_cache=result_cache, task_labels=task_labels,
+            )
+        if timings is not None:
+            timings['read'] = timings.get('read', 0.0) + (time.perf_counter() - start)
+        if chunk is None:
+            current = None
+        elif len(chunk) > 0:
+            names = [name for name, _ in chunk]
+            decoded = decode_pool.submit(transform, [data for _, data in chunk])
+            current = _PendingChunk(names, decoded, digests, _task_labels(names, task_labels))
+        else:
+            continue
+        if pending is not None:
+            result.update(_forward_chunk(
+                model, pending, key=key, timings=timings, scores=scores, result_cache=result_cache, **kwargs,
+            ))
+        if current is None:
+            return result
+        pending = current
+
+
+class _ReadyBatch:
+    """
+    Input batch that needs no decoding (same interface of DecodedBatch).
+    """
+
+    def __init__(self, inputs: torch.Tensor):
+        self.inputs = inputs
+
+    def result(self, timings: TDesc = None) -> torch.Tensor:
+        return self.inputs
+
+
+def _predict_tensors(model: Module, items: t.Iterable[tuple[str, bytes]], input_format: str, chunk_size: int,
+                     shape: t.Sequence[int] = None, dtype: str = 'float32', key: str = None,
+                     timings: TDesc = None, task_labels: int | dict[str, int] = None,
+                     **kwargs) -> dict[str, int | list[int]]:
+    """
+    Predicts tensor inputs, which are mapped onto the request bytes and forwarded as they are.
+    Files holding more than one input are forwarded in slices of at most chunk_size inputs
+    (named as <file>[<index>]), while single inputs of consecutive files are stacked together.
+    """
+    result: dict[str, int | list[int]] = {}
+    names: list[str] = []
+    file_names: list[str] = []     # task labels are given per file
+    tensors: list[torch.Tensor] = []
+    count = 0
+
+    def flush():
+        nonlocal names, file_names, tensors, count
+        if count > 0:
+            inputs = tensors[0] if len(tensors) == 1 else torch.cat(tensors)
+            chunk = _PendingChunk(names, _ReadyBatch(inputs), task_labels=_task_labels(file_names, task_labels))
+            result.update(_forward_chunk(model, chunk, key=key, timings=timings, **kwargs))
+        names, file_names, tensors, count = [], [], [], 0
+
+    while True:
+        start = time.perf_counter()
+        item = next(items, None)
+        if timings is not None:
+            timings['read'] = timings.get('read', 0.0) + (time.perf_counter() - start)
+        if item is None:
+            break
+        name, data = item
+        start = time.perf_counter()
+        inputs, batched = tensor_from_bytes(data, input_format, shape=shape, dtype=dtype)
+        if not batched:
+            inputs = inputs.unsqueeze(0)
+        if timings is not None:
+            timings['decode'] = timings.get('decode', 0.0) + (time.perf_counter() - start)
+        input_names = [name] if len(inputs) == 1 else [f"{name}[{i}]" for i in range(len(inputs))]
+        offset = 0
+        while offset < len(inputs):
+            part = inputs[offset:offset + chunk_size - count]
+            tensors.append(part)
+            names.extend(input_names[offset:offset + len(part)])
+            file_names.extend([name] * len(part))
+            offset += len(part)
+            count += len(part)
+            if count >= chunk_size:
+                flush()
+    flush()
+    return result
+
+
+def iter_zip_members(archive: FileStorage) -> t.Iterator[tuple[str, bytes]]:
+    """
+    Iterates over (member name, member bytes) of an uploaded zip archive, decompressing
+    one member at a time. The archive is read directly from the upload stream when it
+    is seekable (as werkzeug upload streams are), so no copy of it is made.
+    """
+    stream = archive.stream
+    if not stream.seekable():
+        stream = io.BytesIO(stream.read())
+    with ZipFile(stream, 'r') as zipf:
+        for info in zipf.infolist():
+            if not info.is_dir():
+                with zipf.open(info, 'r') as member:
+                    yield info.filename, member.read()
+
+
+def predict_files(model: Module, input_data: list[FileStorage], transform, mode: str = 'plain',
+                  key: str = None, chunk_size: int = None, timings: TDesc = None, top_k: int = None,
+                  scores: TDesc = None, result_cache: ResultCacheScope = None, input_format: str = None,
+                  shape: t.Sequence[int] = None, dtype: str = 'float32',
+                  task_labels: int | dict[str, int] = None) -> dict[str, int | list[int]] | NotImplemented:
+    """
+    Predicts class ids for the given uploaded files. Files are processed in chunks,
+    decoding and transforming each chunk in the decode pool while the previous one
+    is being forwarded. Tensor inputs ('npy' or 'raw' input format) skip decoding and
+    transform and are forwarded as they are.
+    :param model: Model to use.
+    :param input_data: Uploaded files (one or more zip archives in 'zip' mode).
+    :param transform: Transform from file bytes to (unbatched) input tensor.
+    :param mode: File transfer mode ('plain' or 'zip').
+    :param key: Model identifier for batching with concurrent requests (e.g. its claas_urn).
+    :param chunk_size: Number of files per forward pass (defaults to PREDICTION_ZIP_BATCH_SIZE).
+    :param timings: If given, per-stage times in seconds ('read', 'decode', 'decode_wait',
+    'forward' and 'total') are stored in it.
+    :param top_k: If given, the top_k most probable class ids are returned for each file.
+    :param scores: If given together with top_k, the softmax scores of the returned class ids
+    are stored in it as filename -> list of scores.
+    :param result_cache: If given, files whose results are cached (by content) skip decoding,
+    transform and forward, and computed results are added to it.
+    :param input_format: If 'npy' or 'raw', files hold already preprocessed input tensors (see
+    tensor_from_bytes) and transform is ignored, otherwise they are decoded by transform.
+    :param shape: Shape of a single tensor input.
+    :param dtype: Element type of 'raw' tensor inputs.
+    :param task_labels: For multi-task (multi-head) models, the task label of all the files or a
+    filename -> task label dictionary (files without a label get task 0). Each chunk is forwarded
+    once per task label, on the inputs with that label.
+    :return: A filename -> class id (list of class ids if top_k is given) dictionary, or NotImplemented
+    if the transfer mode is not supported.
+    """
+    if task_labels is not None:
+        inference_engine.check_task_labels(model)
+    if mode == 'plain':
+        items = ((inp.filename, inp.read()) for inp in input_data)
+    elif mode == 'zip':
+        items = (item for archive in input_data for item in iter_zip_members(archive))
+    else:
+        raise ValueError(f"Unknown file transfer mode '{mode}'")
+    if chunk_size is None:
+        chunk_size = current_app.config.get('PREDICTION_ZIP_BATCH_SIZE', _DFL_CHUNK_SIZE)
+    start = time.perf_counter()
+    if input_format in TENSOR_INPUT_FORMATS:
+        result = _predict_tensors(
+            model, items, input_format, chunk_size, shape=shape, dtype=dtype, key=key, timings=timings,
+            top_k=top_k, scores=scores, task_labels=task_labels,
+        )
+    elif input_format is None:
+        result = _predict_pipelined(
+            model, items, transform, chunk_size, key=key, timings=timings, top_k=top_k, scores=scores,
+            result_cache=result_cache, task_labels=task_labels,
+        )
+    else:
+        raise ValueError(f"Unknown input format '{input_format}'")
+    if timings is not None:
+        timings['total'] = time.perf_counter() - start
+    return result
+
+
+__all__ = [
+    'iter_zip_members',
+    'predict_files',
+]
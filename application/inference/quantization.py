@@ -0,0 +1,109 @@
+"""
+Post-training int8 quantization of models for CPU serving.
+"""
+from __future__ import annotations
+
+import io
+import copy
+from itertools import chain
+
+import torch
+from torch import nn
+
+from application.utils import t, TDesc, Module
+
+DYNAMIC_QUANTIZATION = 'dynamic'
+STATIC_QUANTIZATION = 'static'
+
+QUANTIZATION_MODES = (DYNAMIC_QUANTIZATION, STATIC_QUANTIZATION)
+
+# Layer types quantized by dynamic quantization (weights in int8, activations quantized on the fly)
+_DYNAMIC_LAYERS = {nn.Linear, nn.LSTM, nn.GRU}
+
+
+def serialized_size_bytes(model: Module) -> int:
+    """
+    Size of the model as saved by torch.save(), that (unlike parameters) accounts also
+    for the packed weights of quantized layers.
+    """
+    buffer = io.BytesIO()
+    torch.save(model, buffer)
+    return buffer.getbuffer().nbytes
+
+
+def quantize_dynamic(model: Module) -> Module:
+    """
+    Returns a dynamically quantized copy of the model (Linear/LSTM/GRU layers).
+    """
+    model = copy.deepcopy(model).to('cpu').eval()
+    return torch.ao.quantization.quantize_dynamic(model, _DYNAMIC_LAYERS, dtype=torch.qint8)
+
+
+def quantize_static(model: Module, calibration: t.Iterable[torch.Tensor]) -> Module:
+    """
+    Returns a statically quantized copy of the model (FX graph mode), whose activation
+    ranges are calibrated by running the model on the given input batches.
+    :param model:
+    :param calibration: Iterable of input batches; must contain at least one batch.
+    :return:
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    model = copy.deepcopy(model).to('cpu').eval()
+    batches = iter(calibration)
+    first = next(batches, None)
+    if first is None:
+        raise ValueError("Static quantization requires at least one calibration batch")
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(first,))
+    with torch.no_grad():
+        for batch in chain([first], batches):
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def compare_models(reference: Module, candidate: Module,
+                   batches: t.Iterable[tuple[torch.Tensor, torch.Tensor]]) -> TDesc:
+    """
+    Evaluates a (quantized) candidate against its reference model on the given
+    (inputs, targets) batches, where negative targets denote unlabeled samples.
+    :return: A dictionary with number of samples, top-1 agreement of the two models
+    and, if there are labeled samples, their accuracies and difference.
+    """
+    samples, labeled, agreeing, ref_correct, cand_correct = 0, 0, 0, 0, 0
+    reference, candidate = reference.to('cpu').eval(), candidate.eval()
+    with torch.inference_mode():
+        for inputs, targets in batches:
+            ref_y = reference(inputs).argmax(1)
+            cand_y = candidate(inputs).argmax(1)
+            mask = targets >= 0
+            samples += inputs.shape[0]
+            labeled += int(mask.sum())
+            agreeing += int((ref_y == cand_y).sum())
+            ref_correct += int((ref_y[mask] == targets[mask]).sum())
+            cand_correct += int((cand_y[mask] == targets[mask]).sum())
+    result = {
+        'samples': samples,
+        'labeled_samples': labeled,
+        'agreement': agreeing / samples if samples > 0 else None,
+    }
+    if labeled > 0:
+        result.update({
+            'float_accuracy': ref_correct / labeled,
+            'quantized_accuracy': cand_correct / labeled,
+            'accuracy_delta': (cand_correct - ref_correct) / labeled,
+        })
+    return result
+
+
+__all__ = [
+    'DYNAMIC_QUANTIZATION',
+    'STATIC_QUANTIZATION',
+    'QUANTIZATION_MODES',
+
+    'serialized_size_bytes',
+    'quantize_dynamic',
+    'quantize_static',
+    'compare_models',
+]
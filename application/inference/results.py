@@ -0,0 +1,169 @@
+"""
+Content-addressed cache of prediction results.
+"""
+from __future__ import annotations
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import Flask
+
+from application.utils import t, TDesc
+from application.data_managing import BaseDataManager
+
+from .transforms import canonical_transform_key
+
+
+def transform_hash(transform_data: TDesc | None) -> str:
+    """
+    Hash of a transform configuration (as given in prediction requests), independent of keys order.
+    """
+    return hashlib.sha256(canonical_transform_key(transform_data).encode('utf-8')).hexdigest()
+
+
+class ResultCacheScope:
+    """
+    View of the result cache for a given model (key and version), input transform and top_k,
+    where entries are addressed by the SHA-256 of the input bytes.
+    """
+
+    def __init__(self, cache: PredictionResultCache, namespace: str, version: t.Hashable,
+                 transform_key: str, top_k: int = None, disk_dirs: list[str] = None):
+        self.cache = cache
+        self.namespace = namespace
+        self.prefix = (namespace, str(version), transform_key, top_k)
+        self.disk_dirs = disk_dirs
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _disk_file_name(self, digest: str) -> str:
+        return hashlib.sha256(repr(self.prefix[1:] + (digest,)).encode('utf-8')).hexdigest() + '.json'
+
+    def get(self, digest: str) -> tuple | None:
+        """
+        :return: The cached (class id(s), scores) pair for the given input digest, or None.
+        """
+        return self.cache.get(self.prefix + (digest,), self.disk_dirs, self._disk_file_name(digest))
+
+    def put(self, digest: str, value: tuple):
+        self.cache.put(self.prefix + (digest,), value, self.disk_dirs, self._disk_file_name(digest))
+
+
+class PredictionResultCache:
+    """
+    Two-tier cache of per-file prediction results, keyed by (model key, model version,
+    transform hash, top_k, SHA-256 of the input bytes): a thread-safe in-memory LRU of at
+    most max_entries results and, if enabled, an on-disk tier of small JSON files in the
+    directory given by each scope (e.g. under the workspace models directory).
+    """
+
+    _DFL_MAX_ENTRIES = 10000
+
+    def __init__(self, app: Flask = None, enabled: bool = False, max_entries: int = _DFL_MAX_ENTRIES,
+                 disk: bool = False):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.disk = disk
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.enabled = app.config.get('PREDICTION_RESULT_CACHE', self.enabled)
+        self.max_entries = app.config.get('PREDICTION_RESULT_CACHE_MAX_ENTRIES', self.max_entries)
+        self.disk = app.config.get('PREDICTION_RESULT_CACHE_DISK', self.disk)
+
+    def scope(self, namespace: str, version: t.Hashable, transform_key: str, top_k: int = None,
+              disk_dirs: list[str] = None) -> ResultCacheScope | None:
+        """
+        :return: A scope of this cache, or None if it is disabled.
+        """
+        if not self.enabled:
+            return None
+        return ResultCacheScope(self, namespace, version, transform_key, top_k, disk_dirs if self.disk else None)
+
+    def get(self, key: tuple, disk_dirs: list[str] = None, disk_file_name: str = None) -> tuple | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        if disk_dirs is not None:
+            content = BaseDataManager.get().read_from_file((disk_file_name, disk_dirs, -1), binary=False)
+            if content is not None:
+                value = tuple(json.loads(content))
+                with self._lock:
+                    self.disk_hits += 1
+                self._put_memory(key, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _put_memory(self, key: tuple, value: tuple):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key: tuple, value: tuple, disk_dirs: list[str] = None, disk_file_name: str = None):
+        self._put_memory(key, value)
+        if disk_dirs is not None:
+            manager = BaseDataManager.get()
+            result, exc = manager.create_file((disk_file_name, [manager.get_root()] + disk_dirs, None))
+            if result:
+                manager.write_to_file((disk_file_name, disk_dirs, json.dumps(value)), append=False, binary=False)
+
+    def invalidate(self, namespace: str, separator: str = None, disk_dirs: list[str] = None) -> int:
+        """
+        Removes all the results of the given model key (and of the keys that extend it with
+        the given separator, e.g. model variants), together with the given on-disk tier directory.
+        """
+        with self._lock:
+            keys = [
+                key for key in self._entries.keys()
+                if key[0] == namespace or (separator is not None and key[0].startswith(namespace + separator))
+            ]
+            for key in keys:
+                self._entries.pop(key)
+        if disk_dirs is not None and len(disk_dirs) > 0:
+            BaseDataManager.get().remove_subdir(disk_dirs[-1], parents=disk_dirs[:-1])
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'disk': self.disk,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
+
+
+result_cache = PredictionResultCache()
+
+
+__all__ = [
+    'transform_hash',
+    'ResultCacheScope',
+    'PredictionResultCache',
+    'result_cache',
+]
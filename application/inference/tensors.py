@@ -0,0 +1,90 @@
+"""
+Decoding of already preprocessed prediction inputs sent as raw tensors.
+"""
+from __future__ import annotations
+
+import io
+import warnings
+
+import numpy as np
+import torch
+
+from application.utils import t
+
+
+NPY = 'npy'
+RAW = 'raw'
+TENSOR_INPUT_FORMATS = (NPY, RAW)
+
+TENSOR_DTYPES = ('float32', 'float16', 'float64', 'uint8', 'int8', 'int16', 'int32', 'int64')
+
+MODEL_DTYPE = np.float32    # element type of the inputs of the deployed models
+
+
+def _as_tensor(array: np.ndarray) -> torch.Tensor:
+    if array.dtype.name not in TENSOR_DTYPES:
+        raise ValueError(f"Unsupported dtype '{array.dtype}'")
+    if array.dtype != MODEL_DTYPE:     # copied, only float32 inputs are mapped without copying
+        array = array.astype(MODEL_DTYPE)
+    # Arrays mapped onto request bytes are read-only: they are never written by inference
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        return torch.from_numpy(array)
+
+
+def _npy_array(data: bytes) -> np.ndarray:
+    stream = io.BytesIO(data)
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    if fortran_order or dtype.hasobject:
+        return np.load(io.BytesIO(data), allow_pickle=False)
+    return np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=stream.tell()).reshape(shape)
+
+
+def tensor_from_bytes(data: bytes, input_format: str, shape: t.Sequence[int] = None,
+                      dtype: str = 'float32') -> tuple[torch.Tensor, bool]:
+    """
+    Maps the bytes of a tensor input onto a float32 tensor, without copying them if they are
+    already float32 (other supported dtypes are converted).
+    :param data: File bytes: a '.npy' file ('npy' format) or a C-contiguous buffer ('raw' format).
+    :param input_format: 'npy' or 'raw'.
+    :param shape: Shape of a single input. Required for 'raw' inputs, where the buffer holds one or more
+    inputs of this shape; for 'npy' inputs, if given, an array with this shape is a single input.
+    :param dtype: Element type of 'raw' inputs (one of TENSOR_DTYPES).
+    :return: A pair (tensor, batched), where batched is True if the first dimension of the tensor
+    indexes inputs, and False if the tensor is a single input.
+    :raise ValueError: If the format, dtype or shape do not match the given bytes, or if the
+    dtype of an 'npy' array is not one of TENSOR_DTYPES.
+    """
+    if input_format == NPY:
+        array = _npy_array(data)
+        if shape is not None and tuple(array.shape) == tuple(shape):
+            return _as_tensor(array), False
+        if shape is not None and tuple(array.shape[1:]) != tuple(shape):
+            raise ValueError(f"Array shape {tuple(array.shape)} does not match input shape {tuple(shape)}")
+        return _as_tensor(array), True
+    elif input_format == RAW:
+        if shape is None:
+            raise ValueError("'shape' is required for raw tensor inputs")
+        if dtype not in TENSOR_DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}'")
+        item_size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if item_size == 0 or len(data) % item_size != 0:
+            raise ValueError(f"Buffer of {len(data)} bytes does not hold inputs of shape {tuple(shape)} ({dtype})")
+        array = np.frombuffer(data, dtype=dtype).reshape((len(data) // item_size,) + tuple(shape))
+        return _as_tensor(array), True
+    else:
+        raise ValueError(f"Unknown tensor input format '{input_format}'")
+
+
+__all__ = [
+    'NPY',
+    'RAW',
+    'TENSOR_INPUT_FORMATS',
+    'TENSOR_DTYPES',
+    'MODEL_DTYPE',
+    'tensor_from_bytes',
+]
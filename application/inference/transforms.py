@@ -0,0 +1,94 @@
+"""
+Process-wide cache of compiled input transforms.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from flask import Flask
+
+from application.utils import t, TDesc
+
+
+def canonical_transform_key(transform_data: TDesc | None, scope: t.Sequence[str] = None) -> str:
+    """
+    Canonical JSON of a transform configuration (as given in prediction requests), independent of keys order.
+    :param scope: If given, the context fields the transform is built for (e.g. user and workspace).
+    """
+    if scope is not None:
+        transform_data = {'scope': list(scope), 'transform': transform_data}
+    return json.dumps(transform_data, sort_keys=True, separators=(',', ':'))
+
+
+class CompiledTransformCache:
+    """
+    Thread-safe LRU cache of at most max_entries compiled transforms (i.e. the callables
+    that map input bytes to tensors), keyed by the canonical JSON of their configuration
+    and of the context they are built for, so that a transform is built only once per process.
+    """
+
+    _DFL_MAX_ENTRIES = 256
+
+    def __init__(self, app: Flask = None, max_entries: int = _DFL_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, t.Callable] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.max_entries = app.config.get('PREDICTION_TRANSFORM_CACHE_MAX_ENTRIES', self.max_entries)
+
+    def get_or_compile(self, transform_data: TDesc | None, compiler: t.Callable[[], t.Callable],
+                       scope: t.Sequence[str] = None) -> t.Callable:
+        """
+        :param transform_data: Transform configuration.
+        :param compiler: Callable that builds the transform if it is not cached.
+        :param scope: Context fields the transform may depend on (e.g. user and workspace), so that
+        equal configurations built for different contexts are cached separately.
+        :return: The compiled transform.
+        """
+        key = canonical_transform_key(transform_data, scope)
+        with self._lock:
+            transform = self._entries.get(key)
+            if transform is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return transform
+            self.misses += 1
+        # Compiled outside the lock: concurrent misses for the same key build equivalent transforms
+        transform = compiler()
+        with self._lock:
+            self._entries[key] = transform
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return transform
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+transform_cache = CompiledTransformCache()
+
+
+__all__ = [
+    'canonical_transform_key',
+    'CompiledTransformCache',
+    'transform_cache',
+]
@@ -0,0 +1,119 @@
+"""
+Preloading and warm-up of deployed models.
+"""
+from __future__ import annotations
+
+import sys
+import time
+import threading
+import traceback
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import torch
+from flask import Flask
+
+from application.utils import t, TDesc, Module
+from .batching import batch_scheduler
+
+
+class DeploymentWarmer:
+    """
+    Loads deployed models into the model cache and runs warm-up forward passes on a dummy
+    batch of their expected input shape, so that the first requests after a restart or a
+    deploy do not pay for model loading, lazy kernel initialization and allocator growth.
+    Warm-up times are recorded per model key. Warm-ups triggered by deploys run in a single
+    background thread, so that they do not delay the deploy responses.
+    """
+
+    _DFL_ITERATIONS = 3
+
+    def __init__(self, app: Flask = None, preload: bool = False, iterations: int = _DFL_ITERATIONS):
+        self.preload = preload
+        self.iterations = iterations
+        self._records: dict[str, TDesc] = {}
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.preload = app.config.get('PREDICTION_PRELOAD_DEPLOYMENTS', self.preload)
+        self.iterations = app.config.get('PREDICTION_WARMUP_ITERATIONS', self.iterations)
+
+    def warm(self, key: str, loader: t.Callable[[], Module], input_shape: t.Sequence[int] = None,
+             batch_size: int = 1, task_label: int = None) -> TDesc:
+        """
+        Loads a model and, if input_shape is given, runs warm-up forward passes on a zero batch.
+        :param key: Model identifier (e.g. its model cache key).
+        :param loader: Callable that retrieves the model (through the model cache).
+        :param input_shape: Shape of a single input.
+        :param batch_size: Size of the dummy batch.
+        :param task_label: Task label of the dummy batch, for multi-task models.
+        :return: The warm-up record, with times in seconds.
+        """
+        record: TDesc = {
+            'input_shape': list(input_shape) if input_shape is not None else None,
+            'batch_size': batch_size,
+            'started': datetime.utcnow(),
+            'load': None,
+            'first_forward': None,
+            'forward': None,
+            'error': None,
+        }
+        try:
+            start = time.perf_counter()
+            model = loader()
+            record['load'] = time.perf_counter() - start
+            if input_shape is not None:
+                inputs = torch.zeros((batch_size,) + tuple(input_shape))
+                task_labels = None
+                if task_label is not None:
+                    task_labels = torch.full((batch_size,), task_label, dtype=torch.long)
+                for i in range(max(1, self.iterations)):
+                    start = time.perf_counter()
+                    # not coalesced with requests, but run where requests are (e.g. inference workers)
+                    batch_scheduler.forward(model, inputs, task_labels, key=key)
+                    elapsed = time.perf_counter() - start
+                    if i == 0:
+                        record['first_forward'] = elapsed
+                    record['forward'] = elapsed
+        except Exception as ex:
+            traceback.print_exception(*sys.exc_info())
+            record['error'] = f"{type(ex).__name__}: {ex}"
+        with self._lock:
+            self._records[key] = record
+        return record
+
+    def submit(self, fn: t.Callable, *args, **kwargs) -> Future:
+        """
+        Runs a warm-up callable in the background warm-up thread.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='warmup')
+            executor = self._executor
+        return executor.submit(fn, *args, **kwargs)
+
+    def forget(self, key: str):
+        with self._lock:
+            self._records.pop(key, None)
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'preload': self.preload,
+                'iterations': self.iterations,
+                'models': {key: dict(record) for key, record in self._records.items()},
+            }
+
+
+deployment_warmer = DeploymentWarmer()
+
+
+__all__ = [
+    'DeploymentWarmer',
+    'deployment_warmer',
+]
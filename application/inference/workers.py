@@ -0,0 +1,337 @@
+"""
+Pool of inference processes that run forward passes on models held in shared memory.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import queue
+import itertools
+import threading
+import traceback
+import weakref
+from concurrent.futures import Future
+
+import torch
+import torch.multiprocessing as mp
+from flask import Flask
+
+from application.utils import t, TDesc, Module
+from .engine import inference_engine
+
+
+_LOAD = 'load'
+_FORGET = 'forget'
+_FORWARD = 'forward'
+_NOT_LOADED = 'not-loaded'   # error of forward passes on models whose load message was lost
+
+
+def _worker_main(index: int, threads: int, tasks: mp.Queue, results: mp.Queue):
+    # Module-level for being usable as a spawned process target
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:    # already set
+        pass
+    models: dict[str, Module] = {}
+    while True:
+        try:
+            message = tasks.get()
+        except Exception:   # unpickling failed (e.g. of a model): the message is lost
+            traceback.print_exception(*sys.exc_info())
+            continue
+        if message is None:
+            return
+        kind, key = message[0], message[1]
+        if kind == _LOAD:
+            load_id, model = message[2:]
+            models[key] = model     # parameters are received as shared memory handles
+            results.put((load_id, None, None))  # confirms the load
+        elif kind == _FORGET:
+            models.pop(key, None)
+        elif kind == _FORWARD:
+            task_id, inputs, task_labels = message[2:]
+            model = models.get(key)
+            if model is None:
+                results.put((task_id, None, _NOT_LOADED))
+                continue
+            try:
+                outputs = inference_engine.forward(model, inputs, task_labels)
+                results.put((task_id, outputs, None))
+            except Exception as ex:
+                results.put((task_id, None, f"{type(ex).__name__}: {ex}"))
+
+
+class InferenceWorkerError(RuntimeError):
+    pass
+
+
+class _ModelNotLoaded(InferenceWorkerError):
+    pass
+
+
+class _SentModel:
+
+    def __init__(self, model: Module, load_id: int):
+        self.ref = weakref.ref(model)
+        self.load_id = load_id
+        self.loaded = False     # until the worker confirms the load
+
+
+class _Worker:
+
+    def __init__(self, pool: InferenceWorkerPool, index: int):
+        self.index = index
+        self.tasks = pool.context.Queue()
+        self.process = pool.context.Process(
+            target=_worker_main, args=(index, pool.threads, self.tasks, pool.results),
+            name=f"inference-worker-{index}", daemon=True,
+        )
+        self.models: dict[str, _SentModel] = {}     # models sent to this worker
+        self.pending: set[int] = set()
+        self.forwards = 0
+
+
+class InferenceWorkerPool:
+    """
+    Fixed pool of processes that run the forward passes of all the requests, so that the
+    web process does no model computation while holding the GIL. Models are moved into shared
+    memory (Module.share_memory()) and sent to a worker only as handles the first time it
+    has to run them, so each model is held once in RAM regardless of the number of workers;
+    input and output batches are exchanged through shared memory too. Each worker pins
+    torch intra-op threads to its share of the CPU cores (threads), so that the pool
+    saturates them without oversubscription.
+    Models sent to workers are forgotten by them once released by the web process (e.g.
+    evicted from the model cache or retired). With 0 processes (default), forward passes
+    are run by the calling thread. Only eager modules and CPU inputs are handed to the pool:
+    TorchScript and ONNX Runtime models, as well as models that a worker fails to receive,
+    are run by the calling thread.
+    Models are shared by the workers of the pool of one web process, not across web processes:
+    for keeping RAM flat as concurrency grows, scale the threads of a single web process
+    (e.g. gunicorn gthread workers) rather than the number of web processes.
+    """
+
+    _DFL_PROCESSES = 0
+    _DFL_START_METHOD = 'spawn'     # forking a multi-threaded web process is unsafe with OpenMP
+    _CHECK_INTERVAL = 1.0
+
+    def __init__(self, app: Flask = None, processes: int = _DFL_PROCESSES, threads: int = None,
+                 start_method: str = _DFL_START_METHOD):
+        self.processes = processes
+        self.threads = threads
+        self.start_method = start_method
+        self.context = None
+        self.results: mp.Queue | None = None
+        self._workers: list[_Worker] = []
+        self._futures: dict[int, tuple[Future, _Worker, str]] = {}
+        self._loads: dict[int, tuple[_Worker, str]] = {}
+        self._local: weakref.WeakSet = weakref.WeakSet()    # models that cannot be sent to workers
+        self._ids = itertools.count()
+        self._collector: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.restarts = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.processes = app.config.get('PREDICTION_WORKER_PROCESSES', self.processes)
+        self.threads = app.config.get('PREDICTION_WORKER_THREADS', self.threads) or None
+        self.start_method = app.config.get('PREDICTION_WORKER_START_METHOD', self.start_method)
+        self.shutdown()
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def _start(self):
+        # Started lazily (with lock held), so that (pre-)forked web workers do not share it
+        if self.context is None:
+            self.context = mp.get_context(self.start_method)
+            self.results = self.context.Queue()
+            if self.threads is None:
+                self.threads = max(1, (os.cpu_count() or 1) // self.processes)
+        while len(self._workers) < self.processes:
+            worker = _Worker(self, len(self._workers))
+            worker.process.start()
+            self._workers.append(worker)
+        if self._collector is None:
+            self._collector = threading.Thread(
+                target=self._collect, args=(self.results,), name='inference-collector', daemon=True,
+            )
+            self._collector.start()
+
+    def _collect(self, results: mp.Queue):
+        """
+        Resolves the futures of completed forward passes, and restarts dead workers
+        failing their pending forward passes.
+        """
+        last_check = time.monotonic()
+        while True:
+            try:
+                task_id, outputs, error = results.get(timeout=self._CHECK_INTERVAL)
+            except queue.Empty:
+                task_id = None
+            except (EOFError, OSError, ValueError):     # pool shut down
+                return
+            if time.monotonic() - last_check >= self._CHECK_INTERVAL:
+                self._check_workers()
+                last_check = time.monotonic()
+            if task_id is None:
+                continue
+            with self._lock:
+                if task_id in self._loads:
+                    worker, key = self._loads.pop(task_id)
+                    sent = worker.models.get(key)
+                    if sent is not None and sent.load_id == task_id:
+                        sent.loaded = True
+                    continue
+                future, worker, key = self._futures.pop(task_id, (None, None, None))
+                if worker is not None:
+                    worker.pending.discard(task_id)
+                    if error == _NOT_LOADED:    # the load message was lost: runs the model locally
+                        self._unsend(worker, key)
+            if future is None:
+                continue
+            if error == _NOT_LOADED:
+                future.set_exception(_ModelNotLoaded(f"Model '{key}' could not be sent to inference workers"))
+            elif error is not None:
+                future.set_exception(InferenceWorkerError(error))
+            else:
+                future.set_result(outputs)
+
+    def _check_workers(self):
+        with self._lock:
+            for i, worker in enumerate(self._workers):
+                if worker.process.is_alive():
+                    continue
+                self._fail(worker, f"Inference worker {worker.index} exited with code {worker.process.exitcode}")
+                replacement = _Worker(self, worker.index)
+                replacement.process.start()
+                self._workers[i] = replacement
+                self.restarts += 1
+
+    def _fail(self, worker: _Worker, message: str):
+        # Must be called with lock held
+        for task_id in worker.pending:
+            future, _, _ = self._futures.pop(task_id)
+            future.set_exception(InferenceWorkerError(message))
+        worker.pending.clear()
+        for load_id in [load_id for load_id, (other, _) in self._loads.items() if other is worker]:
+            self._loads.pop(load_id)
+
+    def _unsend(self, worker: _Worker, key: str):
+        # Must be called with lock held
+        sent = worker.models.pop(key, None)
+        if sent is not None:
+            self._loads.pop(sent.load_id, None)
+            model = sent.ref()
+            if model is not None:
+                self._local.add(model)
+
+    def accepts(self, model) -> bool:
+        """
+        :return: True if the model can be run by the pool workers.
+        """
+        return isinstance(model, torch.nn.Module) and not isinstance(model, torch.jit.ScriptModule) \
+            and model not in self._local
+
+    def _select(self) -> _Worker:
+        # Least loaded worker (must be called with lock held)
+        return min(self._workers, key=lambda worker: len(worker.pending))
+
+    def _send_model(self, worker: _Worker, key: str, model: Module):
+        # Must be called with lock held
+        for other_key, sent in list(worker.models.items()):
+            if sent.ref() is None:  # released by the web process
+                worker.tasks.put((_FORGET, other_key))
+                worker.models.pop(other_key)
+                self._loads.pop(sent.load_id, None)
+        sent = worker.models.get(key)
+        if sent is None or sent.ref() is not model:
+            try:
+                model.share_memory()
+            except Exception as ex:
+                self._local.add(model)
+                raise _ModelNotLoaded(f"Model '{key}' cannot be moved into shared memory: {ex}") from ex
+            load_id = next(self._ids)
+            self._loads[load_id] = (worker, key)
+            # pickled by the queue feeder thread: if it fails, the next forward pass reports it
+            worker.tasks.put((_LOAD, key, load_id, model))
+            worker.models[key] = _SentModel(model, load_id)
+
+    def submit(self, key: str, model: Module, inputs: torch.Tensor, task_labels: torch.Tensor = None) -> Future:
+        future = Future()
+        with self._lock:
+            self._start()
+            worker = self._select()
+            self._send_model(worker, key, model)
+            task_id = next(self._ids)
+            self._futures[task_id] = (future, worker, key)
+            worker.pending.add(task_id)
+            worker.forwards += 1
+            worker.tasks.put((_FORWARD, key, task_id, inputs, task_labels))
+        return future
+
+    def forward(self, key: str, model: Module, inputs: torch.Tensor,
+                task_labels: torch.Tensor = None) -> torch.Tensor:
+        """
+        Runs the model on the given inputs in a worker process if the pool is enabled,
+        otherwise directly.
+        :param key: Model identifier (e.g. its claas_urn); if None, the pool is skipped.
+        :param model:
+        :param inputs: Input batch.
+        :param task_labels: Task label of each input, for multi-task models.
+        :return:
+        """
+        if not self.enabled or key is None or inputs.device.type != 'cpu' or not self.accepts(model):
+            return inference_engine.forward(model, inputs, task_labels)
+        try:
+            return self.submit(key, model, inputs, task_labels).result()
+        except _ModelNotLoaded:
+            return inference_engine.forward(model, inputs, task_labels)
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'processes': self.processes,
+                'threads': self.threads,
+                'start_method': self.start_method,
+                'restarts': self.restarts,
+                'local_models': len(self._local),
+                'workers': [
+                    {
+                        'pid': worker.process.pid,
+                        'alive': worker.process.is_alive(),
+                        'models': sum(1 for sent in worker.models.values() if sent.loaded),
+                        'pending': len(worker.pending),
+                        'forwards': worker.forwards,
+                    } for worker in self._workers
+                ],
+            }
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.tasks.put(None)
+            for worker in self._workers:
+                worker.process.join(timeout=5)
+                self._fail(worker, "Inference worker pool shut down")
+            self._workers = []
+            if self.results is not None:
+                self.results.close()
+            self.results = None
+            self._collector = None
+            self.context = None
+
+
+inference_workers = InferenceWorkerPool()
+
+
+__all__ = [
+    'InferenceWorkerError',
+    'InferenceWorkerPool',
+    'inference_workers',
+]
@@ -21,6 +21,10 @@ class Workspace(JSONSerializable, URIBasedResource):
     def models_base_dir() -> str:
         return f"Models"
 
+    @staticmethod
+    def predictions_base_dir() -> str:
+        return f"Predictions"
+
     OPEN = 'OPEN'
     CLOSED = 'CLOSED'
 
@@ -144,6 +148,10 @@ class Workspace(JSONSerializable, URIBasedResource):
     def experiments_base_dir_parents(self) -> list[str]:
         pass
 
+    @abstractmethod
+    def predictions_base_dir_parents(self) -> list[str]:
+        pass
+
     @abstractmethod
     def rename(self, old_name: str, new_name: str) -> TBoolStr:
         return Workspace.get_class().rename(self, old_name, new_name)
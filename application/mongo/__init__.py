@@ -3,6 +3,9 @@ from .locking import *
 from .base import *
 from .mongo_base_metadata import *
 from .loggers import *
+from .rate_limits import *
+from .events import *
+from .predictions import *
 
 from .models import *
 from .data_managing import *
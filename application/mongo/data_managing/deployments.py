@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import io
+import random
 import schema as sch
 import torch
+from torch.utils.data import DataLoader
 from torchvision.models import *
 
-from application.utils import TDesc, TBoolStr, t
+from application.utils import TDesc, TBoolStr, Module, t, auto_tboolstr
 from application.models import User, Workspace
-from application.data_managing import BaseModelDeployer, BaseDataManager
+from application.data_managing import BaseModelDeployer, BaseDataManager, BaseDataRepository
+from application.inference.quantization import *
+from application.inference.backends import OnnxRuntimeBackend
+from application.inference.datasets import RepositoryFilesDataset
 
 from application.resources.base import DataType, ReferrableDataType
 from application.resources.contexts import UserWorkspaceResourceContext
@@ -14,6 +20,14 @@ from application.resources.contexts import UserWorkspaceResourceContext
 from application.mongo.base import MongoBaseUser, MongoBaseWorkspace
 
 
+def _model_dirs(context: UserWorkspaceResourceContext, path: str) -> list[str]:
+    workspace = t.cast(MongoBaseWorkspace, Workspace.canonicalize(context))
+    base_dir = workspace.models_base_dir_parents() + [workspace.models_base_dir()]
+    path_dir = path.split('/')
+    path_dir = [s for s in path_dir if len(s) > 0]
+    return base_dir + path_dir
+
+
 @BaseModelDeployer.register_model_deployer('ExperimentExport')
 class ExperimentExportModelDeployer(BaseModelDeployer):
 
@@ -31,28 +45,31 @@ class ExperimentExportModelDeployer(BaseModelDeployer):
         return super(ExperimentExportModelDeployer, cls).validate_input(data, context)
 
     @classmethod
-    def deploy_model(cls, data: TDesc, context: UserWorkspaceResourceContext, name: str, path: str) -> TBoolStr:
+    def build_model(cls, data: TDesc, context: UserWorkspaceResourceContext) -> tuple[Module | None, str | None]:
         experiment_name = data.get('experiment')
         execution_id = data.get('execution')
         owner = t.cast(MongoBaseUser, User.canonicalize(context.get_username()))
         workspace = t.cast(MongoBaseWorkspace, Workspace.canonicalize(context))
-        base_dir = workspace.models_base_dir_parents() + [workspace.models_base_dir()]
-        path_dir = path.split('/')
-        path_dir = [s for s in path_dir if len(s) > 0]
-        path_dirs = base_dir + path_dir
         ExperimentClass = t.cast(ReferrableDataType, DataType.get_type('BaseCLExperiment')).config_type()
         experiment_config = ExperimentClass.get_one(owner, workspace, experiment_name)
         if experiment_config is None:
-            return False, "Not existing experiment config"
+            return None, "Not existing experiment config"
         execution = experiment_config.get_execution(execution_id)
         if execution.completed:
             model_fd = execution.get_final_model(descriptor=True)
-            model = torch.load(model_fd)
-            manager = BaseDataManager.get()
-            result, exc = manager.save_model(model, path_dirs, name + '.pt')
-            return result, exc
+            return torch.load(model_fd), None
         else:
-            return False, "Experiment execution not completed"
+            return None, "Experiment execution not completed"
+
+    @classmethod
+    def deploy_model(cls, data: TDesc, context: UserWorkspaceResourceContext, name: str, path: str,
+                     report: TDesc = None) -> TBoolStr:
+        model, msg = cls.build_model(data, context)
+        if model is None:
+            return False, msg
+        manager = BaseDataManager.get()
+        result, exc = manager.save_model(model, _model_dirs(context, path), cls.model_file_name(name))
+        return result, exc
 
 
 @BaseModelDeployer.register_model_deployer('TorchvisionExport')
@@ -134,26 +151,322 @@ class TorchvisionExportModelDeployer(BaseModelDeployer):
         return super(TorchvisionExportModelDeployer, cls).validate_input(data, context)
 
     @classmethod
-    def deploy_model(cls, data: TDesc, context: UserWorkspaceResourceContext, name: str, path: str) -> TBoolStr:
+    def build_model(cls, data: TDesc, context: UserWorkspaceResourceContext) -> tuple[Module | None, str | None]:
         net_type = data.get('net_type')
         pretrained = data.get('pretrained')
         net_func = cls.__NETS__.get(net_type)
         if net_func is None:
-            return False, f"Unknown net '{net_type}'"
-        model = net_func(pretrained=pretrained)
+            return None, f"Unknown net '{net_type}'"
+        return net_func(pretrained=pretrained), None
 
-        workspace = t.cast(MongoBaseWorkspace, Workspace.canonicalize(context))
-        base_dir = workspace.models_base_dir_parents() + [workspace.models_base_dir()]
-        path_dir = path.split('/')
-        path_dir = [s for s in path_dir if len(s) > 0]
-        path_dirs = base_dir + path_dir
+    @classmethod
+    def deploy_model(cls, data: TDesc, context: UserWorkspaceResourceContext, name: str, path: str,
+                     report: TDesc = None) -> TBoolStr:
+        model, msg = cls.build_model(data, context)
+        if model is None:
+            return False, msg
+        manager = BaseDataManager.get()
+        result, exc = manager.save_model(model, _model_dirs(context, path), cls.model_file_name(name))
+        return result, exc
+
+
+@BaseModelDeployer.register_model_deployer('TorchScriptExport')
+class TorchScriptExportModelDeployer(BaseModelDeployer):
+    """
+    Deployer syntax:
+    {
+        "name": "TorchScriptExport",
+        "source": <ExperimentExport or TorchvisionExport deployment data>,
+        "method": "trace"/"script", (optional, defaults to "trace")
+        "input_shape": [<int>, ...], (shape of the example input for tracing, required for tracing
+            ExperimentExport sources and optional otherwise)
+        "optimize": true/false (optional, defaults to true)
+    }
+    The source model is traced (or scripted), frozen and optionally optimized for inference,
+    and then stored as a TorchScript archive, which is loaded without unpickling any class.
+    """
+
+    MODEL_EXTENSION = '.ts'
+
+    __METHODS__ = ('trace', 'script')
+
+    _DFL_INPUT_SHAPE = [1, 3, 224, 224]
+
+    @classmethod
+    def schema_dict(cls) -> dict:
+        data = super(TorchScriptExportModelDeployer, cls).schema_dict()
+        data.update({
+            'source': {str: object},
+            sch.Optional('method'): sch.And(str, lambda x: x in cls.__METHODS__),
+            sch.Optional('input_shape'): sch.And([int], lambda x: len(x) > 0),
+            sch.Optional('optimize'): bool,
+        })
+        return data
 
+    @classmethod
+    @auto_tboolstr()
+    def validate_input(cls, data: TDesc, context: UserWorkspaceResourceContext) -> TBoolStr:
+        result, msg = super(TorchScriptExportModelDeployer, cls).validate_input(data, context)
+        if not result:
+            return result, msg
+        source_data = data.get('source')
+        source = BaseModelDeployer.get_by_name(source_data)
+        if source is None or source.MODEL_EXTENSION != BaseModelDeployer.MODEL_EXTENSION:
+            return False, f"Unknown or unsupported source deployer '{source_data.get('name')}'."
+        # experiment models have no known input shape (the default one is that of torchvision models)
+        if data.get('method', 'trace') == 'trace' and issubclass(source, ExperimentExportModelDeployer) \
+                and data.get('input_shape') is None:
+            return False, "'input_shape' is required for tracing models of experiments."
+        return source.validate_input(source_data, context)
+
+    @classmethod
+    def build_model(cls, data: TDesc, context: UserWorkspaceResourceContext) -> tuple[Module | None, str | None]:
+        source_data = data.get('source')
+        source = BaseModelDeployer.get_by_name(source_data)
+        model, msg = source.build_model(source_data, context)
+        if model is None:
+            return None, msg
+        model = model.to('cpu').eval()
+        with torch.no_grad():
+            if data.get('method', 'trace') == 'script':
+                scripted = torch.jit.script(model)
+            else:
+                example = torch.rand(*data.get('input_shape', cls._DFL_INPUT_SHAPE))
+                scripted = torch.jit.trace(model, example)
+        scripted = torch.jit.freeze(scripted)
+        if data.get('optimize', True):
+            scripted = torch.jit.optimize_for_inference(scripted)
+        return scripted, None
+
+    @classmethod
+    def deploy_model(cls, data: TDesc, context: UserWorkspaceResourceContext, name: str, path: str,
+                     report: TDesc = None) -> TBoolStr:
+        model, msg = cls.build_model(data, context)
+        if model is None:
+            return False, msg
         manager = BaseDataManager.get()
-        result, exc = manager.save_model(model, path_dirs, name + '.pt')
+        result, exc = manager.save_model(model, _model_dirs(context, path), cls.model_file_name(name))
         return result, exc
 
 
+@BaseModelDeployer.register_model_deployer('OnnxExport')
+class OnnxExportModelDeployer(BaseModelDeployer):
+    """
+    Deployer syntax:
+    {
+        "name": "OnnxExport",
+        "source": <ExperimentExport or TorchvisionExport deployment data>,
+        "input_shape": [<int>, ...], (shape of the example input for exporting, required for
+            ExperimentExport sources and optional otherwise)
+        "opset_version": <int>, (optional)
+        "session": {    (optional, ONNX Runtime session settings)
+            "intra_op_threads": <int>,
+            "inter_op_threads": <int>,
+            "graph_optimization_level": "disable"/"basic"/"extended"/"all"
+        }
+    }
+    The source model is exported to ONNX (with a dynamic batch dimension) and served
+    by an ONNX Runtime CPU session.
+    """
+
+    MODEL_EXTENSION = '.onnx'
+    BACKEND = 'onnxruntime'
+
+    _DFL_INPUT_SHAPE = [1, 3, 224, 224]
+
+    @classmethod
+    def schema_dict(cls) -> dict:
+        data = super(OnnxExportModelDeployer, cls).schema_dict()
+        data.update({
+            'source': {str: object},
+            sch.Optional('input_shape'): sch.And([int], lambda x: len(x) > 0),
+            sch.Optional('opset_version'): int,
+            sch.Optional('session'): {
+                sch.Optional('intra_op_threads'): sch.And(int, lambda x: x >= 0),
+                sch.Optional('inter_op_threads'): sch.And(int, lambda x: x >= 0),
+                sch.Optional('graph_optimization_level'):
+                    sch.And(str, lambda x: x in OnnxRuntimeBackend.GRAPH_OPTIMIZATION_LEVELS),
+            },
+        })
+        return data
+
+    @classmethod
+    @auto_tboolstr()
+    def validate_input(cls, data: TDesc, context: UserWorkspaceResourceContext) -> TBoolStr:
+        result, msg = super(OnnxExportModelDeployer, cls).validate_input(data, context)
+        if not result:
+            return result, msg
+        source_data = data.get('source')
+        source = BaseModelDeployer.get_by_name(source_data)
+        if source is None or source.MODEL_EXTENSION != BaseModelDeployer.MODEL_EXTENSION:
+            return False, f"Unknown or unsupported source deployer '{source_data.get('name')}'."
+        if issubclass(source, ExperimentExportModelDeployer) and data.get('input_shape') is None:
+            return False, "'input_shape' is required for exporting models of experiments."
+        return source.validate_input(source_data, context)
+
+    @classmethod
+    def backend_options(cls, data: TDesc) -> TDesc | None:
+        return data.get('session', {})
+
+    @classmethod
+    def deploy_model(cls, data: TDesc, context: UserWorkspaceResourceContext, name: str, path: str,
+                     report: TDesc = None) -> TBoolStr:
+        source_data = data.get('source')
+        source = BaseModelDeployer.get_by_name(source_data)
+        model, msg = source.build_model(source_data, context)
+        if model is None:
+            return False, msg
+        model = model.to('cpu').eval()
+        example = torch.rand(*data.get('input_shape', cls._DFL_INPUT_SHAPE))
+        buffer = io.BytesIO()
+        kwargs = {} if data.get('opset_version') is None else {'opset_version': data['opset_version']}
+        torch.onnx.export(
+            model, example, buffer, input_names=['input'], output_names=['output'],
+            dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}}, **kwargs,
+        )
+        manager = BaseDataManager.get()
+        path_dirs = _model_dirs(context, path)
+        file_name = cls.model_file_name(name)
+        result, exc = manager.create_file((file_name, [manager.get_root()] + path_dirs, None))
+        if not result:
+            return result, exc
+        return manager.write_to_file((file_name, path_dirs, buffer.getvalue()), append=False)
+
+
+@BaseModelDeployer.register_model_deployer('QuantizedExport')
+class QuantizedExportModelDeployer(BaseModelDeployer):
+    """
+    Deployer syntax:
+    {
+        "name": "QuantizedExport",
+        "source": <ExperimentExport or TorchvisionExport deployment data>,
+        "mode": "dynamic"/"static", (optional, defaults to "dynamic")
+        "samples": {    (required for "static" mode)
+            "data_repository": <data repository name>,
+            "root": <folder>,
+            "transform": <input transform, as for predictions>,
+            "max_samples": <int>, (optional, defaults to 512)
+            "holdout": <float> (optional, fraction of samples held out for evaluation, defaults to 0.5)
+        }
+    }
+    Both the float model ('<name>.pt') and the int8 quantized one ('<name>.int8.pt', served
+    as 'quantized' variant) are stored. If samples are given, the quantized model is evaluated
+    against the float one on the held-out samples and the accuracy delta is reported.
+    """
+
+    VARIANTS = {'quantized': '.int8'}
+
+    _DFL_MAX_SAMPLES = 512
+    _DFL_HOLDOUT = 0.5
+    _BATCH_SIZE = 32
+    _MIN_CALIBRATION_SAMPLES = 1
+
+    @classmethod
+    def schema_dict(cls) -> dict:
+        data = super(QuantizedExportModelDeployer, cls).schema_dict()
+        data.update({
+            'source': {str: object},
+            sch.Optional('mode'): sch.And(str, lambda x: x in QUANTIZATION_MODES),
+            sch.Optional('samples'): {
+                'data_repository': str,
+                'root': str,
+                'transform': {str: object},
+                sch.Optional('max_samples'): sch.And(int, lambda x: x > 0),
+                sch.Optional('holdout'): sch.And(sch.Or(int, float), lambda x: 0 <= x < 1),
+            },
+        })
+        return data
+
+    @classmethod
+    @auto_tboolstr()
+    def validate_input(cls, data: TDesc, context: UserWorkspaceResourceContext) -> TBoolStr:
+        result, msg = super(QuantizedExportModelDeployer, cls).validate_input(data, context)
+        if not result:
+            return result, msg
+        if data.get('mode', DYNAMIC_QUANTIZATION) == STATIC_QUANTIZATION and data.get('samples') is None:
+            return False, "Static quantization requires calibration samples."
+        source_data = data.get('source')
+        source = BaseModelDeployer.get_by_name(source_data)
+        if source is None or source.MODEL_EXTENSION != BaseModelDeployer.MODEL_EXTENSION:
+            return False, f"Unknown or unsupported source deployer '{source_data.get('name')}'."
+        return source.validate_input(source_data, context)
+
+    @classmethod
+    def _sample_loaders(cls, samples: TDesc, context: UserWorkspaceResourceContext) -> tuple[DataLoader, DataLoader]:
+        """
+        Splits a random subset of the given data repository folder into calibration
+        and evaluation samples.
+        """
+        from application.mongo.resources.benchmarks import TransformConfig
+
+        data_repository = BaseDataRepository.canonicalize(context, samples['data_repository'])
+        files = sorted(data_repository.get_all_files(samples['root']))
+        random.Random(0).shuffle(files)
+        files = files[:samples.get('max_samples', cls._DFL_MAX_SAMPLES)]
+        holdout = int(len(files) * samples.get('holdout', cls._DFL_HOLDOUT))
+
+        transform_data = samples['transform']
+        transform_config = TransformConfig.get_by_name(transform_data)
+        transform = transform_config.create(transform_data, context).get_transform()
+
+        base_path = data_repository.get_absolute_path()
+        calibration = RepositoryFilesDataset(base_path, files[holdout:], transform)
+        evaluation = RepositoryFilesDataset(base_path, files[:holdout], transform)
+        return DataLoader(calibration, batch_size=cls._BATCH_SIZE), DataLoader(evaluation, batch_size=cls._BATCH_SIZE)
+
+    @classmethod
+    def deploy_model(cls, data: TDesc, context: UserWorkspaceResourceContext, name: str, path: str,
+                     report: TDesc = None) -> TBoolStr:
+        source_data = data.get('source')
+        source = BaseModelDeployer.get_by_name(source_data)
+        model, msg = source.build_model(source_data, context)
+        if model is None:
+            return False, msg
+        model = model.to('cpu').eval()
+        mode = data.get('mode', DYNAMIC_QUANTIZATION)
+        samples = data.get('samples')
+        calibration, evaluation = None, None
+        if samples is not None:
+            try:
+                calibration, evaluation = cls._sample_loaders(samples, context)
+            except ValueError as ex:
+                return False, f"Invalid quantization samples: {ex}"
+        if mode == STATIC_QUANTIZATION and len(calibration.dataset) < cls._MIN_CALIBRATION_SAMPLES:
+            return False, f"Static quantization requires at least {cls._MIN_CALIBRATION_SAMPLES} calibration " \
+                          f"sample(s), found {len(calibration.dataset)} in '{samples['root']}'."
+
+        try:
+            if mode == STATIC_QUANTIZATION:
+                quantized = quantize_static(model, (inputs for inputs, _ in calibration))
+            else:
+                quantized = quantize_dynamic(model)
+        except Exception as ex:
+            return False, f"Failed to quantize model: {type(ex).__name__}: {ex}"
+
+        manager = BaseDataManager.get()
+        path_dirs = _model_dirs(context, path)
+        result, exc = manager.save_model(model, path_dirs, cls.model_file_name(name))
+        if not result:
+            return result, exc
+        result, exc = manager.save_model(quantized, path_dirs, cls.variant_file_name(name, 'quantized'))
+        if not result:
+            return result, exc
+
+        if report is not None:
+            report['quantization'] = {
+                'mode': mode,
+                'float_size_bytes': serialized_size_bytes(model),
+                'quantized_size_bytes': serialized_size_bytes(quantized),
+            }
+            if evaluation is not None and len(evaluation.dataset) > 0:
+                report['quantization'].update(compare_models(model, quantized, evaluation))
+        return True, None
+
+
 __all__ = [
     'ExperimentExportModelDeployer',
     'TorchvisionExportModelDeployer',
+    'TorchScriptExportModelDeployer',
+    'OnnxExportModelDeployer',
+    'QuantizedExportModelDeployer',
 ]
\ No newline at end of file
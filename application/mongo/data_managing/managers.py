@@ -126,6 +126,14 @@ class MongoLocalDataManager(BaseDataManager):
         mode = 'rb' if binary else 'r'
         return open(fpath, mode)
 
+    def get_file_info(self, file_name: str, dir_names: list[str]) -> tuple[float, int] | None:
+        fpath = os.path.join(self.get_root(), *dir_names, file_name)
+        try:
+            stat = os.stat(fpath)
+            return stat.st_mtime, stat.st_size
+        except FileNotFoundError:
+            return None
+
     @auto_tboolexc
     def print_to_file(self, file_name: str, dir_names: list[str], *values: t.Any,
                       sep=' ', newline=True, append=True, flush=True) -> TBoolExc:
@@ -164,7 +172,10 @@ class MongoLocalDataManager(BaseDataManager):
         if not result:
             exc.args[0] = f"Failed to create file '{model_name}': {exc.args[0]}."
             return result, exc
-        torch.save(model, fpath)
+        if isinstance(model, torch.jit.ScriptModule):
+            torch.jit.save(model, fpath)
+        else:
+            torch.save(model, fpath)
         return True, None
 
     def add_archive(self, stream, base_path_list: list[str], tmp_archive_name='tmp_file',
@@ -0,0 +1,74 @@
+from __future__ import annotations
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import CursorType
+
+from application.database import db
+from application.utils import t, TDesc
+
+
+class MongoExperimentEvent(db.Document):
+    """
+    Live event of an experiment run, stored in a capped collection that is tailed by all
+    the server processes, so that events published by a standalone worker or an isolated
+    child process reach the clients subscribed on any server. Older events are overwritten
+    by MongoDB once the collection is full.
+    """
+    _COLLECTION = 'experiment_events'
+
+    meta = {
+        'collection': _COLLECTION,
+        'max_size': 16 * 1024 ** 2,
+        'max_documents': 100000,
+    }
+
+    channel = db.StringField(required=True)
+    event = db.StringField(required=True)
+    data = db.DictField(default=None)
+    time = db.DateTimeField(default=None)
+
+    @classmethod
+    def publish(cls, channel: str, event: str, data: TDesc = None) -> MongoExperimentEvent:
+        # noinspection PyArgumentList
+        obj = cls(channel=channel, event=event, data=data, time=datetime.utcnow())
+        obj.save()
+        return obj
+
+    @classmethod
+    def last_id(cls) -> ObjectId | None:
+        last = cls.objects.order_by('-id').only('id').first()
+        return last.id if last is not None else None
+
+    @classmethod
+    def since(cls, channel: str, event_id: str) -> t.Iterable[MongoExperimentEvent]:
+        """
+        :return: Events of the channel published after the one with the given id (if still stored).
+        """
+        try:
+            return cls.objects(channel=channel, id__gt=ObjectId(event_id)).order_by('id')
+        except Exception:   # not an ObjectId
+            return []
+
+    @classmethod
+    def tail(cls, after: ObjectId | None, max_await: float):
+        """
+        :return: A tailable cursor over the raw events published after the given id.
+        """
+        query = {} if after is None else {'_id': {'$gt': after}}
+        return cls._get_collection().find(
+            query, cursor_type=CursorType.TAILABLE_AWAIT,
+        ).max_await_time_ms(int(max_await * 1000))
+
+    def to_dict(self) -> TDesc:
+        return {
+            'id': str(self.id),
+            'channel': self.channel,
+            'event': self.event,
+            'data': self.data,
+        }
+
+
+__all__ = [
+    'MongoExperimentEvent',
+]
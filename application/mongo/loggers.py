@@ -8,8 +8,9 @@ from avalanche.evaluation.metric_results import MetricValue
 from avalanche.logging import BaseLogger
 from avalanche.core import SupervisedPlugin
 
-from application.utils import t
+from application.utils import t, TDesc
 from application.data_managing.base import BaseDataManager
+from application.experiment_events import experiment_events
 from application.resources import StandardMetricSet
 from application.mongo.utils import mnames_order_filter, mnames_translations
 
@@ -23,7 +24,8 @@ class ExtendedCSVLogger(BaseLogger, SupervisedPlugin):
     training and eval results csv files and is compatible with data manager
     (i.e., it uses BaseDataManager file and directory API), thus synchronizing
     with general experiment data storage (e.g. in Workspaces directories on
-    the local FileSystem).
+    the local FileSystem). If an events channel is set, the same metrics are
+    also published as live experiment events.
     """
 
     _DFL_TRAIN_RESULTS_FILE_NAME = 'train_results.csv'
@@ -44,6 +46,8 @@ class ExtendedCSVLogger(BaseLogger, SupervisedPlugin):
         self.eval_file_name = eval_file_name
         self.log_folder = log_folder
         self.manager = BaseDataManager.get()
+        # experiment events channel
+        self.channel: str | None = None
         # current training experience id
         self.training_exp_id = None
         # current training epoch id
@@ -92,6 +96,25 @@ class ExtendedCSVLogger(BaseLogger, SupervisedPlugin):
         else:
             return str(m_val)
 
+    @staticmethod
+    def _val_to_json(m_val):
+        if isinstance(m_val, torch.Tensor):
+            return m_val.tolist()
+        return m_val
+
+    @classmethod
+    def set_events_channel(cls, strategy: 'SupervisedTemplate', channel: str):
+        """
+        Sets the events channel of the loggers of the given strategy.
+        """
+        for logger in getattr(strategy.evaluator, 'loggers', []):
+            if isinstance(logger, cls):
+                logger.channel = channel
+
+    def publish(self, event: str, data: TDesc):
+        if self.channel is not None:
+            experiment_events.publish(self.channel, event, data)
+
     def print_train_metrics(self, training_exp, epoch, *values):
         if self.log_folder is None:
             raise RuntimeError("Undefined log folder.")
@@ -141,6 +164,14 @@ class ExtendedCSVLogger(BaseLogger, SupervisedPlugin):
         self.print_train_metrics(
             self.training_exp_id, strategy.clock.train_exp_epochs, *vals_to_print,
         )
+        self.publish('epoch', {
+            'training_exp': self.training_exp_id,
+            'epoch': strategy.clock.train_exp_epochs,
+            'training_items': self.current_n_patterns,
+            'metrics': {
+                name: self._val_to_json(value) for name, value in zip(self.metric_names['train'], vals_to_print[::2])
+            },
+        })
         print(f"Ended training on experience = {self.training_exp_id}, epoch = {self.training_epoch_id})")
         self.training_epoch_id += 1
 
@@ -174,6 +205,13 @@ class ExtendedCSVLogger(BaseLogger, SupervisedPlugin):
                 strategy.experience.current_experience,
                 self.training_exp_id, *vals_to_print,
             )
+            self.publish('eval', {
+                'eval_exp': strategy.experience.current_experience,
+                'training_exp': self.training_exp_id,
+                'metrics': {
+                    name: self._val_to_json(value) for name, value in zip(self.metric_names['eval'], vals_to_print)
+                },
+            })
             print(
                 f"Ended evaluating on experience = {strategy.experience.current_experience} of {self.training_exp_id}"
             )
@@ -185,6 +223,15 @@ class ExtendedCSVLogger(BaseLogger, SupervisedPlugin):
         self.training_exp_id = strategy.experience.current_experience
         self.training_epoch_id = 0
 
+    # noinspection PyMethodOverriding
+    def after_training_exp(self, strategy: 'SupervisedTemplate',
+                           metric_values: t.List['MetricValue'], **kwargs):
+        super().after_training_exp(strategy, metric_values, **kwargs)
+        self.publish('experience', {
+            'training_exp': self.training_exp_id,
+            'epochs': self.training_epoch_id,
+        })
+
     # noinspection PyMethodOverriding
     def before_eval(self, strategy: 'SupervisedTemplate',
                     metric_values: t.List['MetricValue'], **kwargs):
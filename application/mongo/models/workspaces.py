@@ -196,6 +196,9 @@ class MongoWorkspace(MongoBaseWorkspace):
     def models_base_dir_parents(self) -> list[str]:
         return [self.get_owner().user_base_dir(), self.workspace_base_dir()]
 
+    def predictions_base_dir_parents(self) -> list[str]:
+        return [self.get_owner().user_base_dir(), self.workspace_base_dir()]
+
     def rename(self, old_name: str, new_name: str) -> TBoolStr:
         if not self.is_open():
             return False, f"Workspace '{self.name}' is closed!"
@@ -0,0 +1,97 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+
+from application.database import db
+from application.utils import t, TDesc
+
+
+class MongoPredictionJob(db.Document):
+    """
+    State of a batch prediction job, shared by all the server processes so that a job can be
+    followed (and its results downloaded) from any of them. Jobs are run by the process that
+    received them, which updates their progress; finished jobs are removed together with their
+    results file once expired.
+    """
+    _COLLECTION = 'prediction_jobs'
+
+    meta = {
+        'collection': _COLLECTION,
+        'indexes': [
+            ('owner', 'workspace', '-created'),
+            ('status', 'updated'),
+            ('status', 'ended'),
+        ],
+    }
+
+    id = db.StringField(primary_key=True)
+    owner = db.StringField(required=True)
+    workspace = db.StringField(required=True)
+    deployment = db.StringField(required=True)
+    data_repository = db.StringField(required=True)
+    root = db.StringField(required=True)
+    result_format = db.StringField(required=True)
+    result_dirs = db.ListField(db.StringField(), default=None)
+    top_k = db.IntField(default=None)
+    variant = db.StringField(default=None)
+    task_label = db.IntField(default=None)
+    status = db.StringField(required=True)
+    total = db.IntField(default=None)
+    processed = db.IntField(default=0)
+    error = db.StringField(default=None)
+    created = db.DateTimeField(default=None)
+    started = db.DateTimeField(default=None)
+    ended = db.DateTimeField(default=None)
+    updated = db.DateTimeField(default=None)     # last progress update (while running)
+
+    @classmethod
+    def store(cls, data: TDesc) -> MongoPredictionJob:
+        """
+        Creates or updates the document of the job with the given id ('id' item of data).
+        """
+        data = dict(data, updated=datetime.utcnow())
+        job_id = data.pop('id')
+        return cls.objects(id=job_id).modify(
+            upsert=True, new=True, **{f"set__{name}": value for name, value in data.items()},
+        )
+
+    @classmethod
+    def get_by_id(cls, job_id: str) -> MongoPredictionJob | None:
+        return cls.objects(id=job_id).first()
+
+    @classmethod
+    def get_jobs(cls, owner: str, workspace: str) -> t.Iterable[MongoPredictionJob]:
+        return cls.objects(owner=owner, workspace=workspace).order_by('-created')
+
+    @classmethod
+    def fail_stale(cls, running: str, failed: str, timeout: float) -> int:
+        """
+        Marks as failed the running jobs whose progress has not been updated for timeout
+        seconds (e.g. because the process running them died).
+        :return: Number of failed jobs.
+        """
+        now = datetime.utcnow()
+        return cls.objects(status=running, updated__lt=now - timedelta(seconds=timeout)).update(
+            set__status=failed, set__ended=now, set__updated=now, set__error="Job interrupted",
+        )
+
+    @classmethod
+    def expired(cls, finished: t.Sequence[str], ttl: float, owner: str = None, workspace: str = None,
+                max_retained: int = None) -> list[MongoPredictionJob]:
+        """
+        :return: Finished jobs that ended more than ttl seconds ago and, if owner and workspace
+        are given, the finished jobs of the workspace beyond the max_retained most recent ones.
+        """
+        expired = list(cls.objects(status__in=finished, ended__lt=datetime.utcnow() - timedelta(seconds=ttl)))
+        if owner is not None and max_retained is not None:
+            ids = {job.id for job in expired}
+            retained = cls.objects(owner=owner, workspace=workspace, status__in=finished).order_by('-ended')
+            expired.extend(job for job in retained.skip(max_retained) if job.id not in ids)
+        return expired
+
+    def to_dict(self) -> TDesc:
+        return {name: getattr(self, name) for name in self._fields}
+
+
+__all__ = [
+    'MongoPredictionJob',
+]
@@ -0,0 +1,45 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+
+from application.database import db
+
+
+class MongoRateCounter(db.Document):
+    """
+    Request counter of a (user, endpoint class) pair in a fixed time window, shared by
+    all the server processes. Counters are removed by MongoDB once expired.
+    """
+    _COLLECTION = 'rate_counters'
+
+    meta = {
+        'collection': _COLLECTION,
+        'indexes': [
+            {'fields': ['expires'], 'expireAfterSeconds': 0},
+        ],
+    }
+
+    id = db.StringField(primary_key=True)
+    count = db.IntField(default=0)
+    expires = db.DateTimeField()
+
+    @classmethod
+    def increment(cls, name: str, window: float) -> tuple[int, float]:
+        """
+        Atomically increments the counter of the current window of the given name.
+        :param name: Counter name (e.g. <username>:<endpoint class>).
+        :param window: Window length in seconds.
+        :return: A pair (count in the current window including this one, seconds to the end of the window).
+        """
+        now = datetime.utcnow().timestamp()
+        index = int(now // window)
+        end = (index + 1) * window
+        counter = cls.objects(id=f"{name}:{index}").modify(
+            upsert=True, new=True, inc__count=1,
+            set_on_insert__expires=datetime.utcfromtimestamp(end) + timedelta(seconds=window),
+        )
+        return counter.count, end - now
+
+
+__all__ = [
+    'MongoRateCounter',
+]
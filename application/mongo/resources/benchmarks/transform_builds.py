@@ -10,7 +10,8 @@ from torchvision.transforms import ToTensor, CenterCrop, Normalize, Compose, \
 
 from application.utils import TBoolStr, TDesc, abstractmethod, t
 from application.database import db
-from application.resources.contexts import ResourceContext
+from application.resources.contexts import ResourceContext, UserResourceContext, UserWorkspaceResourceContext
+from application.inference import transform_cache
 from application.mongo.resources.mongo_base_configs import *
 
 
@@ -45,6 +46,31 @@ class TransformConfig(MongoEmbeddedBuildConfig):
             else:
                 return cls.__CONFIGS__.get(cname)
 
+    @classmethod
+    def compile(cls, data: TDesc | None, context: ResourceContext):
+        """
+        Retrieves the transform for the given configuration from the process-wide compiled
+        transform cache, building it only at the first request.
+        :param data: Transform configuration, or None for the default (ToTensor).
+        :param context: Context for building the configuration.
+        :return: The transform callable.
+        """
+        def compiler():
+            if data is None:
+                return ToTensor()
+            transform_config = cls.get_by_name(data)
+            if transform_config is None:
+                raise ValueError(f"Unknown transform '{data.get('name')}'")
+            return transform_config.create(data, context).get_transform()
+
+        # built transforms can depend on the user and workspace of the context (e.g. data repository paths)
+        scope = None
+        if isinstance(context, UserWorkspaceResourceContext):
+            scope = [context.get_username(), context.get_workspace()]
+        elif isinstance(context, UserResourceContext):
+            scope = [context.get_username()]
+        return transform_cache.get_or_compile(data, compiler, scope=scope)
+
     @classmethod
     def schema_dict(cls) -> dict:
         return super(TransformConfig, cls).schema_dict()
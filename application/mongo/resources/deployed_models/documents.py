@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+import os
 import torch
+import schema as sch
+from uuid import uuid4
 from datetime import datetime
 
 from application.database import *
-from application.utils import t, TBoolExc, TDesc, get_device, TBoolStr, auto_tboolexc
+from application.utils import t, TBoolExc, TDesc, TBoolStr, auto_tboolexc
 from application.data_managing import BaseDataManager, BaseModelDeployer
+from application.inference import model_cache, result_cache, transform_hash, InferenceBackend, ResultCacheScope, \
+    deployment_warmer, inflight_requests
 from application.models import User, Workspace
 
 from application.resources.base import DataType, BaseMetadata
@@ -14,6 +19,7 @@ from application.resources.contexts import UserWorkspaceResourceContext
 from application.mongo.base import MongoBaseUser, MongoBaseWorkspace
 from application.mongo.mongo_base_metadata import MongoBaseMetadata
 from application.mongo.resources.mongo_base_configs import *
+from application.mongo.resources.benchmarks import TransformConfig
 
 
 class MongoDeployedModelMetadata(MongoBaseMetadata):
@@ -22,11 +28,40 @@ class MongoDeployedModelMetadata(MongoBaseMetadata):
 
 class MongoDeployedModelConfig(MongoBaseResourceConfig):
 
+    # {"input_shape": [<int>, ...], "batch_size": <int>, "hot": <bool>, "task_label": <int>, "variants": [<str>, ...]}
+    WARMUP_SCHEMA = {
+        sch.Optional('input_shape'): [int],
+        sch.Optional('batch_size'): int,
+        sch.Optional('hot'): bool,
+        sch.Optional('task_label'): int,
+        sch.Optional('variants'): [str],
+    }
+
+    # Versioned deployments store their artifacts in an immutable '<path>/.versions/<version>' directory
+    # with the fixed name ARTIFACT_NAME, and 'version' is the pointer to the current one; deployments
+    # without a version store them directly in '<path>' as '<name>.<extension>'.
+    VERSIONS_DIR = '.versions'
+    ARTIFACT_NAME = 'model'
+
     path = db.StringField(default=None)
+    version = db.StringField(default=None)      # current version
+    deploy_report = db.DictField(default=None)     # deployment information given by the deployer
+    backend = db.StringField(default=BaseModelDeployer.BACKEND)     # inference backend of the main model
+    backend_options = db.DictField(default=None)
+    transform = db.DictField(default=None)      # default input transform of predictions
+    warmup = db.DictField(default=None)     # warm-up settings (see WARMUP_SCHEMA)
 
     def to_dict(self, links=True) -> TDesc:
         data = super().to_dict(links=links)
         data['path'] = self.get_path()
+        data['backend'] = self.get_backend()
+        data['version'] = self.version
+        if self.transform:
+            data['transform'] = self.transform
+        if self.warmup:
+            data['warmup'] = self.warmup
+        if self.deploy_report:
+            data['deploy_report'] = self.deploy_report
         return data
 
     @classmethod
@@ -35,6 +70,8 @@ class MongoDeployedModelConfig(MongoBaseResourceConfig):
         data.update({
             'path': str,
             'deploy': {str: object},
+            sch.Optional('transform'): {str: object},
+            sch.Optional('warmup'): cls.WARMUP_SCHEMA,
         })
         return data
 
@@ -66,21 +103,200 @@ class MongoDeployedModelConfig(MongoBaseResourceConfig):
     def get_metadata(self):
         return self.metadata.to_dict(links=False)
 
+    def get_backend(self) -> str:
+        return self.backend or BaseModelDeployer.BACKEND
+
+    def set_deployment(self, deployer: t.Type[BaseModelDeployer], deploy_data: TDesc, report: TDesc):
+        self.backend = deployer.BACKEND
+        self.backend_options = deployer.backend_options(deploy_data)
+        self.deploy_report = report
+
     def base_dir(self) -> list[str]:
         return self.workspace.models_base_dir_parents() + [self.workspace.models_base_dir()]
 
-    # ok
-    def get_model(self) -> torch.nn.Module:
-        path_dirs = self.base_dir() + self.get_path_list()
+    @classmethod
+    def version_path(cls, path: str, version: str) -> str:
+        """
+        Path (relative to the models directory) of the given version directory.
+        """
+        return '/'.join([s for s in path.split('/') if len(s) > 0] + [cls.VERSIONS_DIR, version])
+
+    @classmethod
+    def version_dirs(cls, workspace: MongoBaseWorkspace, path: str, version: str) -> list[str]:
+        """
+        Directory (as list of its parents and itself) of the given version.
+        """
+        base_dir = workspace.models_base_dir_parents() + [workspace.models_base_dir()]
+        return base_dir + [s for s in path.split('/') if len(s) > 0] + [cls.VERSIONS_DIR, version]
+
+    @staticmethod
+    def remove_version_dir(dirs: list[str]):
+        """
+        Removes a version directory, and the versions directory once it has no other versions.
+        """
         manager = BaseDataManager.get()
-        model_fd = manager.get_file_pointer(self.name + '.pt', path_dirs)
-        model = torch.load(model_fd).to(get_device())
-        return model
+        manager.remove_subdir(dirs[-1], parents=dirs[:-1])
+        try:
+            os.rmdir(manager.get_dir_path(dirs[:-1]))
+        except OSError:     # not empty (or already removed)
+            pass
+
+    def model_dirs(self) -> list[str]:
+        """
+        Directory (as list of its parents and itself) of the artifacts of the current version.
+        """
+        dirs = self.base_dir() + self.get_path_list()
+        return dirs if self.version is None else dirs + [self.VERSIONS_DIR, self.version]
+
+    def artifact_name(self) -> str:
+        return self.name if self.version is None else self.ARTIFACT_NAME
+
+    def model_file_name(self, name: str = None) -> str:
+        """
+        Name of the stored model artifact, detected among the formats of the registered deployers
+        (e.g. '<name>.ts' for TorchScript archives), defaulting to '<name>.pt'.
+        """
+        name = name if name is not None else self.artifact_name()
+        path_dirs = self.model_dirs()
+        manager = BaseDataManager.get()
+        for extension in BaseModelDeployer.model_extensions():
+            if manager.get_file_info(name + extension, path_dirs) is not None:
+                return name + extension
+        return name + BaseModelDeployer.MODEL_EXTENSION
+
+    def variant_file_name(self, variant: str) -> str:
+        return self.artifact_name() + BaseModelDeployer.model_variants()[variant] + BaseModelDeployer.MODEL_EXTENSION
+
+    def artifact_file_names(self) -> list[str]:
+        """
+        Names of all the stored model artifacts (main one and variants).
+        """
+        path_dirs = self.model_dirs()
+        manager = BaseDataManager.get()
+        result = [self.model_file_name()]
+        for variant in BaseModelDeployer.model_variants():
+            file_name = self.variant_file_name(variant)
+            if manager.get_file_info(file_name, path_dirs) is not None:
+                result.append(file_name)
+        return result
+
+    def _load_model(self, file_name: str, path_dirs: list[str], backend: str,
+                    options: TDesc = None) -> t.Callable:
+        backend_type = InferenceBackend.get_by_name(backend)
+        if backend_type is None:
+            raise ValueError(f"Unknown inference backend '{backend}'")
+        manager = BaseDataManager.get()
+        with manager.get_file_pointer(file_name, path_dirs) as model_fd:
+            return backend_type.load(model_fd, file_name, options)
+
+    def model_cache_key(self, variant: str = None) -> str:
+        """
+        Key of the model (or of the given variant) of the current version in the process-wide caches.
+        """
+        parts = [self.claas_urn]
+        if self.version is not None:
+            parts.append(self.version)
+        if variant is not None:
+            parts.append(variant)
+        return self.claas_urn_separator().join(parts)
+
+    def model_cache_keys(self) -> list[str]:
+        """
+        Keys of the main model and of all the variants of the current version.
+        """
+        return [self.model_cache_key(variant) for variant in [None] + list(BaseModelDeployer.model_variants())]
+
+    def _model_artifact(self, variant: str = None) -> tuple[str, list[str], str, tuple]:
+        """
+        :return: File name, directories, inference backend and version (file name and file info)
+        of the main model or of the given variant.
+        :raise ValueError: If the variant does not exist for this model.
+        """
+        path_dirs = self.model_dirs()
+        manager = BaseDataManager.get()
+        backend = self.get_backend()
+        if variant is None:
+            file_name = self.model_file_name()
+        elif variant in BaseModelDeployer.model_variants():
+            file_name = self.variant_file_name(variant)
+            backend = BaseModelDeployer.BACKEND    # variants are pickled modules
+        else:
+            raise ValueError(f"Unknown model variant '{variant}'")
+        version = (file_name, manager.get_file_info(file_name, path_dirs))
+        if variant is not None and version[1] is None:
+            raise ValueError(f"Variant '{variant}' is not available for this model")
+        return file_name, path_dirs, backend, version
+
+    # ok
+    def get_model(self, variant: str = None) -> torch.nn.Module | t.Callable:
+        """
+        Retrieves the deployed model from the process-wide model cache, loading it with
+        the inference backend of the deployment only if it is not cached or the model file
+        has changed since it was cached.
+        :param variant: If given, the corresponding variant (e.g. 'quantized') is retrieved
+        instead of the main model.
+        :raise ValueError: If the variant does not exist for this model.
+        """
+        file_name, path_dirs, backend, version = self._model_artifact(variant)
+        options = self.backend_options
+        if variant is not None:
+            options = {'device': 'cpu'}     # int8 quantized kernels are CPU-only
+        return model_cache.get_or_load(
+            self.model_cache_key(variant), lambda: self._load_model(file_name, path_dirs, backend, options),
+            version=version,
+        )
+
+    def result_cache_dirs(self) -> list[str]:
+        """
+        Directory of the on-disk tier of the prediction result cache for this model.
+        """
+        if self.version is None:
+            return self.model_dirs() + ['.results', self.name]
+        return self.model_dirs() + ['.results']
+
+    def result_cache_scope(self, transform_data: TDesc = None, top_k: int = None,
+                           variant: str = None) -> ResultCacheScope | None:
+        """
+        :return: The scope of the prediction result cache for the given transform, top_k and
+        variant of this model, or None if the cache is disabled.
+        """
+        version = self._model_artifact(variant)[3]
+        return result_cache.scope(
+            self.model_cache_key(variant), version, transform_hash(transform_data),
+            top_k=top_k, disk_dirs=self.result_cache_dirs(),
+        )
+
+    def is_hot(self) -> bool:
+        """
+        Hot deployments are preloaded and warmed up at server start and after each deploy.
+        """
+        return self.warmup is not None and self.warmup.get('hot', True)
+
+    def warm_up(self) -> list[TDesc]:
+        """
+        Loads the model (and the variants given in the warm-up settings) into the model cache,
+        running warm-up forward passes if the input shape is given.
+        :return: The warm-up records.
+        """
+        settings = self.warmup or {}
+        records = []
+        for variant in [None] + settings.get('variants', []):
+            records.append(deployment_warmer.warm(
+                self.model_cache_key(variant), lambda: self.get_model(variant),
+                input_shape=settings.get('input_shape'), batch_size=settings.get('batch_size', 1),
+                task_label=settings.get('task_label'),
+            ))
+        return records
+
+    @classmethod
+    def hot_deployments(cls) -> list[MongoDeployedModelConfig]:
+        # noinspection PyUnresolvedReferences
+        return [config for config in cls.objects(warmup__ne=None) if config.is_hot()]
 
     def set_model(self, model: torch.nn.Module) -> TBoolExc:
-        path_dirs = self.base_dir() + self.get_path_list()
+        path_dirs = self.model_dirs()
         manager = BaseDataManager.get()
-        result, exc = manager.save_model(model, path_dirs, self.name + '.pt')
+        result, exc = manager.save_model(model, path_dirs, self.artifact_name() + '.pt')
         return result, exc
 
     # ok
@@ -94,7 +310,26 @@ class MongoDeployedModelConfig(MongoBaseResourceConfig):
         if deployer is None:
             return False, "Failed to validate deployment data: unknown or missing deployer name."
         result, msg = deployer.validate_input(deploy_data, context)
-        return result, None if result else f"Failed to validate deployment data: '{msg}'."
+        if not result:
+            return result, f"Failed to validate deployment data: '{msg}'."
+        return cls.validate_transform(data.get('transform'), context)
+
+    @staticmethod
+    def validate_transform(transform_data: TDesc | None, context: UserWorkspaceResourceContext) -> TBoolStr:
+        """
+        Validates the default input transform and compiles it into the process-wide
+        transform cache, so that the first prediction does not pay for building it.
+        """
+        if transform_data is None:
+            return True, None
+        transform_config = TransformConfig.get_by_name(transform_data)
+        if transform_config is None:
+            return False, "Unknown or missing transform name."
+        result, msg = transform_config.validate_input(transform_data, context)
+        if not result:
+            return result, f"Failed to validate transform data: '{msg}'."
+        TransformConfig.compile(transform_data, context)
+        return True, None
 
     @classmethod
     def create(cls, data, context: UserWorkspaceResourceContext, save: bool = True,
@@ -119,8 +354,17 @@ class MongoDeployedModelConfig(MongoBaseResourceConfig):
             deployer = BaseModelDeployer.get_by_name(deploy_data)
             if deployer is None:
                 return None
-            result, msg = deployer.deploy_model(deploy_data, context, name, path)
+            report = {}
+            version = uuid4().hex
+            version_dirs = cls.version_dirs(workspace, path, version)
+            try:
+                result, msg = deployer.deploy_model(
+                    deploy_data, context, cls.ARTIFACT_NAME, cls.version_path(path, version), report=report,
+                )
+            except Exception as ex:
+                result, msg = False, f"{type(ex).__name__}: {ex}"
             if not result:
+                cls.remove_version_dir(version_dirs)   # partially written artifacts
                 return f"Failed to deploy model: '{msg}'"
             # noinspection PyArgumentList
             obj = cls(
@@ -128,20 +372,30 @@ class MongoDeployedModelConfig(MongoBaseResourceConfig):
                 description=description,
                 owner=owner,
                 path=path,
+                version=version,
                 workspace=workspace,
+                transform=data.get('transform'),
+                warmup=data.get('warmup'),
                 metadata=cls.meta_type()(**metadata),
             )
             if obj is not None:
-                with obj.resource_create(parents_locked=True):
-                    if save:
-                        obj.save(create=True)
+                obj.set_deployment(deployer, deploy_data, report)
+                try:
+                    with obj.resource_create(parents_locked=True):
+                        if save:
+                            obj.save(create=True)
+                except Exception:
+                    cls.remove_version_dir(version_dirs)
+                    raise
+                if obj.is_hot():
+                    deployment_warmer.submit(obj.warm_up)
             return obj
 
     # ok
     def build(self, context: UserWorkspaceResourceContext,
-              locked=False, parents_locked=False):
+              locked=False, parents_locked=False, variant: str = None):
         with self.resource_read(locked=locked, parents_locked=parents_locked):
-            model = self.get_model()
+            model = self.get_model(variant)
             # noinspection PyArgumentList
             obj = self.target_type()(model)
             # noinspection PyUnresolvedReferences
@@ -150,58 +404,153 @@ class MongoDeployedModelConfig(MongoBaseResourceConfig):
                 path=self.path,
                 owner=self.owner.username,
                 workspace=self.workspace.name,
+                variant=variant,
                 extra=self.metadata.to_dict()
             )
             return obj
 
+    def invalidate_cached_models(self):
+        model_cache.invalidate(self.claas_urn)
+        model_cache.invalidate_prefix(self.claas_urn + self.claas_urn_separator())
+        result_cache.invalidate(self.claas_urn, self.claas_urn_separator(), disk_dirs=self.result_cache_dirs())
+
+    def preload(self):
+        """
+        Loads the model and its variants of the current version into the model cache
+        (and warms them up if this is a hot deployment).
+        :raise Exception: If the model cannot be loaded.
+        """
+        self.get_model()
+        manager = BaseDataManager.get()
+        for variant in BaseModelDeployer.model_variants():
+            if manager.get_file_info(self.variant_file_name(variant), self.model_dirs()) is not None:
+                self.get_model(variant)
+        if self.is_hot():
+            self.warm_up()
+
+    def retire_version(self, keys: list[str], dirs: list[str], file_names: list[str], versioned: bool):
+        """
+        Once the requests in flight on a replaced version have drained, removes its cache entries and artifacts.
+        :param keys: Model cache keys of the replaced version.
+        :param dirs: Directory of the replaced version.
+        :param file_names: Artifacts of the replaced version (for non-versioned deployments).
+        :param versioned: Whether the replaced version has its own directory.
+        """
+        def retire():
+            manager = BaseDataManager.get()
+            for key in keys:
+                model_cache.invalidate(key)
+                result_cache.invalidate(key)
+            if versioned:
+                self.remove_version_dir(dirs)
+            else:
+                for file_name in file_names:
+                    manager.delete_file(file_name, dirs)
+
+        inflight_requests.retire(keys[0], retire)
+
     def update(self, data, context, save=True) -> TBoolStr:
         new_deployment_data = data.pop('deploy', None)
+        # cached models and results are dropped only if their keys (name and path) or the default
+        # transform change, not on metadata-only updates (e.g. description)
+        invalidate = new_deployment_data is None and (
+            data.get('name', self.name) != self.name or data.get('path', self.path) != self.path
+            or data.get('transform', self.transform) != self.transform
+        )
+        rewarm = invalidate or data.get('warmup', self.warmup) != self.warmup
+        if invalidate:
+            self.invalidate_cached_models()
+        if 'transform' in data:
+            transform_data = data.pop('transform')
+            result, msg = self.validate_transform(transform_data, context)
+            if not result:
+                return result, msg
+            self.transform = transform_data
+        if 'warmup' in data:
+            warmup_data = data.pop('warmup')
+            if warmup_data is not None and not sch.Schema(self.WARMUP_SCHEMA).is_valid(warmup_data):
+                return False, "Invalid warm-up settings."
+            self.warmup = warmup_data
         if new_deployment_data is None:
             new_name = data.get('name')
-            if new_name is not None:
+            if new_name is not None and self.version is None:
                 with self.resource_read(locked=False, parents_locked=False):
                     self.__manager_rename(new_name)
-            return super().update(data, context, save=save)
-        # we need to delete previous model and then deploy new one
-        with self.resource_write(locked=False, parents_locked=False):
-            name = data.get('name')
-            path = data.get('path')
-            deployer = BaseModelDeployer.get_by_name(new_deployment_data)
-            if deployer is None:
-                return False, "Deployer name is wrong or not existing."
-            # First deploy new model, then delete old one (if necessary)
-            result, msg = deployer.deploy_model(new_deployment_data, context, name, path)
-            if not result:
-                return result, f"Failed to deploy model: '{msg}'"
-            # if another path is provided, delete previous model, otherwise retain it
-            if self.path != path:
-                self.__manager_delete()
-            self.path = path    # update path
-            return super().update(data, context, save=save)
+            return self.__warm_up_after(self.__update_fields(data, context, save), rewarm)
+        # the new model is deployed into a new version directory and preloaded, then the current
+        # version pointer is atomically swapped and the old version is retired after in-flight
+        # requests drain; no resource lock is held, so that predictions are served meanwhile
+        path = data.get('path')
+        deployer = BaseModelDeployer.get_by_name(new_deployment_data)
+        if deployer is None:
+            return False, "Deployer name is wrong or not existing."
+        old_keys = self.model_cache_keys()
+        old_dirs, old_file_names = self.model_dirs(), self.artifact_file_names()
+        old_state = (self.path, self.version, self.backend, self.backend_options, self.deploy_report)
+        version = uuid4().hex
+        report = {}
+        try:
+            result, msg = deployer.deploy_model(
+                new_deployment_data, context, self.ARTIFACT_NAME, self.version_path(path, version), report=report,
+            )
+        except Exception as ex:
+            result, msg = False, f"{type(ex).__name__}: {ex}"
+        if not result:
+            self.remove_version_dir(self.version_dirs(self.workspace, path, version))  # partially written artifacts
+            return False, f"Failed to deploy model: '{msg}'"
+        self.path, self.version = path, version
+        self.set_deployment(deployer, new_deployment_data, report)
+        try:
+            self.preload()
+            swapped = not save or type(self).objects(id=self.id, version=old_state[1]).update_one(
+                set__path=self.path, set__version=self.version, set__backend=self.backend,
+                set__backend_options=self.backend_options, set__deploy_report=self.deploy_report,
+            ) == 1
+            if not swapped:
+                raise RuntimeError("the deployment has been concurrently updated")
+        except Exception as ex:
+            new_dirs = self.model_dirs()
+            self.path, self.version, self.backend, self.backend_options, self.deploy_report = old_state
+            self.remove_version_dir(new_dirs)
+            return False, f"Failed to deploy model: '{type(ex).__name__}: {ex}'"
+        self.retire_version(old_keys, old_dirs, old_file_names, old_state[1] is not None)
+        return self.__update_fields(data, context, save)
+
+    def __update_fields(self, data, context, save: bool) -> TBoolStr:
+        # base fields (name, description) and those set by update() are saved at once
+        result, msg = super().update(data, context, save=False)
+        if result and save and not self.save():
+            return False, "Failed to save deployment."
+        return result, msg
+
+    def __warm_up_after(self, update_result: TBoolStr, rewarm: bool) -> TBoolStr:
+        # hot deployments are reloaded if cached models have been invalidated or warm-up settings changed
+        if rewarm and update_result[0] and self.is_hot():
+            deployment_warmer.submit(self.warm_up)
+        return update_result
 
     def __manager_rename(self, new_name: str) -> TBoolStr:
         manager = BaseDataManager.get()
-        bdir = self.base_dir()
-        path_list = self.get_path_list()
-        dirs = bdir + path_list
-        fname = self.name + '.pt'
-        parents = dirs
-        manager.rename_file(old_name=fname, parents=parents, new_name=new_name+'.pt')
+        parents = self.model_dirs()
+        for fname in self.artifact_file_names():
+            manager.rename_file(old_name=fname, parents=parents, new_name=new_name + fname[len(self.name):])
         return True, None
 
-    def __manager_delete(self) -> TBoolStr:
+    def __manager_delete(self, fname: str = None) -> TBoolStr:
         manager = BaseDataManager.get()
-        bdir = self.base_dir()
-        path_list = self.get_path_list()
-        dirs = bdir + path_list
-        fname = self.name + '.pt'
-        parents = dirs
-        manager.delete_file(fname, parents)
+        parents = self.model_dirs()
+        if fname is None and self.version is not None:
+            self.remove_version_dir(parents)
+            return True, None
+        for fname in [fname] if fname is not None else self.artifact_file_names():
+            manager.delete_file(fname, parents)
         return True, None
 
     @auto_tboolexc
     def delete(self, context: UserWorkspaceResourceContext, locked=False, parents_locked=False) -> TBoolExc:
         with self.resource_delete(locked, parents_locked):
+            self.invalidate_cached_models()
+            deployment_warmer.forget(self.model_cache_key())
             db.Document.delete(self)
             self.__manager_delete()
             return True, None
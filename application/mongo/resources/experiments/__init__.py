@@ -2,4 +2,5 @@ from .datatypes import *
 from .documents import *
 
 from .builds import *
-from .runs import *
\ No newline at end of file
+from .runs import *
+from .jobs import *
\ No newline at end of file
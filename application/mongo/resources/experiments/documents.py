@@ -3,9 +3,11 @@ from datetime import datetime
 from flask import Response
 
 from application.database import db
-from application.utils import t, TBoolExc, auto_tboolexc
+from application.utils import t, TDesc, TBoolExc, auto_tboolexc
 from application.models import User, Workspace
 from application.data_managing import BaseDataManager
+from application.inference import model_cache, result_cache
+from application.experiment_events import experiment_events
 
 from application.resources.contexts import UserWorkspaceResourceContext
 from application.resources.base import DataType, BaseMetadata
@@ -13,6 +15,7 @@ from application.resources.datatypes import BaseCLExperiment
 
 from application.mongo.locking import RWLockableDocument
 from application.mongo.mongo_base_metadata import MongoBaseMetadata
+from application.mongo.loggers import ExtendedCSVLogger
 
 from application.mongo.base import MongoBaseUser, MongoBaseWorkspace
 from application.mongo.resources.mongo_base_configs import *
@@ -83,6 +86,15 @@ class MongoCLExperimentConfig(MongoResourceConfig):
     def _next_exec_id(self):
         return self.current_exec_id + 1
 
+    def events_snapshot(self) -> TDesc:
+        """
+        :return: Data of the 'status' events of the experiment.
+        """
+        return {'status': self.status, 'exec_id': self.current_exec_id}
+
+    def _publish_status(self):
+        experiment_events.publish(self.claas_urn, 'status', self.events_snapshot())
+
     def base_dir(self) -> list[str]:
         workspace: Workspace = self.workspace
         return workspace.experiments_base_dir_parents() \
@@ -125,6 +137,8 @@ class MongoCLExperimentConfig(MongoResourceConfig):
             else:
                 self.build_config.status = BaseCLExperiment.READY
                 result = self.save()
+                if result:
+                    self._publish_status()
                 return result, None if result else \
                     RuntimeError("Failed to setup experiment (modify operation failed).")
 
@@ -147,8 +161,21 @@ class MongoCLExperimentConfig(MongoResourceConfig):
                 self.current_exec_id += 1
                 self.executions.append(execution)
                 result = self.save()
+                if result:
+                    self._publish_status()
                 return exec_id if result else None
 
+    def set_ready(self, locked=False, parents_locked=False) -> bool:
+        """
+        Makes an experiment whose last run has failed or has been interrupted ready to run again.
+        """
+        with self.resource_write(locked=locked, parents_locked=parents_locked):
+            self.build_config.status = BaseCLExperiment.READY
+            result = self.save() is not None
+            if result:
+                self._publish_status()
+            return result
+
     @auto_tboolexc
     def set_finished(self, response: Response, locked=False, parents_locked=False) -> TBoolExc:
         with self.resource_read(locked=locked, parents_locked=parents_locked):
@@ -165,6 +192,13 @@ class MongoCLExperimentConfig(MongoResourceConfig):
                 execution.status_code = status_code
                 execution.payload = payload
                 self.save()
+                self._publish_status()
+                experiment_events.publish(self.claas_urn, experiment_events.END, {
+                    'exec_id': execution.exec_id,
+                    'status_code': status_code,
+                    'success': status_code < 400,
+                    'message': (payload or {}).get('message'),
+                })
                 return True, None
 
     @classmethod
@@ -215,11 +249,16 @@ class MongoCLExperimentConfig(MongoResourceConfig):
               locked=False, parents_locked=False):
         log_folder = self.get_logging_path()
         context.push('log_folder', log_folder)
-        return super().build(context, locked, parents_locked)
+        experiment = super().build(context, locked, parents_locked)
+        if experiment is not None:
+            ExtendedCSVLogger.set_events_channel(experiment.get_strategy().get_value(), self.claas_urn)
+        return experiment
 
     @auto_tboolexc
     def delete(self, context: UserWorkspaceResourceContext, locked=False, parents_locked=False) -> TBoolExc:
         with self.resource_delete(locked=locked, parents_locked=parents_locked):
+            model_cache.invalidate_prefix(self.claas_urn + self.claas_urn_separator())
+            result_cache.invalidate(self.claas_urn, separator=self.claas_urn_separator())
             db.Document.delete(self)
             manager = BaseDataManager.get()
             dirs = self.base_dir()
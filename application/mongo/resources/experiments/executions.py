@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import torch
+
 from application import TDesc, t
+from application.utils import Module, get_device
 from application.database import db
 from application.data_managing import BaseDataManager
+from application.inference import model_cache
 
 from application.resources.contexts import UserWorkspaceResourceContext
 from application.resources.datatypes import BaseCLExperimentExecution, BaseCLExperiment
@@ -10,6 +14,8 @@ from application.resources.datatypes import BaseCLExperimentExecution, BaseCLExp
 
 class MongoCLExperimentExecutionConfig(BaseCLExperimentExecution, db.EmbeddedDocument):
 
+    MODEL_CACHE_NAMESPACE = 'executions'
+
     experiment = db.ReferenceField('MongoCLExperimentConfig', required=True)
     exec_id = db.IntField(required=True)
     started = db.BooleanField(default=False)
@@ -54,6 +60,25 @@ class MongoCLExperimentExecutionConfig(BaseCLExperimentExecution, db.EmbeddedDoc
             model = manager.read_from_file(('model.pt', self.base_dir(), -1))
             return model
 
+    def _load_final_model(self) -> Module:
+        with self.get_final_model(descriptor=True) as model_fd:
+            model = torch.load(model_fd, map_location=get_device())
+        model.eval()
+        return model
+
+    def load_final_model(self) -> Module:
+        """
+        Loads the final model of a completed execution. Since the model of a completed
+        execution never changes, it is loaded only once and then shared by all requests
+        through the process-wide model cache (with the 'executions' byte budget).
+        """
+        if not self.completed:
+            raise RuntimeError(f"Execution #{self.exec_id} is not completed!")
+        return model_cache.get_or_load(
+            self.claas_urn, self._load_final_model,
+            version=str(self.experiment.id), namespace=self.MODEL_CACHE_NAMESPACE,
+        )
+
     def to_dict(self) -> TDesc:
         return {
             'experiment': self.experiment.get_name(),
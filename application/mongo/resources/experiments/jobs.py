@@ -0,0 +1,173 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+
+from application.database import db
+from application.utils import t, TDesc
+
+
+class MongoExperimentJob(db.Document):
+    """
+    A queued run of an experiment. Jobs are claimed by experiment runners (web processes or
+    standalone workers) in (priority, submission) order with a lease that the runner renews
+    while the run is alive: jobs whose lease expires (e.g. because their runner died) are
+    queued again until max_attempts is reached, as failed runs are after a backoff.
+    """
+
+    _COLLECTION = 'experiment_jobs'
+
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+    CANCELLED = 'CANCELLED'
+
+    meta = {
+        'collection': _COLLECTION,
+        'indexes': [
+            ('status', '-priority', 'submitted'),
+            ('owner', 'workspace', 'experiment'),
+        ],
+    }
+
+    owner = db.StringField(required=True)
+    workspace = db.StringField(required=True)
+    experiment = db.StringField(required=True)
+    priority = db.IntField(default=0)
+    status = db.StringField(default=QUEUED)
+    attempts = db.IntField(default=0)
+    max_attempts = db.IntField(default=1)
+    node = db.StringField(default=None)
+    lease_expires = db.DateTimeField(default=None)
+    not_before = db.DateTimeField(default=None)
+    submitted = db.DateTimeField(default=None)
+    started = db.DateTimeField(default=None)
+    finished = db.DateTimeField(default=None)
+    error = db.StringField(default=None)
+    resume_from = db.IntField(default=None)     # execution whose last checkpoint is resumed
+
+    @classmethod
+    def submit(cls, owner: str, workspace: str, experiment: str, priority: int = 0,
+               max_attempts: int = 1, resume_from: int = None) -> MongoExperimentJob:
+        now = datetime.utcnow()
+        # noinspection PyArgumentList
+        job = cls(
+            owner=owner, workspace=workspace, experiment=experiment, priority=priority,
+            max_attempts=max(1, max_attempts), submitted=now, not_before=now, resume_from=resume_from,
+        )
+        job.save()
+        return job
+
+    @classmethod
+    def requeue_expired(cls) -> int:
+        """
+        Queues again the running jobs whose lease has expired, or marks them as failed
+        if they have no attempts left.
+        :return: Number of requeued jobs.
+        """
+        now = datetime.utcnow()
+        requeued = cls.objects(
+            status=cls.RUNNING, lease_expires__lt=now,
+            __raw__={'$expr': {'$lt': ['$attempts', '$max_attempts']}},
+        ).update(set__status=cls.QUEUED, set__node=None, set__not_before=now, set__error="Lease expired")
+        cls.objects(status=cls.RUNNING, lease_expires__lt=now).update(
+            set__status=cls.FAILED, set__finished=now, set__error="Lease expired",
+        )
+        return requeued
+
+    @classmethod
+    def claim(cls, node: str, lease: float) -> MongoExperimentJob | None:
+        """
+        Atomically claims the queued job with the highest priority (the oldest among them).
+        :param node: Name of the claiming runner.
+        :param lease: Lease duration in seconds.
+        :return: The claimed job, or None if no job is available.
+        """
+        now = datetime.utcnow()
+        return cls.objects(status=cls.QUEUED, not_before__lte=now).order_by('-priority', 'submitted').modify(
+            new=True, set__status=cls.RUNNING, set__node=node, set__started=now,
+            set__lease_expires=now + timedelta(seconds=lease), inc__attempts=1,
+        )
+
+    def renew(self, node: str, lease: float) -> bool:
+        """
+        Extends the lease of a job claimed by the given runner.
+        :return: True if the job is still held by the runner, False otherwise.
+        """
+        return type(self).objects(id=self.id, node=node, status=self.RUNNING).update_one(
+            set__lease_expires=datetime.utcnow() + timedelta(seconds=lease),
+        ) > 0
+
+    def complete(self, node: str, success: bool, error: str = None, backoff: float = 0) -> bool:
+        """
+        Marks a job claimed by the given runner as succeeded, or as failed if it has no attempts
+        left, otherwise queues it again after backoff * 2^(attempts - 1) seconds.
+        :return: True if the job was still held by the runner, False otherwise.
+        """
+        now = datetime.utcnow()
+        if success:
+            updates = {'set__status': self.SUCCEEDED, 'set__finished': now, 'set__error': None}
+        elif self.attempts < self.max_attempts:
+            delay = backoff * 2 ** max(0, self.attempts - 1)
+            updates = {
+                'set__status': self.QUEUED, 'set__node': None, 'set__error': error,
+                'set__not_before': now + timedelta(seconds=delay),
+            }
+        else:
+            updates = {'set__status': self.FAILED, 'set__finished': now, 'set__error': error}
+        return type(self).objects(id=self.id, node=node, status=self.RUNNING).update_one(**updates) > 0
+
+    def cancel(self) -> bool:
+        """
+        Cancels a job that has not been claimed yet.
+        """
+        return type(self).objects(id=self.id, status=self.QUEUED).update_one(
+            set__status=self.CANCELLED, set__finished=datetime.utcnow(),
+        ) > 0
+
+    @classmethod
+    def get_by_id(cls, job_id: str) -> MongoExperimentJob | None:
+        try:
+            return cls.objects(id=job_id).first()
+        except db.ValidationError:  # not an ObjectId
+            return None
+
+    @classmethod
+    def get_jobs(cls, owner: str, workspace: str, experiment: str = None,
+                 status: str = None) -> t.Iterable[MongoExperimentJob]:
+        filters = {'owner': owner, 'workspace': workspace}
+        if experiment is not None:
+            filters['experiment'] = experiment
+        if status is not None:
+            filters['status'] = status
+        return cls.objects(**filters).order_by('-submitted')
+
+    def position(self) -> int | None:
+        """
+        :return: Number of queued jobs that will be claimed before this one, or None if it is not queued.
+        """
+        if self.status != self.QUEUED:
+            return None
+        return type(self).objects(status=self.QUEUED, priority__gt=self.priority).count() + \
+            type(self).objects(status=self.QUEUED, priority=self.priority, submitted__lt=self.submitted).count()
+
+    def to_dict(self) -> TDesc:
+        return {
+            'id': str(self.id),
+            'experiment': self.experiment,
+            'priority': self.priority,
+            'status': self.status,
+            'position': self.position(),
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'node': self.node,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error,
+            'resume_from': self.resume_from,
+        }
+
+
+__all__ = [
+    'MongoExperimentJob',
+]
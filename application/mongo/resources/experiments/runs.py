@@ -9,6 +9,7 @@ from avalanche.training.templates import SupervisedTemplate
 
 from application.utils import TDesc, TOptBoolAny
 from application.data_managing import BaseDataManager
+from application.avalanche_ext import checkpoint_writer, read_checkpoint, remove_checkpoint, load_strategy_state
 from application.resources.datatypes import BaseCLExperiment, BaseCLExperimentRunConfig
 
 
@@ -20,15 +21,32 @@ def _save_model(model: Module, model_directory: list[str] = None) -> TOptBoolAny
             print(exc)
             traceback.print_exception(*sys.exc_info())
             return False, exc
+        remove_checkpoint(model_directory)     # the final model supersedes them
     return True, None
 
 
+def _resume(strategy: SupervisedTemplate, resume_directory: list[str] = None) -> tuple[int, list[TDesc]]:
+    """
+    Restores the strategy from the last checkpoint of the given execution directory.
+    :return: A pair (number of completed training experiences, their evaluation results).
+    """
+    if resume_directory is None:
+        return 0, []
+    state = read_checkpoint(resume_directory)
+    if state is None:
+        raise ValueError("No checkpoint to resume from")
+    start, results = load_strategy_state(strategy, state)
+    print(f"Resuming after {start} training experiences ...")
+    return start, results
+
+
 @BaseCLExperimentRunConfig.register_default_run_config()
 @BaseCLExperimentRunConfig.register_run_config('FixedTestSet')
 class StdTrainTestRunConfig(BaseCLExperimentRunConfig):
 
     @classmethod
-    def run(cls, experiment: BaseCLExperiment, model_directory: list[str] = None) -> TOptBoolAny:
+    def run(cls, experiment: BaseCLExperiment, model_directory: list[str] = None,
+            resume_directory: list[str] = None) -> TOptBoolAny:
         try:
             cl_scenario: GenericCLScenario = experiment.get_benchmark().get_value()
             cl_strategy: SupervisedTemplate = experiment.get_strategy().get_value()
@@ -39,11 +57,15 @@ class StdTrainTestRunConfig(BaseCLExperimentRunConfig):
             test_stream = cl_scenario.test_stream
 
             print(f"Using {cl_strategy.__class__.__name__} strategy ...")
-            results: list[TDesc] = []
-            for experience in train_stream:
+            start, results = _resume(cl_strategy, resume_directory)
+            for exp_id, experience in enumerate(train_stream):
+                if exp_id < start:
+                    continue
                 cl_strategy.train(experience)
                 results.append(cl_strategy.eval(test_stream))
+                checkpoint_writer.submit(cl_strategy, exp_id + 1, results, model_directory)
 
+            checkpoint_writer.wait()
             model_saved, exc = _save_model(cl_strategy.model, model_directory)
             return model_saved, results if model_saved else exc
         except Exception as ex:
@@ -55,7 +77,8 @@ class StdTrainTestRunConfig(BaseCLExperimentRunConfig):
 class GrowingTestSetRunConfig(BaseCLExperimentRunConfig):
 
     @classmethod
-    def run(cls, experiment: BaseCLExperiment, model_directory: list[str] = None) -> TOptBoolAny:
+    def run(cls, experiment: BaseCLExperiment, model_directory: list[str] = None,
+            resume_directory: list[str] = None) -> TOptBoolAny:
         try:
             cl_scenario: GenericCLScenario = experiment.get_benchmark().get_value()
             cl_strategy: SupervisedTemplate = experiment.get_strategy().get_value()
@@ -66,13 +89,17 @@ class GrowingTestSetRunConfig(BaseCLExperimentRunConfig):
             test_stream = cl_scenario.test_stream
 
             print(f"Using {cl_strategy.__class__.__name__} strategy ...")
-            results: list[TDesc] = []
+            start, results = _resume(cl_strategy, resume_directory)
             i = 1
-            for experience in train_stream:
+            for exp_id, experience in enumerate(train_stream):
+                if exp_id < start:
+                    continue
                 cl_strategy.train(experience)
                 actual_test_stream = test_stream[:i]
                 results.append(cl_strategy.eval(actual_test_stream))
+                checkpoint_writer.submit(cl_strategy, exp_id + 1, results, model_directory)
 
+            checkpoint_writer.wait()
             model_saved, exc = _save_model(cl_strategy.model, model_directory)
             return model_saved, results if model_saved else exc
         except Exception as ex:
@@ -84,7 +111,8 @@ class GrowingTestSetRunConfig(BaseCLExperimentRunConfig):
 class JointTrainingRunConfig(BaseCLExperimentRunConfig):
 
     @classmethod
-    def run(cls, experiment: BaseCLExperiment, model_directory: list[str] = None) -> TOptBoolAny:
+    def run(cls, experiment: BaseCLExperiment, model_directory: list[str] = None,
+            resume_directory: list[str] = None) -> TOptBoolAny:
         try:
             cl_scenario: GenericCLScenario = experiment.get_benchmark().get_value()
             cl_strategy: SupervisedTemplate = experiment.get_strategy().get_value()
@@ -94,6 +122,9 @@ class JointTrainingRunConfig(BaseCLExperimentRunConfig):
             # noinspection PyUnresolvedReferences
             test_stream = cl_scenario.test_stream
 
+            if resume_directory is not None:    # no experience boundaries to checkpoint at
+                return False, ValueError("Joint training runs cannot be resumed")
+
             print(f"Using {cl_strategy.__class__.__name__} strategy ...")
             results: list[TDesc] = []
             cl_strategy.train(train_stream)
@@ -50,7 +50,14 @@ class BaseCLExperimentRunConfig:
             return cls.get_by_name(obj)
 
     @abstractmethod
-    def run(self, experiment: BaseCLExperiment, model_directory: list[str] = None) -> TOptBoolAny:
+    def run(self, experiment: BaseCLExperiment, model_directory: list[str] = None,
+            resume_directory: list[str] = None) -> TOptBoolAny:
+        """
+        :param experiment:
+        :param model_directory: Directory of the execution, where the final model (and checkpoints) are saved.
+        :param resume_directory: If given, directory of a previous execution whose last checkpoint is
+        restored before training on the remaining experiences.
+        """
         pass
 
 
@@ -96,12 +103,12 @@ class BaseCLExperiment(ReferrableDataType):
     def get_metadata(self, key: str | None = None) -> TDesc | t.Any:
         return super().get_metadata(key)
 
-    def run(self, model_directory: list[str] = None) -> TOptBoolAny:
+    def run(self, model_directory: list[str] = None, resume_directory: list[str] = None) -> TOptBoolAny:
         run_config = self.get_run_configuration()
         if run_config is None:
             return None, None
         else:
-            return run_config.run(self, model_directory=model_directory)
+            return run_config.run(self, model_directory=model_directory, resume_directory=resume_directory)
 
     def is_running(self):
         return self.get_status() == self.RUNNING
@@ -144,6 +151,10 @@ class BaseCLExperimentExecution(JSONSerializable, URIBasedResource):
     def get_final_model(self, descriptor=False):
         pass
 
+    @abstractmethod
+    def load_final_model(self):
+        pass
+
 
 __all__ = [
     'BaseCLExperimentRunConfig',
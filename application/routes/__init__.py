@@ -15,6 +15,7 @@ from .experiments import *
 
 from .deployments import *
 from .predictions import *
+from .inference import *
 
 blueprints = {
     auth_bp,
@@ -32,4 +33,5 @@ blueprints = {
     experiments_bp,
     deployments_bp,
     predictions_bp,
+    inference_bp,
 }
\ No newline at end of file
@@ -1,2 +1,3 @@
 from .tokens import *
+from .limits import *
 from .routes import *
\ No newline at end of file
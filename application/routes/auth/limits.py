@@ -0,0 +1,203 @@
+"""
+Admission control of expensive endpoints: per-user rate limits and per-deployment concurrency caps.
+"""
+from __future__ import annotations
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import Flask, Response
+
+from application.utils import t, TDesc
+from application.errors import *
+from .tokens import token_auth
+
+
+class TokenBucket:
+    """
+    Bucket of at most burst tokens, refilled at rate tokens per second.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        return self.tokens
+
+    def acquire(self) -> float:
+        """
+        :return: 0 if a token has been taken, otherwise the seconds until one is available.
+        """
+        if self.refill() >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter of requests per (user, endpoint class), which rejects requests
+    beyond the limit immediately with a 429 response and a 'Retry-After' header instead of
+    queueing them, so that a single user cannot starve the others. Buckets are process-local;
+    with the 'mongo' backend, requests are instead counted in fixed windows of burst / rate
+    seconds in a collection shared by all the server processes (falling back to the local
+    buckets if MongoDB fails).
+    It also caps the number of concurrent prediction requests on each deployment.
+    """
+
+    PREDICT = 'predict'
+    UPLOAD = 'upload'
+
+    LOCAL = 'local'
+    MONGO = 'mongo'
+
+    # (requests per second, burst); a rate <= 0 means no limit
+    _DFL_LIMITS = {
+        PREDICT: (20.0, 40.0),
+        UPLOAD: (0.5, 5.0),
+    }
+    _DFL_MAX_CONCURRENCY = 0
+    _MAX_BUCKETS = 10000
+
+    def __init__(self, app: Flask = None, enabled: bool = False, backend: str = LOCAL,
+                 limits: dict[str, tuple[float, float]] = None, max_concurrency: int = _DFL_MAX_CONCURRENCY):
+        self.enabled = enabled
+        self.backend = backend
+        self.limits = dict(limits if limits is not None else self._DFL_LIMITS)
+        self.max_concurrency = max_concurrency
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}
+        self._active: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.rejected: dict[str, int] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if app is None:
+            raise ValueError("'app' must be not None")
+        self.enabled = app.config.get('RATE_LIMITS', self.enabled)
+        self.backend = app.config.get('RATE_LIMIT_BACKEND', self.backend)
+        if self.backend not in (self.LOCAL, self.MONGO):
+            raise ValueError(f"Unknown rate limit backend '{self.backend}'")
+        for endpoint_class, (rate, burst) in self.limits.items():
+            prefix = f"RATE_LIMIT_{endpoint_class.upper()}"
+            self.limits[endpoint_class] = (
+                app.config.get(f"{prefix}_RATE", rate), app.config.get(f"{prefix}_BURST", burst),
+            )
+        self.max_concurrency = app.config.get('PREDICTION_MAX_CONCURRENCY', self.max_concurrency)
+
+    def _prune(self):
+        # Drops buckets that are full again (must be called with lock held)
+        for key in [key for key, bucket in self._buckets.items() if bucket.refill() >= bucket.burst]:
+            self._buckets.pop(key)
+
+    def _acquire_local(self, name: str, endpoint_class: str, rate: float, burst: float) -> float:
+        with self._lock:
+            bucket = self._buckets.get((name, endpoint_class))
+            if bucket is None:
+                if len(self._buckets) >= self._MAX_BUCKETS:
+                    self._prune()
+                bucket = TokenBucket(rate, burst)
+                self._buckets[(name, endpoint_class)] = bucket
+            return bucket.acquire()
+
+    def acquire(self, name: str, endpoint_class: str) -> float:
+        """
+        Takes a token for a request of the given user to the given endpoint class.
+        :return: 0 if the request is admitted, otherwise the seconds after which it can be retried.
+        """
+        rate, burst = self.limits.get(endpoint_class, (0, 0))
+        if rate <= 0:
+            return 0.0
+        if self.backend == self.MONGO:
+            from application.mongo import MongoRateCounter
+
+            try:
+                count, remaining = MongoRateCounter.increment(f"{name}:{endpoint_class}", window=burst / rate)
+                return 0.0 if count <= burst else remaining
+            except Exception:
+                pass
+        return self._acquire_local(name, endpoint_class, rate, burst)
+
+    def too_many_requests(self, endpoint_class: str, retry_after: float, msg: str = None) -> Response:
+        with self._lock:
+            self.rejected[endpoint_class] = self.rejected.get(endpoint_class, 0) + 1
+        response = TooManyRequests(msg=msg)
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def limit(self, endpoint_class: str):
+        """
+        Route decorator (to be applied after authentication) that rate-limits requests of each user.
+        """
+        def wrapper(f: t.Callable):
+            @wraps(f)
+            def new_f(*args, **kwargs):
+                if self.enabled:
+                    username = token_auth.current_user().username
+                    retry_after = self.acquire(username, endpoint_class)
+                    if retry_after > 0:
+                        return self.too_many_requests(
+                            endpoint_class, retry_after,
+                            msg=f"Too many '{endpoint_class}' requests: retry after {math.ceil(retry_after)} seconds.",
+                        )
+                return f(*args, **kwargs)
+            return new_f
+        return wrapper
+
+    @contextmanager
+    def slot(self, key: str) -> t.Iterator[bool]:
+        """
+        Occupies one of the max_concurrency request slots of the given deployment.
+        :return: A context manager yielding whether the request has been admitted
+        (always, if concurrency is not capped).
+        """
+        if not self.enabled or self.max_concurrency <= 0:
+            yield True
+            return
+        with self._lock:
+            active = self._active.get(key, 0)
+            admitted = active < self.max_concurrency
+            if admitted:
+                self._active[key] = active + 1
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                with self._lock:
+                    self._active[key] -= 1
+                    if self._active[key] == 0:
+                        self._active.pop(key)
+
+    def stats(self) -> TDesc:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'backend': self.backend,
+                'limits': {
+                    endpoint_class: {'rate': rate, 'burst': burst}
+                    for endpoint_class, (rate, burst) in self.limits.items()
+                },
+                'max_concurrency': self.max_concurrency,
+                'buckets': len(self._buckets),
+                'active': dict(self._active),
+                'rejected': dict(self.rejected),
+            }
+
+
+rate_limiter = RateLimiter()
+
+
+__all__ = [
+    'TokenBucket',
+    'RateLimiter',
+    'rate_limiter',
+]
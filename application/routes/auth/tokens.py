@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 from functools import wraps
-from flask import Response, g
+from flask import Response, g, current_app
 from flask_httpauth import HTTPTokenAuth
 
 from application.utils import t
 from application.models import check_token
 from application.errors import *
+from application.inference import request_span
 
 token_auth = HTTPTokenAuth()
 
@@ -14,7 +15,8 @@ token_auth = HTTPTokenAuth()
 @token_auth.verify_token
 def verify_token(token):
     g.missing_token = (len(token) == 0)
-    return check_token(token)
+    with request_span('auth'):
+        return check_token(token)
 
 
 @token_auth.error_handler
@@ -65,6 +67,21 @@ def tuple_check_ownership(msg: str = None, eval_args: dict[str, str] = None, *ms
     return wrapper
 
 
+def is_current_user_admin() -> bool:
+    current_user = token_auth.current_user()
+    return current_user is not None and current_user.email in current_app.config.get('ADMINS', [])
+
+
+# Decorator for server-wide (i.e., not owned by any user) endpoints, reserved to the administrators
+def admin_required(f: t.Callable):
+    @wraps(f)
+    def new_f(*args, **kwargs):
+        if not is_current_user_admin():
+            return ForbiddenOperation(msg="Only administrators can access this resource.")
+        return f(*args, **kwargs)
+    return new_f
+
+
 __all__ = [
     'token_auth',
     'verify_token',
@@ -73,4 +90,6 @@ __all__ = [
     'check_current_user_ownership',
     'check_ownership',
     'tuple_check_ownership',
+    'is_current_user_admin',
+    'admin_required',
 ]
\ No newline at end of file
@@ -248,6 +248,7 @@ def delete_sub_folder(username, wname, name, path):
 @data_repositories_bp.patch('/<resource:name>/folders/files/<path:path>')
 @token_auth.login_required
 @check_ownership("You cannot send files to another user ({user}) repository.", eval_args={'user': 'username'})
+@rate_limiter.limit(RateLimiter.UPLOAD)
 def send_files(username, wname, name, path):
     """
     RequestSyntax:
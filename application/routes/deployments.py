@@ -37,6 +37,14 @@ def create_deployed_model(username, wname):
         "description": ...,
         "path": ...,
         "deploy": ... # deployment config selection
+        "transform": ... # default input transform for predictions (optional)
+        "warmup": { # warm-up settings (optional)
+            "input_shape": [<int>, ...], # shape of a single input for warm-up forward passes
+            "batch_size": <int>, # size of the warm-up batch (defaults to 1)
+            "hot": <bool>, # preload at server start and after deploys (defaults to true)
+            "task_label": <int>, # for multi-head models
+            "variants": [<str>, ...] # model variants to warm up too
+        }
     }
     :param username:
     :param wname:
@@ -83,7 +91,7 @@ def update_deployed_model_metadata(username, wname, name):
 @deployments_bp.patch('/<resource:name>/redeploy/')
 @deployments_bp.patch('/<resource:name>/redeploy')
 @token_auth.login_required
-@check_json(False, required={'name', 'path', 'deploy'}, optionals={'description'})
+@check_json(False, required={'name', 'path', 'deploy'}, optionals={'description', 'transform', 'warmup'})
 def redeploy_model(username, wname, name):
     """
     Redeploys a previously deployed model, i.e. substitutes the previous model
@@ -2,16 +2,21 @@ from __future__ import annotations
 
 import sys
 import traceback
-from flask import Blueprint, Response, send_file
+from flask import Blueprint, Response, request, send_file, stream_with_context
 from http import HTTPStatus
 
 from application.errors import *
 from application.utils import *
 from application.database import *
+from application.experiment_queue import experiment_runner
+from application.experiment_isolation import experiment_processes
+from application.experiment_events import experiment_events
+from application.avalanche_ext import checkpoint_writer, has_checkpoint
 
 from application.resources.contexts import UserWorkspaceResourceContext
 from application.resources.base import DataType
 from application.resources.datatypes import BaseCLExperiment
+from application.mongo.resources.experiments import MongoExperimentJob
 
 from .auth import token_auth
 from .resources import *
@@ -19,6 +24,7 @@ from .resources import *
 _DFL_EXPERIMENT_NAME = DataType.get_type(BaseCLExperiment.canonical_typename()).__name__
 
 _EXPERIMENT_START = "START"
+_EXPERIMENT_RESUME = "RESUME"
 
 experiments_bp = Blueprint('experiments', __name__,
                            url_prefix='/users/<user:username>/workspaces/<workspace:wname>/experiments')
@@ -36,8 +42,8 @@ def experiment_args(experiment):
     }
 
 
-def _experiment_run_task(experiment_config_name: str,
-                         context: UserWorkspaceResourceContext) -> Response:
+def _experiment_run_task(experiment_config_name: str, context: UserWorkspaceResourceContext,
+                         resume_from: int = None) -> Response:
     username = context.get_username()
     wname = context.get_workspace()
     experiment_config, err_response = get_resource(username, wname, typename=_DFL_EXPERIMENT_NAME, name=experiment_config_name)
@@ -51,10 +57,13 @@ def _experiment_run_task(experiment_config_name: str,
         try:
             with experiment_config.resource_write():
                 try:
-                    print('Before building experiment')
-                    experiment: BaseCLExperiment = experiment_config.build(context, locked=True)
-                    print('After having built experiment!')
-                    if experiment is None:
+                    isolated = experiment_processes.isolated
+                    experiment: BaseCLExperiment | None = None  # if isolated, built and run by a child process
+                    if not isolated:
+                        print('Before building experiment')
+                        experiment = experiment_config.build(context, locked=True)
+                        print('After having built experiment!')
+                    if experiment is None and not isolated:
                         response = make_error(HTTPStatus.INTERNAL_SERVER_ERROR, msg="Failed to initialize experiment!")
                     else:
                         start_result = experiment_config.set_started(locked=True)
@@ -63,9 +72,16 @@ def _experiment_run_task(experiment_config_name: str,
                                 HTTPStatus.INTERNAL_SERVER_ERROR,
                                 msg=f"Failed to start experiment #{start_result}.")
                         else:
-                            success, results = experiment.run(
-                                experiment_config.get_last_execution().base_dir(),
-                            )
+                            base_dir = experiment_config.get_last_execution().base_dir()
+                            resume_directory = None
+                            if resume_from is not None:
+                                resume_directory = experiment_config.get_execution(resume_from).base_dir()
+                            if experiment is None:
+                                success, results = experiment_processes.run(
+                                    username, wname, experiment_config_name, base_dir, resume_directory,
+                                )
+                            else:
+                                success, results = experiment.run(base_dir, resume_directory)
                             if success is None:  # results is None
                                 response = ResourceNotFound(msg="Experiment run configuration does not exist.")
                             elif success:   # results is dict
@@ -100,6 +116,19 @@ def _experiment_run_task(experiment_config_name: str,
             return response
 
 
+@experiment_runner.task
+def _experiment_job_task(job: MongoExperimentJob) -> Response:
+    context = UserWorkspaceResourceContext(job.owner, job.workspace)
+    if job.attempts > 1 or job.resume_from is not None:     # previous run failed or was interrupted
+        experiment_config, err_response = get_resource(
+            job.owner, job.workspace, typename=_DFL_EXPERIMENT_NAME, name=job.experiment,
+        )
+        if err_response:
+            return err_response
+        experiment_config.set_ready()
+    return _experiment_run_task(job.experiment, context, resume_from=job.resume_from)
+
+
 @experiments_bp.post('/')
 @experiments_bp.post('')
 @token_auth.login_required
@@ -125,12 +154,21 @@ def setup_experiment(username, wname, name):
 @experiments_bp.patch('/<experiment:name>/status/')
 @experiments_bp.patch('/<experiment:name>/status')
 @token_auth.login_required
-@check_json(False, required={'status'})
+@check_json(False, required={'status'}, optionals={'priority', 'exec_id'})
 def set_experiment_status(username, wname, name):
     """
+    Queues a run of the experiment, that is executed by the first available experiment runner.
+    A "RESUME" run is a new execution that restarts from the last checkpoint (i.e., the last
+    completed training experience) of a failed or interrupted one.
     RequestSyntax:
     {
-        "status": "START"
+        "status": "START"/"RESUME",
+        "priority": <int>, (optional, runs with higher priority are executed first, defaults to 0)
+        "exec_id": <int> (optional, execution to resume, defaults to the last one)
+    }
+    ResponseSyntax:
+    {
+        "job": <queued job>
     }
     :param username:
     :param wname:
@@ -139,12 +177,84 @@ def set_experiment_status(username, wname, name):
     """
     data, opts, extras = get_check_json_data()
     status = data.get('status')
-    if status == _EXPERIMENT_START:
-        context = UserWorkspaceResourceContext(username, wname)
-        executor.submit(_experiment_run_task, name, context)
-        return make_success_dict(msg="Experiment successfully submitted!")
+    if status in (_EXPERIMENT_START, _EXPERIMENT_RESUME):
+        experiment_config, err_response = get_resource(username, wname, typename=_DFL_EXPERIMENT_NAME, name=name)
+        if err_response:
+            return err_response
+        try:
+            priority = int(data.get('priority', 0))
+        except (TypeError, ValueError):
+            return InvalidParameterValue(msg="'priority' must be an integer.")
+        resume_from = None
+        if status == _EXPERIMENT_RESUME:
+            if experiment_config.status == BaseCLExperiment.RUNNING:
+                return ResourceInUse(msg="Experiment is still running.")
+            try:
+                resume_from = int(data.get('exec_id', experiment_config.current_exec_id))
+                if resume_from < 1:
+                    raise ValueError(resume_from)
+                execution = experiment_config.get_execution(resume_from)
+            except (TypeError, ValueError, IndexError):
+                return InvalidParameterValue(msg=f"Invalid execution id '{data.get('exec_id')}'.")
+            if not has_checkpoint(execution.base_dir()):
+                return ResourceNotFound(msg=f"Execution #{resume_from} has no checkpoint to resume from.")
+        job = experiment_runner.submit(username, wname, name, priority=priority, resume_from=resume_from)
+        return make_success_dict(msg="Experiment successfully submitted!", data={'job': job.to_dict()})
     else:
-        return ForbiddenOperation(msg="You can only start an experiment!")
+        return ForbiddenOperation(msg="You can only start or resume an experiment!")
+
+
+@experiments_bp.get('/queue/')
+@experiments_bp.get('/queue')
+@token_auth.login_required
+def get_experiment_queue(username, wname):
+    """
+    Returns the queued, running and completed experiment runs of the workspace, optionally
+    filtered by "experiment" and "status" query parameters, and the state of the runner of
+    this server process.
+    :param username:
+    :param wname:
+    :return:
+    """
+    experiment = request.args.get('experiment', None)
+    status = request.args.get('status', None)
+    jobs = MongoExperimentJob.get_jobs(username, wname, experiment=experiment, status=status)
+    return make_success_dict(data={
+        'jobs': [job.to_dict() for job in jobs],
+        'runner': experiment_runner.stats(),
+        'isolation': experiment_processes.stats(),
+        'checkpoints': checkpoint_writer.stats(),
+        'events': experiment_events.stats(),
+    })
+
+
+@experiments_bp.get('/queue/<job_id>/')
+@experiments_bp.get('/queue/<job_id>')
+@token_auth.login_required
+def get_experiment_job(username, wname, job_id):
+    job = MongoExperimentJob.get_by_id(job_id)
+    if job is None or job.owner != username or job.workspace != wname:
+        return ResourceNotFound(resource=job_id)
+    return make_success_dict(data={'job': job.to_dict()})
+
+
+@experiments_bp.delete('/queue/<job_id>/')
+@experiments_bp.delete('/queue/<job_id>')
+@token_auth.login_required
+def cancel_experiment_job(username, wname, job_id):
+    """
+    Cancels a queued experiment run (runs already started cannot be cancelled).
+    :param username:
+    :param wname:
+    :param job_id:
+    :return:
+    """
+    job = MongoExperimentJob.get_by_id(job_id)
+    if job is None or job.owner != username or job.workspace != wname:
+        return ResourceNotFound(resource=job_id)
+    if not job.cancel():
+        return ForbiddenOperation(msg=f"Experiment job '{job_id}' is not queued anymore.")
+    return make_success_dict(msg="Experiment job successfully cancelled.")
 
 
 @experiments_bp.get('/<experiment:name>/status/')
@@ -164,6 +274,42 @@ def get_experiment_status(username, wname, name):
             return make_success_dict(data={'status': experiment_config.status})
 
 
+@experiments_bp.get('/<experiment:name>/events/')
+@experiments_bp.get('/<experiment:name>/events')
+@token_auth.login_required
+def get_experiment_events(username, wname, name):
+    """
+    Streams the live events of the experiment as server-sent events (text/event-stream) until
+    the end of the current or next run (the stream is closed after its "end" event) or the
+    client disconnects: "status" (starting with the current one, then on each transition),
+    "epoch" and "experience" (ends of training epochs and experiences, with training metrics),
+    "eval" (evaluation results on each test experience) and "end" (outcome of a run).
+    Reconnecting clients can send a 'Last-Event-ID' header for receiving the missed events
+    (only with the 'mongo' events backend).
+    :param username:
+    :param wname:
+    :param name:
+    :return:
+    """
+    if not experiment_events.enabled:
+        return ServiceUnavailable(msg="Experiment events are disabled.")
+    experiment_config, err_response = get_resource(username, wname, typename=_DFL_EXPERIMENT_NAME, name=name)
+    if err_response:
+        return err_response
+
+    def snapshot():
+        current, _ = get_resource(username, wname, typename=_DFL_EXPERIMENT_NAME, name=name)
+        return (current or experiment_config).events_snapshot()
+
+    events = experiment_events.stream(
+        experiment_config.claas_urn, snapshot=snapshot, last_event_id=request.headers.get('Last-Event-ID'),
+    )
+    return Response(
+        stream_with_context(events), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @experiments_bp.get('/<experiment:name>/results/exec/')
 @experiments_bp.get('/<experiment:name>/results/exec')
 @token_auth.login_required
@@ -284,6 +430,11 @@ __all__ = [
 
     'set_experiment_status',
     'get_experiment_status',
+    'get_experiment_events',
+
+    'get_experiment_queue',
+    'get_experiment_job',
+    'cancel_experiment_job',
 
     'get_experiment_results',
     'get_experiment_execution_results',
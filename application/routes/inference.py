@@ -0,0 +1,162 @@
+from flask import Blueprint
+from http import HTTPStatus
+
+from application.utils import *
+from application.inference import model_cache, batch_scheduler, decode_pool, result_cache, transform_cache, deployment_warmer, \
+    inflight_requests, latency_recorder, inference_workers
+from .auth import token_auth, admin_required, rate_limiter
+
+
+# Statistics cover the resources of all the users: all the endpoints are reserved to the administrators
+inference_bp = Blueprint('inference', __name__, url_prefix='/inference')
+
+
+@inference_bp.get('/cache/')
+@inference_bp.get('/cache')
+@token_auth.login_required
+@admin_required
+def get_model_cache_stats():
+    """
+    Returns hit/miss/eviction counters and occupation of the in-process model cache.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'cache': model_cache.stats()})
+
+
+@inference_bp.get('/batching/')
+@inference_bp.get('/batching')
+@token_auth.login_required
+@admin_required
+def get_batching_stats():
+    """
+    Returns per-model statistics of the prediction micro-batching scheduler.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'batching': batch_scheduler.stats()})
+
+
+@inference_bp.get('/decoding/')
+@inference_bp.get('/decoding')
+@token_auth.login_required
+@admin_required
+def get_decoding_stats():
+    """
+    Returns configuration and counters of the input decoding pool.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'decoding': decode_pool.stats()})
+
+
+@inference_bp.get('/results/')
+@inference_bp.get('/results')
+@token_auth.login_required
+@admin_required
+def get_result_cache_stats():
+    """
+    Returns hit/miss counters and occupation of the prediction result cache.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'results': result_cache.stats()})
+
+
+@inference_bp.get('/transforms/')
+@inference_bp.get('/transforms')
+@token_auth.login_required
+@admin_required
+def get_transform_cache_stats():
+    """
+    Returns hit/miss counters and occupation of the compiled transform cache.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'transforms': transform_cache.stats()})
+
+
+@inference_bp.get('/warmup/')
+@inference_bp.get('/warmup')
+@token_auth.login_required
+@admin_required
+def get_warmup_stats():
+    """
+    Returns load and warm-up forward times of preloaded deployments.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'warmup': deployment_warmer.stats()})
+
+
+@inference_bp.get('/inflight/')
+@inference_bp.get('/inflight')
+@token_auth.login_required
+@admin_required
+def get_inflight_stats():
+    """
+    Returns in-flight prediction requests per deployment version and versions being retired.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'inflight': inflight_requests.stats()})
+
+
+@inference_bp.get('/workers/')
+@inference_bp.get('/workers')
+@token_auth.login_required
+@admin_required
+def get_workers_stats():
+    """
+    Returns processes, threads and per-process load of the inference worker pool.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'workers': inference_workers.stats()})
+
+
+@inference_bp.get('/limits/')
+@inference_bp.get('/limits')
+@token_auth.login_required
+@admin_required
+def get_rate_limit_stats():
+    """
+    Returns per-user rate limits, active requests per deployment and rejected requests.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'limits': rate_limiter.stats()})
+
+
+@inference_bp.get('/latency/')
+@inference_bp.get('/latency')
+@token_auth.login_required
+@admin_required
+def get_latency_stats():
+    """
+    Returns count, mean, p50, p95, p99 and max latency (in seconds) of each prediction
+    stage, for each deployment and experiment execution.
+    :return:
+    """
+    return make_success_dict(HTTPStatus.OK, data={'latency': latency_recorder.stats()})
+
+
+@inference_bp.delete('/latency/')
+@inference_bp.delete('/latency')
+@token_auth.login_required
+@admin_required
+def reset_latency_stats():
+    """
+    Clears the prediction latency histograms.
+    :return:
+    """
+    latency_recorder.reset()
+    return make_success_dict(HTTPStatus.OK, msg='Latency statistics cleared')
+
+
+__all__ = [
+    'inference_bp',
+
+    'get_model_cache_stats',
+    'get_batching_stats',
+    'get_decoding_stats',
+    'get_result_cache_stats',
+    'get_transform_cache_stats',
+    'get_warmup_stats',
+    'get_inflight_stats',
+    'get_workers_stats',
+    'get_rate_limit_stats',
+    'get_latency_stats',
+    'reset_latency_stats',
+]
@@ -1,12 +1,9 @@
 from __future__ import annotations
 
-import io
 import json
-from werkzeug.datastructures import FileStorage
+from contextlib import ExitStack
 
-import torch
-from torchvision.transforms import ToTensor
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, send_file
 from http import HTTPStatus
 
 from application.errors import *
@@ -16,9 +13,15 @@ from application.resources.contexts import UserWorkspaceResourceContext
 from application.resources.base import DataType, ReferrableDataType
 from application.resources.datatypes import BaseCLExperiment
 
+from application.models import Workspace
+from application.data_managing import BaseDataManager, BaseDataRepository
+from application.inference import predict_files, PredictionJob, RepositoryFilesDataset, prediction_jobs, \
+    result_cache, transform_hash, RESPONSE_FORMATS, RESPONSE_MIMETYPES, NPY, MSGPACK, results_to_npy, \
+    results_to_msgpack, validate_response_format, inflight_requests, latency_recorder, current_spans, \
+    request_span, inference_engine
 from application.mongo.resources.benchmarks import TransformConfig
 
-from .auth import token_auth
+from .auth import token_auth, rate_limiter, RateLimiter
 from .resources import *
 
 predictions_bp = Blueprint(
@@ -36,38 +39,143 @@ _DFL_DEPLOYED_MODEL_NAME_ = "DeployedModel"
 
 
 def get_transform(username, wname, info):
-    transform_data = info.get('transform', None)
-    if transform_data is not None:
-        transform_config: t.Type[TransformConfig] = TransformConfig.get_by_name(transform_data)
-        context = UserWorkspaceResourceContext(username, wname)
-        transform: TransformConfig | None = transform_config.create(transform_data, context)
-        return transform.get_transform()
-    return ToTensor()
-
-
-def predict(model: Module, input_data: list[FileStorage], transform, mode: str = 'plain') -> dict[str, int] | NotImplemented:
-    if mode == 'plain':
-        input_bytes: dict[str, io.BytesIO] = {inp.filename: inp.read() for inp in input_data}
-        output_bytes: dict[str, int] = {}
-        # input_bytes = [inp.read() for inp in input_data]
-        tensors = [transform(item_bytes).unsqueeze(0) for item_bytes in input_bytes.values()]
-        device = get_device()
-        tensors = [tensor.to(device) for tensor in tensors]
-        batch_tensor = torch.stack(tensors)
-        batch_tensor = batch_tensor.to(device)
-        model.eval()
-        outputs: torch.Tensor = model(batch_tensor)
-        _, y_hat = outputs.max(1)
-        y_hat = y_hat.to('cpu').numpy().astype(int)
-        i = 0
-        for filename in input_bytes.keys():
-            output_bytes[filename] = int(y_hat[i])
-            i += 1
-        return output_bytes
-    elif mode == 'zip':
-        return NotImplemented
-    else:
-        raise ValueError(f"Unknown file transfer mode '{mode}'")
+    """
+    Retrieves the (compiled) transform for the given request info from the process-wide
+    transform cache, so that it is built only once per transform configuration.
+    """
+    context = UserWorkspaceResourceContext(username, wname)
+    return TransformConfig.compile(info.get('transform', None), context)
+
+
+def parse_top_k(top_k):
+    """
+    :return: The number of most probable classes to return for each input, or None if not given.
+    :raise ValueError: If top_k is not an integer >= 1 (larger values are clamped to the number of classes).
+    """
+    if top_k is None:
+        return None
+    try:
+        value = int(top_k)
+    except (TypeError, ValueError):
+        raise ValueError(f"'top_k' must be an integer, got '{top_k}'")
+    if value < 1:
+        raise ValueError(f"'top_k' must be at least 1, got {value}")
+    return value
+
+
+def prediction_options(info):
+    """
+    Optional outputs of a prediction request: top-k class ids with softmax
+    scores ("top_k": <int>) and per-stage timings ("timings": true), and format
+    of tensor inputs ("input_format": "npy"/"raw", "shape": [<int>, ...], "dtype": <str>),
+    and task labels for multi-head models ("task_labels": <int> or {<filename>: <int>}).
+    """
+    top_k = parse_top_k(info.get('top_k', None))
+    shape = info.get('shape', None)
+    task_labels = info.get('task_labels', None)
+    if isinstance(task_labels, dict):
+        task_labels = {name: int(label) for name, label in task_labels.items()}
+    elif task_labels is not None:
+        task_labels = int(task_labels)
+    return {
+        'top_k': top_k,
+        'scores': {} if top_k is not None else None,
+        'timings': {},      # always collected for latency statistics
+        'return_timings': bool(info.get('timings', False)),
+        'input_format': info.get('input_format', None),
+        'shape': [int(dim) for dim in shape] if shape is not None else None,
+        'dtype': info.get('dtype', 'float32'),
+        'task_labels': task_labels,
+    }
+
+
+def prediction_data(result, scores=None, timings=None, return_timings=False, **kwargs):
+    data = {'class_ids': result}
+    if scores is not None:
+        data['scores'] = scores
+    if return_timings:
+        data['timings'] = timings   # per-stage times in seconds
+    return data
+
+
+def record_prediction_spans(key, timings):
+    """
+    Adds the per-stage times of a prediction to the spans of the current request,
+    which are aggregated under the given key (e.g. the deployment claas_urn).
+    """
+    spans = current_spans()
+    if spans is not None:
+        spans.key = key
+        for name, seconds in (timings or {}).items():
+            spans.add('predict' if name == 'total' else name, seconds)
+
+
+def response_format(info):
+    """
+    Format of prediction results, given by "response_format" in the request info or negotiated
+    through the Accept header ("json", "npy" or "msgpack", defaults to "json").
+    :raise ValueError: If the requested format is unknown or not available.
+    """
+    fmt = info.get('response_format', None)
+    if fmt is None:
+        mimetype = request.accept_mimetypes.best_match([RESPONSE_MIMETYPES[name] for name in RESPONSE_FORMATS])
+        fmt = {mime: name for name, mime in RESPONSE_MIMETYPES.items()}.get(mimetype, RESPONSE_FORMATS[0])
+    validate_response_format(fmt)
+    return fmt
+
+
+def prediction_response(result, fmt, scores=None, timings=None, return_timings=False, **kwargs):
+    """
+    Builds the response of a successful prediction, as JSON (see prediction_data) or as
+    ordered file names, class ids and (optional) scores in a binary format.
+    """
+    with request_span('encode'):
+        return _prediction_response(result, fmt, scores, timings if return_timings else None, **kwargs)
+
+
+def _prediction_response(result, fmt, scores=None, timings=None, **kwargs):
+    if fmt == NPY or fmt == MSGPACK:
+        files = list(result.keys())
+        class_ids = [result[file] for file in files]
+        file_scores = [scores[file] for file in files] if scores is not None else None
+        if fmt == NPY:
+            content = results_to_npy(files, class_ids, file_scores)
+        else:
+            content = results_to_msgpack(files, class_ids, file_scores, timings=timings)
+        return Response(content, status=HTTPStatus.OK, mimetype=RESPONSE_MIMETYPES[fmt])
+    return make_success_dict(
+        HTTPStatus.OK, msg="Prediction correctly executed",
+        data=prediction_data(result, scores=scores, timings=timings, return_timings=timings is not None, **kwargs),
+    )
+
+
+def build_current_version(stack: ExitStack, deployed_model_config, username, wname, path,
+                          context: UserWorkspaceResourceContext, variant: str = None):
+    """
+    Builds the model of the current version of a deployment, marking the request as in-flight on
+    that version until the given stack is closed, so that it is not retired meanwhile. If the version
+    has been replaced by a concurrent redeploy after the deployment was read (and its artifacts are
+    being retired), the deployment is read again and the build is retried once.
+    :return: The (possibly read again) deployment and its built model.
+    """
+    for attempt in range(2):
+        with ExitStack() as tracking:
+            try:
+                tracking.enter_context(inflight_requests.track(deployed_model_config.model_cache_key()))
+                deployed_model = deployed_model_config.build(context, variant=variant)
+                stack.enter_context(tracking.pop_all())
+                return deployed_model_config, deployed_model
+            except ValueError:
+                raise
+            except Exception:
+                if attempt > 0:
+                    raise
+                current_config, err_response = get_resource(
+                    username, wname, typename=_DFL_DEPLOYED_MODEL_NAME_, path=path,
+                )
+                if err_response or current_config.version == deployed_model_config.version:
+                    raise   # not caused by a redeploy
+                deployed_model_config = current_config
 
 
 @predictions_bp.get('/experiments/<experiment:name>/')
@@ -91,12 +199,21 @@ def get_experiment_predictions(username, wname, name):
 
 @predictions_bp.get('/experiments/<experiment:name>/<int:exec_id>/')
 @predictions_bp.get('/experiments/<experiment:name>/<int:exec_id>')
+@latency_recorder.instrument
 @token_auth.login_required
+@rate_limiter.limit(RateLimiter.PREDICT)
 def get_experiment_execution_predictions(username, wname, name, exec_id):
     """
     Request Syntax:
     {
-        "transform": <input_transform>
+        "transform": <input_transform>,
+        "top_k": <int>, (optional)
+        "timings": <bool>, (optional)
+        "input_format": "npy"/"raw", (optional, for already preprocessed tensor inputs)
+        "shape": [<int>, ...], (shape of a single input, required for "raw")
+        "dtype": <str>, (optional, for "raw", defaults to "float32")
+        "task_labels": <int> or {<filename>: <int>, ...}, (optional, for multi-head models)
+        "response_format": "json"/"npy"/"msgpack" (optional, otherwise negotiated through Accept header)
     }
     + raw data
     :param username:
@@ -105,26 +222,39 @@ def get_experiment_execution_predictions(username, wname, name, exec_id):
     :param exec_id:
     :return:
     """
-    experiment_config, err_response = get_resource(username, wname, typename=_DFL_EXPERIMENT_NAME, name=name)
+    with request_span('get_resource'):
+        experiment_config, err_response = get_resource(username, wname, typename=_DFL_EXPERIMENT_NAME, name=name)
     if err_response:
         return err_response
     filestores = request.files
     if len(filestores) < 1:
         return MissingFile()
     info = json.load(filestores.getlist('info')[0].stream)
-    transform = get_transform(username, wname, info)
     mode = info.get('mode', 'plain')    # file transfer mode (similar to that for data repositories)
     input_data = filestores.getlist('files')
     execution = experiment_config.get_execution(exec_id)
     if execution.completed:
         try:
-            model_fd = execution.get_final_model(descriptor=True)
-            model = torch.load(model_fd).to(get_device())
-            result = predict(model, input_data, transform, mode=mode)
+            with request_span('transform_setup'):
+                transform = get_transform(username, wname, info)
+            with request_span('load'):
+                model = execution.load_final_model()
+            options = prediction_options(info)
+            fmt = response_format(info)
+            # versioned as the model cache, so that an experiment recreated with the same name
+            # does not get the results of the deleted one
+            options['result_cache'] = result_cache.scope(
+                execution.claas_urn, str(experiment_config.id), transform_hash(info.get('transform')),
+                top_k=options['top_k'],
+            )
+            result = predict_files(model, input_data, transform, mode=mode, key=execution.claas_urn, **options)
+            record_prediction_spans(execution.claas_urn, options['timings'])
             if result == NotImplemented:
                 return RouteNotImplemented(HTTPStatus.NOT_IMPLEMENTED, msg=f"'{mode}' file transfer is not implemented")
             else:
-                return make_success_dict(HTTPStatus.OK, msg="Prediction correctly executed", data={'class_ids': result})
+                return prediction_response(result, fmt, **options)
+        except ValueError as ex:
+            return InvalidParameterValue(msg=ex.args[0])
         except Exception as ex:
             return InternalFailure(msg=f"Error when sending model file: '{ex.args[0]}'.")
     else:
@@ -133,28 +263,157 @@ def get_experiment_execution_predictions(username, wname, name, exec_id):
 
 @predictions_bp.get('/deployments/<path:path>/')
 @predictions_bp.get('/deployments/<path:path>')
+@latency_recorder.instrument
 @token_auth.login_required
+@rate_limiter.limit(RateLimiter.PREDICT)
 def get_deployed_model_predictions(username, wname, path):
     path_list = path.split('/')
     path_list = [s for s in path_list if len(s) > 0]
     path = '/'.join(path_list)
-    deployed_model_config, err_response = get_resource(username, wname, typename=_DFL_DEPLOYED_MODEL_NAME_, path=path)
+    with request_span('get_resource'):
+        deployed_model_config, err_response = get_resource(
+            username, wname, typename=_DFL_DEPLOYED_MODEL_NAME_, path=path,
+        )
     if err_response:
         return err_response
     filestores = request.files
     if len(filestores) < 1:
         return MissingFile()
     info = json.load(filestores.getlist('info')[0].stream)
-    transform = get_transform(username, wname, info)
+    if info.get('transform', None) is None:
+        info['transform'] = deployed_model_config.transform     # default transform pinned at deploy time
     mode = info.get('mode', 'plain')    # file transfer mode (similar to that for data repositories)
     input_data = filestores.getlist('files')
     context = UserWorkspaceResourceContext(username, wname)
-    deployed_model = deployed_model_config.build(context)
-    result = deployed_model.get_prediction(input_data, transform, mode)
+    variant = info.get('variant', None)     # e.g. 'quantized'
+    try:
+        options = prediction_options(info)
+        fmt = response_format(info)
+        with request_span('transform_setup'):
+            transform = get_transform(username, wname, info)
+        with rate_limiter.slot(deployed_model_config.claas_urn) as admitted:
+            if not admitted:
+                return rate_limiter.too_many_requests(
+                    RateLimiter.PREDICT, 1, msg=f"Too many concurrent requests on deployment '{path}'.",
+                )
+            with ExitStack() as stack:
+                with request_span('load'):
+                    deployed_model_config, deployed_model = build_current_version(
+                        stack, deployed_model_config, username, wname, path, context, variant=variant,
+                    )
+                    options['result_cache'] = deployed_model_config.result_cache_scope(
+                        info.get('transform'), top_k=options['top_k'], variant=variant,
+                    )
+                result = deployed_model.get_prediction(input_data, transform, mode, **options)
+        record_prediction_spans(deployed_model_config.claas_urn, options['timings'])
+    except ValueError as ex:
+        return InvalidParameterValue(msg=ex.args[0])
     if result == NotImplemented:
         return RouteNotImplemented(HTTPStatus.NOT_IMPLEMENTED, msg=f"'{mode}' file transfer is not implemented")
     else:
-        return make_success_dict(HTTPStatus.OK, msg="Prediction correctly executed", data={'class_ids': result})
+        return prediction_response(result, fmt, **options)
+
+
+@predictions_bp.post('/jobs/')
+@predictions_bp.post('/jobs')
+@token_auth.login_required
+@rate_limiter.limit(RateLimiter.PREDICT)
+@check_json(False, required={'deployment', 'data_repository', 'root'},
+            optionals={'transform', 'variant', 'format', 'top_k', 'task_label'})
+def create_prediction_job(username, wname):
+    """
+    Submits a prediction job over all the files of a data repository folder.
+    Request Syntax:
+    {
+        "deployment": <deployed model path>,
+        "data_repository": <data repository name>,
+        "root": <folder of the data repository>,
+        "transform": <input_transform>, (optional, defaults to the one of the deployment)
+        "variant": <model variant>, (optional)
+        "format": "csv"/"npy", (optional, defaults to "csv")
+        "top_k": <int>, (optional)
+        "task_label": <int> (optional, for multi-head models)
+    }
+    :param username:
+    :param wname:
+    :return:
+    """
+    data, opts, extras = get_check_json_data()
+    path = '/'.join([s for s in data['deployment'].split('/') if len(s) > 0])
+    deployed_model_config, err_response = get_resource(username, wname, typename=_DFL_DEPLOYED_MODEL_NAME_, path=path)
+    if err_response:
+        return err_response
+    context = UserWorkspaceResourceContext(username, wname)
+    try:
+        data_repository = BaseDataRepository.canonicalize(context, data['data_repository'])
+    except ValueError as ex:
+        return ResourceNotFound(msg=ex.args[0])
+    task_label = data.get('task_label', None)
+    try:
+        job = PredictionJob(
+            username, wname, path, data_repository.get_name(), data['root'],
+            result_format=data.get('format', PredictionJob.CSV),
+            top_k=parse_top_k(data.get('top_k', None)),
+            variant=data.get('variant', None),
+            task_label=int(task_label) if task_label is not None else None,
+        )
+        model = deployed_model_config.get_model(job.variant)
+        if job.task_label is not None:
+            inference_engine.check_task_labels(model)
+        if data.get('transform', None) is None:
+            data['transform'] = deployed_model_config.transform
+        transform = get_transform(username, wname, data)
+    except ValueError as ex:
+        return InvalidParameterValue(msg=ex.args[0])
+    files = data_repository.get_all_files(data['root'])
+    dataset = RepositoryFilesDataset(data_repository.get_absolute_path(), files, transform)
+    workspace = Workspace.canonicalize(context)
+    result_dirs = workspace.predictions_base_dir_parents() + [workspace.predictions_base_dir()]
+    prediction_jobs.add(job)
+    executor.submit(prediction_jobs.run, job, model, dataset, result_dirs)
+    return make_success_dict(
+        HTTPStatus.CREATED, msg="Prediction job successfully submitted!", data={'job': job.to_dict()},
+    )
+
+
+@predictions_bp.get('/jobs/')
+@predictions_bp.get('/jobs')
+@token_auth.login_required
+def get_prediction_jobs(username, wname):
+    jobs = prediction_jobs.list(username, wname)
+    return make_success_dict(HTTPStatus.OK, data={'jobs': [job.to_dict() for job in jobs]})
+
+
+@predictions_bp.get('/jobs/<job_id>/')
+@predictions_bp.get('/jobs/<job_id>')
+@token_auth.login_required
+def get_prediction_job(username, wname, job_id):
+    """
+    Returns status and progress (processed/total files) of a prediction job.
+    """
+    job = prediction_jobs.get(username, wname, job_id)
+    if job is None:
+        return ResourceNotFound(msg=f"Prediction job '{job_id}' does not exist.")
+    return make_success_dict(HTTPStatus.OK, data={'job': job.to_dict()})
+
+
+@predictions_bp.get('/jobs/<job_id>/results/')
+@predictions_bp.get('/jobs/<job_id>/results')
+@token_auth.login_required
+def get_prediction_job_results(username, wname, job_id):
+    job = prediction_jobs.get(username, wname, job_id)
+    if job is None:
+        return ResourceNotFound(msg=f"Prediction job '{job_id}' does not exist.")
+    elif job.status != PredictionJob.COMPLETED:
+        return ResourceInUse(msg=f"Prediction job is not completed (status = '{job.status}').")
+    workspace = Workspace.canonicalize(UserWorkspaceResourceContext(username, wname))
+    result_dirs = workspace.predictions_base_dir_parents() + [workspace.predictions_base_dir()]
+    try:
+        manager = BaseDataManager.get()
+        fd = manager.get_file_pointer(job.result_file_name(), result_dirs)
+        return send_file(fd, attachment_filename=job.result_file_name())
+    except Exception as ex:
+        return InternalFailure(msg=f"Error when sending results file: '{ex.args[0]}'.")
 
 
 __all__ = [
@@ -163,4 +422,9 @@ __all__ = [
     'get_experiment_predictions',
     'get_experiment_execution_predictions',
     'get_deployed_model_predictions',
+
+    'create_prediction_job',
+    'get_prediction_jobs',
+    'get_prediction_job',
+    'get_prediction_job_results',
 ]
\ No newline at end of file
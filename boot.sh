@@ -1,5 +1,6 @@
 #!/bin/bash
 source venv/bin/activate
 
-# Server
-exec gunicorn -b :5000 --access-logfile - --error-logfile - main:app
\ No newline at end of file
+# Server: threaded workers, since experiment event streams hold a thread for the whole run
+exec gunicorn -b :5000 --worker-class gthread --threads "${GUNICORN_THREADS:-32}" \
+  --access-logfile - --error-logfile - main:app
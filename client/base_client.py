@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import io
+import struct
 import zipfile
 from typing import Callable
 
@@ -70,6 +72,8 @@ class BaseClient:
     DEPLOYMENTS = "deployments"
     PREDICTIONS = "predictions"
 
+    INFERENCE = "inference"
+
     def __init__(
         self,
         host: str = 'localhost',
@@ -144,6 +148,10 @@ class BaseClient:
     @property
     def predictions_base(self):
         return f"{self.workspaces_base}/{self.workspace}/{self.PREDICTIONS}"
+
+    @property
+    def inference_base(self):
+        return f"{self.base_url}/{self.INFERENCE}"
     
     @staticmethod
     def get_url(*args):
@@ -712,8 +720,88 @@ class BaseClient:
         return self.patch([self.experiments_base, name, 'setup'])
 
     @check_in_session('auth_token', 'username', 'workspace')
-    def start_experiment(self, name: str):
-        return self.patch([self.experiments_base, name, 'status'], data={'status': 'START'})
+    def start_experiment(self, name: str, priority: int = None):
+        data = {'status': 'START'}
+        if priority is not None:
+            data['priority'] = priority
+        return self.patch([self.experiments_base, name, 'status'], data=data)
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def resume_experiment(self, name: str, exec_id: int = None, priority: int = None):
+        data = {'status': 'RESUME'}
+        if exec_id is not None:
+            data['exec_id'] = exec_id
+        if priority is not None:
+            data['priority'] = priority
+        return self.patch([self.experiments_base, name, 'status'], data=data)
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def get_experiment_queue(self, experiment: str = None, status: str = None):
+        params = {}
+        if experiment is not None:
+            params['experiment'] = experiment
+        if status is not None:
+            params['status'] = status
+        return self.get([self.experiments_base, 'queue'], params=params)
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def get_experiment_job(self, job_id: str):
+        return self.get([self.experiments_base, 'queue', job_id])
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def cancel_experiment_job(self, job_id: str):
+        return self.delete([self.experiments_base, 'queue', job_id])
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def get_experiment_events(self, name: str, last_event_id: str = None):
+        """
+        Iterates over the live events of an experiment as dictionaries {'id', 'event', 'data'},
+        until the iteration is stopped or the server closes the connection.
+        """
+        headers = {'Accept': 'text/event-stream'}
+        if last_event_id is not None:
+            headers['Last-Event-ID'] = last_event_id
+        url = self.get_url(self.experiments_base, name, 'events')
+        if self.verbose:
+            print(f"Sending request (get @ {url}) ...")
+        with requests.get(url, headers=headers, auth=self.auth, stream=True) as response:
+            if response.status_code != HTTPStatus.OK:
+                raise RuntimeError(f"Failed to get experiment events ({response.status_code}): {response.text}")
+            event = {}
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:    # end of event
+                    if 'event' in event:
+                        yield event
+                    event = {}
+                elif not line.startswith(':'):  # comments are keep-alives
+                    field, _, value = line.partition(':')
+                    value = value[1:] if value.startswith(' ') else value
+                    if field == 'data':
+                        event['data'] = json.loads(value)
+                    elif field in ('id', 'event'):
+                        event[field] = value
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def wait_experiment(self, name: str):
+        """
+        Waits for the end of the current run of an experiment, or of the next one if it is
+        ready (e.g., queued) and not running yet.
+        :return: Data of the 'end' event of the run, or of the initial 'status' event if the
+        experiment has already ended.
+        """
+        events = self.get_experiment_events(name)
+        try:
+            exec_id = None
+            for event in events:
+                data = event.get('data') or {}
+                if event['event'] == 'status' and exec_id is None:
+                    if data['status'] == 'ENDED':
+                        return data
+                    exec_id = data['exec_id'] + (1 if data['status'] == 'READY' else 0)
+                elif event['event'] == 'end' and (exec_id is None or data['exec_id'] >= exec_id):
+                    return data
+        finally:
+            events.close()
 
     @check_in_session('auth_token', 'username', 'workspace')
     def get_experiment_status(self, name: str):
@@ -753,7 +841,8 @@ class BaseClient:
 
     # Deployments
     @check_in_session('auth_token', 'username', 'workspace')
-    def create_deployed_model(self, name: str, path: str, deploy_data: dict, description: str = None):
+    def create_deployed_model(self, name: str, path: str, deploy_data: dict, description: str = None,
+                              transform: dict = None, warmup: dict = None):
         data = {
             'name': name,
             'path': path,
@@ -761,6 +850,10 @@ class BaseClient:
         }
         if description is not None:
             data['description'] = description
+        if transform is not None:
+            data['transform'] = transform
+        if warmup is not None:
+            data['warmup'] = warmup
         return self.post(self.deployments_base, data=data)
 
     @check_in_session('auth_token', 'username', 'workspace')
@@ -785,7 +878,8 @@ class BaseClient:
         return self.patch([self.deployments_base, name, 'metadata'], data=data)
 
     @check_in_session('auth_token', 'username', 'workspace')
-    def redeploy_model(self, name: str, new_name: str, path: str, deploy_data: dict, description: str = None):
+    def redeploy_model(self, name: str, new_name: str, path: str, deploy_data: dict, description: str = None,
+                       transform: dict = None, warmup: dict = None):
         data = {
             'name': new_name,
             'path': path,
@@ -793,6 +887,10 @@ class BaseClient:
         }
         if description is not None:
             data['description'] = description
+        if transform is not None:
+            data['transform'] = transform
+        if warmup is not None:
+            data['warmup'] = warmup
         return self.post([self.deployments_base, name, 'redeploy'], data=data)
 
     @check_in_session('auth_token', 'username', 'workspace')
@@ -816,29 +914,179 @@ class BaseClient:
         return self.delete([self.deployments_base, name])
 
     # Predictions
-    @check_in_session('auth_token', 'username', 'workspace')
-    def get_experiment_predictionns(self, info: dict, files: list[str], experiment_name: str):
+    @staticmethod
+    def _prediction_files(info: dict, files: list[str], files_mode='plain', zip_file_name='files.zip'):
         translated: list = []
-        for file_path in files:
-            translated.append(('files', (file_path, open(file_path, 'rb'))))
+        files_mode = info.get('mode', files_mode)
+        info['mode'] = files_mode
+        if files_mode == 'plain':
+            for file_path in files:
+                translated.append(('files', (file_path, open(file_path, 'rb'))))
+        elif files_mode == 'zip':
+            with zipfile.ZipFile(zip_file_name, 'w') as zipf:
+                for file_path in files:
+                    zipf.write(filename=file_path, arcname=file_path.replace('\\', '/'))
+            translated.append(('files', ('files', open(zip_file_name, 'rb'))))
+        else:
+            raise ValueError(f"Files transfer mode '{files_mode}' is unknown or not implemented.")
         translated.append(('info', ('info', json.dumps(info))))
-        return self.get([self.predictions_base, 'experiments', experiment_name], files=translated, data=info)
+        return translated
 
-    @check_in_session('auth_token', 'username', 'workspace')
-    def get_experiment_execution_predictions(self, info: dict, files: list[str], experiment_name: str, exec_id: str):
+    @staticmethod
+    def _prediction_arrays(info: dict, arrays: dict):
+        """
+        Sends already preprocessed inputs as '.npy' files: each array is either a single input
+        or a batch of inputs along its first dimension.
+        """
+        import numpy as np
         translated: list = []
-        for file_path in files:
-            translated.append(('files', (file_path, open(file_path, 'rb'))))
+        info['mode'] = 'plain'
+        info['input_format'] = 'npy'
+        for name, array in arrays.items():
+            buffer = io.BytesIO()
+            np.save(buffer, np.ascontiguousarray(array, dtype=np.float32))
+            translated.append(('files', (name, buffer.getvalue())))
         translated.append(('info', ('info', json.dumps(info))))
-        return self.get([self.predictions_base, 'experiments', experiment_name, str(exec_id)], files=translated, data=info)
+        return translated
+
+    @staticmethod
+    def _decode_prediction_response(response: requests.Response):
+        """
+        Decodes binary ('.npy' or length-prefixed msgpack) prediction results, so that
+        response.json() returns the same data of a JSON response.
+        """
+        mimetype = response.headers.get('Content-Type', '').split(';')[0].strip()
+        if mimetype == 'application/x-npy':
+            import numpy as np
+            array = np.load(io.BytesIO(response.content), allow_pickle=False)
+            files = [str(file) for file in array['file']]
+            if 'class_id' in array.dtype.names:
+                data = {'class_ids': dict(zip(files, array['class_id'].tolist()))}
+            else:
+                data = {
+                    'class_ids': dict(zip(files, array['class_ids'].tolist())),
+                    'scores': dict(zip(files, array['scores'].tolist())),
+                }
+        elif mimetype == 'application/x-msgpack':
+            import msgpack
+            length = struct.unpack('>I', response.content[:4])[0]
+            payload = msgpack.unpackb(response.content[4:4 + length], raw=False)
+            files = payload['files']
+            data = {'class_ids': dict(zip(files, payload['class_ids']))}
+            if payload.get('scores') is not None:
+                data['scores'] = dict(zip(files, payload['scores']))
+            if payload.get('timings') is not None:
+                data['timings'] = payload['timings']
+        else:
+            return response
+        data['message'] = "Prediction correctly executed"
+        response.json = lambda **kwargs: data
+        return response
 
     @check_in_session('auth_token', 'username', 'workspace')
-    def get_deployed_model_prediction(self, path: str, info: dict, files: list[str]):
-        translated: list = []
-        for file_path in files:
-            translated.append(('files', (file_path, open(file_path, 'rb'))))
-        translated.append(('info', ('info', json.dumps(info))))
-        return self.get([self.predictions_base, 'deployments', path], files=translated, data=info)
+    def get_experiment_predictionns(self, info: dict, files: list[str], experiment_name: str,
+                                    files_mode='plain', zip_file_name='files.zip'):
+        translated = self._prediction_files(info, files, files_mode, zip_file_name)
+        response = self.get([self.predictions_base, 'experiments', experiment_name], files=translated, data=info)
+        return self._decode_prediction_response(response)
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def get_experiment_execution_predictions(self, info: dict, files: list[str], experiment_name: str, exec_id: str,
+                                             files_mode='plain', zip_file_name='files.zip'):
+        translated = self._prediction_files(info, files, files_mode, zip_file_name)
+        response = self.get([self.predictions_base, 'experiments', experiment_name, str(exec_id)],
+                            files=translated, data=info)
+        return self._decode_prediction_response(response)
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def get_deployed_model_prediction(self, path: str, info: dict, files: list[str],
+                                      files_mode='plain', zip_file_name='files.zip'):
+        translated = self._prediction_files(info, files, files_mode, zip_file_name)
+        response = self.get([self.predictions_base, 'deployments', path], files=translated, data=info)
+        return self._decode_prediction_response(response)
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def get_deployed_model_tensor_prediction(self, path: str, info: dict, arrays: dict):
+        translated = self._prediction_arrays(info, arrays)
+        response = self.get([self.predictions_base, 'deployments', path], files=translated, data=info)
+        return self._decode_prediction_response(response)
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def submit_prediction_job(self, deployment: str, data_repository: str, root: str, transform: dict = None,
+                              variant: str = None, result_format: str = 'csv', top_k: int = None,
+                              task_label: int = None):
+        data = {
+            'deployment': deployment,
+            'data_repository': data_repository,
+            'root': root,
+            'format': result_format,
+        }
+        if transform is not None:
+            data['transform'] = transform
+        if variant is not None:
+            data['variant'] = variant
+        if top_k is not None:
+            data['top_k'] = top_k
+        if task_label is not None:
+            data['task_label'] = task_label
+        return self.post([self.predictions_base, 'jobs'], data=data)
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def get_prediction_jobs(self):
+        return self.get([self.predictions_base, 'jobs'])
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def get_prediction_job(self, job_id: str):
+        return self.get([self.predictions_base, 'jobs', job_id])
+
+    @check_in_session('auth_token', 'username', 'workspace')
+    def get_prediction_job_results(self, job_id: str):
+        return self.get([self.predictions_base, 'jobs', job_id, 'results'])
+
+    # Inference (serving internals)
+    @check_in_session('auth_token')
+    def get_model_cache_stats(self):
+        return self.get([self.inference_base, 'cache'])
+
+    @check_in_session('auth_token')
+    def get_batching_stats(self):
+        return self.get([self.inference_base, 'batching'])
+
+    @check_in_session('auth_token')
+    def get_decoding_stats(self):
+        return self.get([self.inference_base, 'decoding'])
+
+    @check_in_session('auth_token')
+    def get_result_cache_stats(self):
+        return self.get([self.inference_base, 'results'])
+
+    @check_in_session('auth_token')
+    def get_transform_cache_stats(self):
+        return self.get([self.inference_base, 'transforms'])
+
+    @check_in_session('auth_token')
+    def get_warmup_stats(self):
+        return self.get([self.inference_base, 'warmup'])
+
+    @check_in_session('auth_token')
+    def get_inflight_stats(self):
+        return self.get([self.inference_base, 'inflight'])
+
+    @check_in_session('auth_token')
+    def get_workers_stats(self):
+        return self.get([self.inference_base, 'workers'])
+
+    @check_in_session('auth_token')
+    def get_rate_limit_stats(self):
+        return self.get([self.inference_base, 'limits'])
+
+    @check_in_session('auth_token')
+    def get_latency_stats(self):
+        return self.get([self.inference_base, 'latency'])
+
+    @check_in_session('auth_token')
+    def reset_latency_stats(self):
+        return self.delete([self.inference_base, 'latency'])
 
 
 __all__ = [
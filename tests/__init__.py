@@ -1,4 +1,5 @@
 from .utils import *
 from .commons import *
 from .resources import *
-from .experiments import *
\ No newline at end of file
+from .experiments import *
+from .inference import *
\ No newline at end of file
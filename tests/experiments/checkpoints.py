@@ -0,0 +1,155 @@
+"""
+Testing on per-experience checkpoints of strategies and the resume of executions from them.
+"""
+from __future__ import annotations
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import torch
+
+from application.avalanche_ext import checkpoints
+from application.avalanche_ext import strategy_state, load_strategy_state, CheckpointWriter, \
+    has_checkpoint, read_checkpoint, remove_checkpoint
+
+from tests.utils import *
+
+
+class _ReplayPlugin:
+    """
+    Plugin with state (a buffer, a counter and a copy of the model) and references that are not state.
+    """
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.buffer = torch.rand(5, 4)
+        self.seen = 5
+        self.old_model = torch.nn.Linear(4, 3)
+        self.dataset = object()
+
+
+class _TempDataManager:
+    """
+    Data manager rooted in a temporary directory.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def get_root(self):
+        return self.root
+
+    def create_subdir(self, dir_name: str, parents: list[str] = None):
+        os.makedirs(os.path.join(self.root, *(parents or []), dir_name), exist_ok=True)
+        return True, None
+
+
+def _strategy(seed: int) -> SimpleNamespace:
+    torch.manual_seed(seed)
+    model = torch.nn.Linear(4, 3)
+    evaluator = object()
+    strategy = SimpleNamespace(
+        model=model,
+        optimizer=torch.optim.SGD(model.parameters(), lr=0.1, momentum=0.9),
+        clock=SimpleNamespace(train_exp_counter=0, train_iterations=0),
+        evaluator=evaluator,
+    )
+    strategy.plugins = [evaluator, _ReplayPlugin(strategy)]
+    return strategy
+
+
+def _train_step(strategy: SimpleNamespace):
+    strategy.optimizer.zero_grad()
+    strategy.model(torch.rand(8, 4)).sum().backward()
+    strategy.optimizer.step()
+    strategy.clock.train_iterations += 1
+
+
+class CheckpointTestCase(BaseTestCase):
+
+    model_directory = ['user', 'workspace', 'experiment', '1']
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        patcher = mock.patch.object(checkpoints.BaseDataManager, 'get', return_value=_TempDataManager(self.root))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertStateDictEqual(self, first: dict, second: dict):
+        self.assertEqual(first.keys(), second.keys())
+        for key in first:
+            self.assertTrue(torch.equal(first[key], second[key]), key)
+
+    def test_snapshot_is_independent_of_training(self):
+        strategy = _strategy(0)
+        _train_step(strategy)
+        state = strategy_state(strategy, 1, [{'accuracy': 0.5}])
+        weight = state['model']['weight'].clone()
+        _train_step(strategy)
+        self.assertTrue(torch.equal(state['model']['weight'], weight))
+        self.assertFalse(torch.equal(strategy.model.weight.detach(), weight))
+
+    def test_plugin_state(self):
+        strategy = _strategy(0)
+        state = strategy_state(strategy, 0, [])
+        self.assertEqual(list(state['plugins'].keys()), ['1:_ReplayPlugin'])     # not the evaluator
+        plugin_state = state['plugins']['1:_ReplayPlugin']
+        self.assertEqual(set(plugin_state['attributes'].keys()), {'buffer', 'seen'})
+        self.assertEqual(set(plugin_state['state_dicts'].keys()), {'old_model'})
+
+    def test_resume(self):
+        strategy = _strategy(0)
+        for _ in range(2):
+            _train_step(strategy)
+        strategy.clock.train_exp_counter = 2
+        strategy.plugins[1].seen = 42
+        results = [{'accuracy': 0.5}, {'accuracy': 0.25}]
+
+        writer = CheckpointWriter(enabled=True)
+        self.assertFalse(has_checkpoint(self.model_directory))
+        writer.submit(strategy, 2, results, self.model_directory).result(timeout=10)
+        self.assertEqual(writer.stats()['written'], 1)
+        self.assertTrue(has_checkpoint(self.model_directory))
+
+        resumed = _strategy(1)
+        experience, resumed_results = load_strategy_state(resumed, read_checkpoint(self.model_directory))
+        self.assertEqual(experience, 2)
+        self.assertEqual(resumed_results, results)
+        self.assertStateDictEqual(resumed.model.state_dict(), strategy.model.state_dict())
+        self.assertStateDictEqual(
+            resumed.optimizer.state_dict()['state'][0], strategy.optimizer.state_dict()['state'][0],
+        )
+        self.assertEqual(vars(resumed.clock), vars(strategy.clock))
+        plugin, resumed_plugin = strategy.plugins[1], resumed.plugins[1]
+        self.assertEqual(resumed_plugin.seen, 42)
+        self.assertTrue(torch.equal(resumed_plugin.buffer, plugin.buffer))
+        self.assertStateDictEqual(resumed_plugin.old_model.state_dict(), plugin.old_model.state_dict())
+        self.assertIs(resumed_plugin.strategy, resumed)
+
+        # training goes on identically from the checkpoint
+        torch.manual_seed(2)
+        _train_step(strategy)
+        torch.manual_seed(2)
+        _train_step(resumed)
+        self.assertStateDictEqual(resumed.model.state_dict(), strategy.model.state_dict())
+
+        remove_checkpoint(self.model_directory)
+        self.assertFalse(has_checkpoint(self.model_directory))
+        self.assertIsNone(read_checkpoint(self.model_directory))
+
+    def test_disabled(self):
+        writer = CheckpointWriter(enabled=False)
+        self.assertIsNone(writer.submit(_strategy(0), 1, [], self.model_directory))
+        self.assertIsNone(CheckpointWriter().submit(_strategy(0), 1, [], None))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['CheckpointTestCase']
@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import json
 import os.path
-from time import sleep
 from abc import abstractmethod
 
 from tests.utils import *
@@ -91,16 +90,14 @@ class BaseClassicBenchmarkExperimentTestCase(BaseExperimentTestCase):
 
                         # noinspection PyUnusedLocal
                         ok = False
-                        while True:
-                            sleep(5)
-                            response = self.client.get_experiment_results(experiment_name)
-                            self.assertBaseHandler(response, success_codes=(HTTPStatus.OK, HTTPStatus.LOCKED))
-                            if response.status_code == HTTPStatus.OK:
-                                ok = True
-                                with open(os.path.join(results_dir, 'execution_results.json'), 'w') as f:
-                                    data = response.json()
-                                    json.dump(data, fp=f, indent=2)
-                                break
+                        self.client.wait_experiment(experiment_name)
+                        response = self.client.get_experiment_results(experiment_name)
+                        self.assertBaseHandler(response)
+                        if response.status_code == HTTPStatus.OK:
+                            ok = True
+                            with open(os.path.join(results_dir, 'execution_results.json'), 'w') as f:
+                                data = response.json()
+                                json.dump(data, fp=f, indent=2)
 
                         if ok:
                             response = self.client.get_experiment_csv_results(experiment_name)
@@ -0,0 +1,76 @@
+"""
+Testing on the delivery of live experiment events and their encoding as server-sent events.
+"""
+from __future__ import annotations
+import json
+import unittest
+
+from application.experiment_events import ExperimentEventBus
+
+from tests.utils import *
+
+
+class ExperimentEventBusTestCase(BaseTestCase):
+
+    channel = 'urn:experiment-events-test'
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.bus = ExperimentEventBus(queue_size=10, heartbeat=0.05)
+
+    @staticmethod
+    def parse(sse: str) -> tuple[str | None, str, object]:
+        """
+        :return: Id, event name and data of a server-sent event.
+        """
+        fields = dict(line.split(': ', 1) for line in sse.strip().split('\n'))
+        return fields.get('id'), fields['event'], json.loads(fields['data'])
+
+    def test_stream(self):
+        stream = self.bus.stream(self.channel, snapshot=lambda: {'status': 'RUNNING'})
+        self.assertEqual(self.parse(next(stream)), (None, 'status', {'status': 'RUNNING'}))
+        self.assertEqual(self.bus.stats()['subscribers'], 1)
+        self.bus.publish(self.channel, 'epoch', {'epoch': 1})
+        self.bus.publish('urn:other-experiment', 'epoch', {'epoch': 2})    # not delivered
+        self.bus.publish(self.channel, ExperimentEventBus.END, {'status': 'FINISHED'})
+        first_id, event, data = self.parse(next(stream))
+        self.assertEqual((event, data), ('epoch', {'epoch': 1}))
+        end_id, event, data = self.parse(next(stream))
+        self.assertEqual((event, data), (ExperimentEventBus.END, {'status': 'FINISHED'}))
+        self.assertLess(int(first_id), int(end_id))
+        with self.assertRaises(StopIteration):     # closed after the end of the run
+            next(stream)
+        stats = self.bus.stats()
+        self.assertEqual((stats['channels'], stats['subscribers'], stats['published']), (0, 0, 3))
+
+    def test_keep_alive(self):
+        stream = self.bus.stream(self.channel)
+        self.assertEqual(next(stream), ': keep-alive\n\n')
+        stream.close()      # client disconnected
+        self.assertEqual(self.bus.stats()['subscribers'], 0)
+
+    def test_slow_subscriber_loses_oldest_events(self):
+        self.bus.queue_size = 2
+        with self.bus.subscribe(self.channel) as subscriber:
+            for epoch in range(5):
+                self.bus.publish(self.channel, 'epoch', {'epoch': epoch})
+            received = [subscriber.get_nowait()['data']['epoch'] for _ in range(subscriber.qsize())]
+        self.assertEqual(received, [3, 4])
+        self.assertEqual(self.bus.stats()['dropped'], 3)
+
+    def test_disabled(self):
+        self.bus.enabled = False
+        with self.bus.subscribe(self.channel) as subscriber:
+            self.bus.publish(self.channel, 'epoch', {'epoch': 1})
+            self.assertTrue(subscriber.empty())
+        self.assertEqual(self.bus.stats()['published'], 0)
+
+    def test_no_replay_with_local_backend(self):
+        self.assertEqual(self.bus.replay(self.channel, '1'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['ExperimentEventBusTestCase']
@@ -0,0 +1,184 @@
+"""
+Testing on the redeployment of a deployed model with the artifacts of another execution,
+while keeping its path (i.e., hot-swap of the served version).
+"""
+from __future__ import annotations
+import threading
+import unittest
+
+import numpy as np
+
+from client import *
+
+from tests.utils import *
+from .data import *
+
+
+class HotSwapTestCase(BaseTestCase):
+
+    username = 'hot-swap-username'
+    email = 'hot_swap_' + EMAIL
+    password = PASSWORD
+    workspace = 'hot_swap_workspace'
+    host = HOST
+    port = PORT
+    client = BaseClient(host, port)
+    deleted = False
+
+    strategy_name = naive_strategy_name
+    experiment_name = 'hot_swap_experiment'
+    deployment_name = 'hot_swap_deployment'
+    deployment_path = 'hot_swap/mnist'
+
+    benchmark_build = {
+        'name': 'SplitMNIST',
+        'n_experiences': 2,
+        'return_task_id': False,
+        'seed': 0,
+        'eval_transform': {'name': 'EvalMNIST'},
+        'train_transform': {'name': 'TrainMNIST'},
+    }
+
+    model_build = {
+        'name': 'SimpleMLP',
+        'num_classes': 10,
+        'input_size': 1 * 28 * 28,
+        'hidden_layers': 1,
+        'hidden_size': 64,
+    }
+
+    strategy_build = generic_strategy_builder('Naive', STD_MNIST_TRAIN_MB_SIZE, 1, STD_MNIST_EVAL_MB_SIZE)
+
+    inputs = {'inputs': np.zeros((2, 1, 28, 28), dtype=np.float32)}
+    inputs_info = {'shape': [1, 28, 28]}
+    concurrent_clients = 4
+
+    def create_resources(self):
+        self.assertBaseHandler(
+            self.client.register(self.username, self.email, self.password), success_codes=HTTPStatus.CREATED,
+        )
+        self.assertBaseHandler(self.client.login(self.username, self.password))
+        self.assertBaseHandler(self.client.create_workspace(self.workspace), success_codes=HTTPStatus.CREATED)
+        created = HTTPStatus.CREATED
+        self.assertBaseHandler(self.client.create_benchmark(benchmark_name, self.benchmark_build), created)
+        self.assertBaseHandler(self.client.create_metric_set(metricset_name, metricset_build), created)
+        self.assertBaseHandler(self.client.create_model(model_name, self.model_build), created)
+        self.assertBaseHandler(self.client.create_optimizer(optimizer_name, sgd_optimizer_build), created)
+        self.assertBaseHandler(self.client.create_criterion(criterion_name, criterion_build), created)
+        self.assertBaseHandler(self.client.create_strategy(self.strategy_name, self.strategy_build), created)
+        build = generic_experiment_builder(self.strategy_name, benchmark_name)
+        self.assertBaseHandler(self.client.create_experiment(self.experiment_name, build), created)
+
+    def delete_resources(self):
+        self.client.close_workspace(self.workspace)
+        self.client.delete_workspace(self.workspace)
+        self.client.delete_user()
+        self.deleted = True
+
+    def run_experiment(self):
+        self.assertBaseHandler(self.client.setup_experiment(self.experiment_name))
+        self.assertBaseHandler(self.client.start_experiment(self.experiment_name))
+        self.client.wait_experiment(self.experiment_name)
+        self.assertBaseHandler(self.client.get_experiment_results(self.experiment_name))
+
+    def get_version(self) -> str:
+        response = self.client.get_deployed_model(self.deployment_name)
+        self.assertBaseHandler(response)
+        return response.json()['version']
+
+    def predict(self):
+        response = self.client.get_deployed_model_tensor_prediction(
+            self.deployment_path, dict(self.inputs_info), self.inputs,
+        )
+        self.assertBaseHandler(response)
+        self.assertIn('class_ids', response.json())
+
+    def redeploy(self, exec_id: int):
+        return self.client.redeploy_experiment_model(
+            self.deployment_name, self.deployment_name, self.deployment_path, self.experiment_name, exec_id,
+        )
+
+    def predict_while_redeploying(self, exec_ids: list[int]):
+        """
+        Sends predictions from concurrent threads while the deployment is redeployed with the
+        models of the given executions: no prediction must fail because of the swaps.
+        """
+        stopped = threading.Event()
+        failures = []
+        counts = [0] * self.concurrent_clients
+
+        def predict(index: int):
+            while not stopped.is_set():
+                response = self.client.get_deployed_model_tensor_prediction(
+                    self.deployment_path, dict(self.inputs_info), self.inputs,
+                )
+                counts[index] += 1
+                # rejections by rate limits are not failures of the swap
+                if response.status_code not in (HTTPStatus.OK, HTTPStatus.TOO_MANY_REQUESTS):
+                    failures.append((response.status_code, response.text))
+
+        threads = [threading.Thread(target=predict, args=(index,)) for index in range(self.concurrent_clients)]
+        for thread in threads:
+            thread.start()
+        try:
+            for exec_id in exec_ids:
+                version = self.get_version()
+                self.assertBaseHandler(self.redeploy(exec_id))
+                self.assertNotEqual(self.get_version(), version)
+        finally:
+            stopped.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(failures, [])
+        self.assertTrue(all(count > 0 for count in counts))
+
+    def test_hot_swap(self):
+        self.deleted = False
+        with self.client.session(self.username, self.workspace):
+            try:
+                self.create_resources()
+                self.run_experiment()   # execution 1
+                self.run_experiment()   # execution 2
+
+                self.assertBaseHandler(
+                    self.client.create_experiment_deployed_model(
+                        self.deployment_name, self.deployment_path, self.experiment_name, 1,
+                    ), success_codes=HTTPStatus.CREATED,
+                )
+                first_version = self.get_version()
+                self.assertIsNotNone(first_version)
+                self.predict()
+
+                self.assertBaseHandler(self.redeploy(2))
+                second_version = self.get_version()
+                self.assertIsNotNone(second_version)
+                self.assertNotEqual(first_version, second_version)
+                self.predict()  # served by the new version
+
+                # an invalid redeployment keeps the current version
+                self.assertBaseHandler(
+                    self.redeploy(10),
+                    success_codes=(HTTPStatus.BAD_REQUEST, HTTPStatus.NOT_FOUND, HTTPStatus.INTERNAL_SERVER_ERROR),
+                )
+                self.assertEqual(self.get_version(), second_version)
+                self.predict()
+
+                # redeploys while predictions are in flight
+                self.predict_while_redeploying([1, 2, 1])
+
+                self.assertBaseHandler(self.client.delete_deployed_model(self.deployment_name))
+                self.assertBaseHandler(self.client.get_deployed_model(self.deployment_name), HTTPStatus.NOT_FOUND)
+
+                self.delete_resources()
+            finally:
+                if not self.deleted:
+                    self.delete_resources()
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = [
+    'HotSwapTestCase',
+]
@@ -0,0 +1,256 @@
+"""
+Testing on the persistent queue of experiment runs: claim, lease and retry policy of queued
+jobs (directly on a MongoDB test database) and runs submitted through the server.
+"""
+from __future__ import annotations
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from mongoengine import connect, disconnect
+
+from client import *
+from application.mongo.resources.experiments import MongoExperimentJob
+
+from tests.utils import *
+from .data import *
+
+
+class ExperimentJobTestCase(BaseTestCase):
+    """
+    Jobs are claimed from the whole collection, thus these tests use their own database
+    instead of the one of the test server.
+    """
+
+    database = BaseMongoTestConfig.MONGODB_DB + '_experiment_jobs'
+    owner = 'experiment-jobs-test-owner'
+    workspace = 'experiment_jobs_test_workspace'
+    node = 'node-a'
+    lease = 60
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        connect(cls.database, host=BaseMongoTestConfig.MONGODB_HOST, port=BaseMongoTestConfig.MONGODB_PORT)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        MongoExperimentJob.drop_collection()
+        disconnect()
+
+    def setUp(self) -> None:
+        super().setUp()
+        MongoExperimentJob.objects().delete()
+
+    def tearDown(self) -> None:
+        MongoExperimentJob.objects().delete()
+        super().tearDown()
+
+    def submit(self, experiment: str, priority: int = 0, max_attempts: int = 1) -> MongoExperimentJob:
+        return MongoExperimentJob.submit(self.owner, self.workspace, experiment, priority, max_attempts)
+
+    def expire_lease(self, job: MongoExperimentJob):
+        MongoExperimentJob.objects(id=job.id).update_one(set__lease_expires=datetime.utcnow() - timedelta(seconds=1))
+
+    def test_claim_order(self):
+        first = self.submit('first')
+        second = self.submit('second')
+        urgent = self.submit('urgent', priority=10)
+        self.assertEqual(first.position(), 1)
+        self.assertEqual(urgent.position(), 0)
+        claimed = [MongoExperimentJob.claim(self.node, self.lease).experiment for _ in range(3)]
+        self.assertEqual(claimed, ['urgent', 'first', 'second'])
+        self.assertIsNone(MongoExperimentJob.claim(self.node, self.lease))
+        self.assertIsNone(MongoExperimentJob.get_by_id(second.id).position())
+
+    def test_claim_takes_a_lease(self):
+        self.submit('experiment')
+        job = MongoExperimentJob.claim(self.node, self.lease)
+        self.assertEqual(job.status, MongoExperimentJob.RUNNING)
+        self.assertEqual(job.node, self.node)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.lease_expires, datetime.utcnow())
+
+    def test_renew_only_by_holder(self):
+        self.submit('experiment')
+        job = MongoExperimentJob.claim(self.node, self.lease)
+        self.assertTrue(job.renew(self.node, self.lease))
+        self.assertFalse(job.renew('node-b', self.lease))
+        self.assertFalse(job.complete('node-b', success=True))
+        self.assertTrue(job.complete(self.node, success=True))
+        self.assertEqual(MongoExperimentJob.get_by_id(job.id).status, MongoExperimentJob.SUCCEEDED)
+        self.assertFalse(job.renew(self.node, self.lease))
+
+    def test_expired_lease_is_requeued(self):
+        self.submit('experiment', max_attempts=2)
+        job = MongoExperimentJob.claim(self.node, self.lease)
+        self.expire_lease(job)
+        self.assertEqual(MongoExperimentJob.requeue_expired(), 1)
+        job = MongoExperimentJob.get_by_id(job.id)
+        self.assertEqual(job.status, MongoExperimentJob.QUEUED)
+        self.assertIsNone(job.node)
+        # the previous holder has lost the job
+        self.assertFalse(job.renew(self.node, self.lease))
+        job = MongoExperimentJob.claim('node-b', self.lease)
+        self.assertEqual((job.node, job.attempts), ('node-b', 2))
+
+    def test_expired_lease_without_attempts_fails(self):
+        self.submit('experiment', max_attempts=1)
+        job = MongoExperimentJob.claim(self.node, self.lease)
+        self.expire_lease(job)
+        self.assertEqual(MongoExperimentJob.requeue_expired(), 0)
+        job = MongoExperimentJob.get_by_id(job.id)
+        self.assertEqual(job.status, MongoExperimentJob.FAILED)
+        self.assertEqual(job.error, "Lease expired")
+
+    def test_failed_run_is_retried_after_backoff(self):
+        self.submit('experiment', max_attempts=2)
+        job = MongoExperimentJob.claim(self.node, self.lease)
+        self.assertTrue(job.complete(self.node, success=False, error="boom", backoff=3600))
+        job = MongoExperimentJob.get_by_id(job.id)
+        self.assertEqual((job.status, job.error), (MongoExperimentJob.QUEUED, "boom"))
+        self.assertIsNone(MongoExperimentJob.claim(self.node, self.lease))     # not before the backoff
+        MongoExperimentJob.objects(id=job.id).update_one(set__not_before=datetime.utcnow())
+        job = MongoExperimentJob.claim(self.node, self.lease)
+        self.assertTrue(job.complete(self.node, success=False, error="boom again"))
+        self.assertEqual(MongoExperimentJob.get_by_id(job.id).status, MongoExperimentJob.FAILED)
+
+    def test_cancel_only_queued(self):
+        queued = self.submit('queued')
+        running = self.submit('running', priority=1)
+        MongoExperimentJob.claim(self.node, self.lease)
+        self.assertFalse(MongoExperimentJob.get_by_id(running.id).cancel())
+        self.assertTrue(queued.cancel())
+        self.assertEqual(MongoExperimentJob.get_by_id(queued.id).status, MongoExperimentJob.CANCELLED)
+        self.assertIsNone(MongoExperimentJob.claim(self.node, self.lease))
+
+
+class ExperimentQueueTestCase(BaseTestCase):
+    """
+    Runs submitted through the server (with at least one experiment queue consumer).
+    """
+
+    username = 'experiment-queue-username'
+    email = 'experiment_queue_' + EMAIL
+    password = PASSWORD
+    workspace = 'experiment_queue_workspace'
+    host = HOST
+    port = PORT
+    client = BaseClient(host, port)
+    deleted = False
+
+    strategy_name = naive_strategy_name
+    experiment_names = ['queue_experiment_a', 'queue_experiment_b']
+    job_timeout = 600
+
+    benchmark_build = {
+        'name': 'SplitMNIST',
+        'n_experiences': 2,
+        'return_task_id': False,
+        'seed': 0,
+        'eval_transform': {'name': 'EvalMNIST'},
+        'train_transform': {'name': 'TrainMNIST'},
+    }
+
+    model_build = {
+        'name': 'SimpleMLP',
+        'num_classes': 10,
+        'input_size': 1 * 28 * 28,
+        'hidden_layers': 1,
+        'hidden_size': 64,
+    }
+
+    strategy_build = generic_strategy_builder('Naive', STD_MNIST_TRAIN_MB_SIZE, 1, STD_MNIST_EVAL_MB_SIZE)
+
+    def create_resources(self):
+        self.assertBaseHandler(
+            self.client.register(self.username, self.email, self.password), success_codes=HTTPStatus.CREATED,
+        )
+        self.assertBaseHandler(self.client.login(self.username, self.password))
+        self.assertBaseHandler(self.client.create_workspace(self.workspace), success_codes=HTTPStatus.CREATED)
+        created = HTTPStatus.CREATED
+        self.assertBaseHandler(self.client.create_benchmark(benchmark_name, self.benchmark_build), created)
+        self.assertBaseHandler(self.client.create_metric_set(metricset_name, metricset_build), created)
+        self.assertBaseHandler(self.client.create_model(model_name, self.model_build), created)
+        self.assertBaseHandler(self.client.create_optimizer(optimizer_name, sgd_optimizer_build), created)
+        self.assertBaseHandler(self.client.create_criterion(criterion_name, criterion_build), created)
+        self.assertBaseHandler(self.client.create_strategy(self.strategy_name, self.strategy_build), created)
+        for name in self.experiment_names:
+            build = generic_experiment_builder(self.strategy_name, benchmark_name)
+            self.assertBaseHandler(self.client.create_experiment(name, build), created)
+            self.assertBaseHandler(self.client.setup_experiment(name))
+
+    def delete_resources(self):
+        self.client.close_workspace(self.workspace)
+        self.client.delete_workspace(self.workspace)
+        self.client.delete_user()
+        self.deleted = True
+
+    def get_job(self, job_id: str) -> dict:
+        response = self.client.get_experiment_job(job_id)
+        self.assertBaseHandler(response)
+        return response.json()['job']
+
+    def wait_job(self, job_id: str, statuses=('SUCCEEDED', 'FAILED', 'CANCELLED')) -> dict:
+        deadline = time.monotonic() + self.job_timeout
+        while True:
+            job = self.get_job(job_id)
+            if job['status'] in statuses or time.monotonic() > deadline:
+                return job
+            time.sleep(2)
+
+    def test_queue(self):
+        self.deleted = False
+        with self.client.session(self.username, self.workspace):
+            try:
+                self.create_resources()
+                first, second = self.experiment_names
+
+                response = self.client.start_experiment(first)
+                self.assertBaseHandler(response)
+                first_job = response.json()['job']
+                self.assertEqual(first_job['experiment'], first)
+
+                response = self.client.start_experiment(second, priority=5)
+                self.assertBaseHandler(response)
+                second_job = response.json()['job']
+
+                # a queued job can be cancelled, a claimed one cannot
+                response = self.client.cancel_experiment_job(second_job['id'])
+                self.assertBaseHandler(response, success_codes=(HTTPStatus.OK, HTTPStatus.FORBIDDEN))
+                if response.status_code == HTTPStatus.OK:
+                    self.assertEqual(self.get_job(second_job['id'])['status'], 'CANCELLED')
+                else:
+                    self.assertEqual(self.wait_job(second_job['id'])['status'], 'SUCCEEDED')
+
+                job = self.wait_job(first_job['id'])
+                self.assertEqual(job['status'], 'SUCCEEDED')
+                self.assertEqual(job['attempts'], 1)
+                self.assertIsNotNone(job['node'])
+                self.assertBaseHandler(self.client.get_experiment_results(first))
+
+                response = self.client.get_experiment_queue(experiment=first)
+                self.assertBaseHandler(response)
+                self.assertIn(first_job['id'], [job['id'] for job in response.json()['jobs']])
+
+                response = self.client.get_experiment_queue(status='QUEUED')
+                self.assertBaseHandler(response)
+                self.assertEqual(response.json()['jobs'], [])
+
+                # unknown job ids
+                self.assertBaseHandler(self.client.get_experiment_job('0' * 24), HTTPStatus.NOT_FOUND)
+                self.assertBaseHandler(self.client.cancel_experiment_job('not-an-id'), HTTPStatus.NOT_FOUND)
+
+                self.delete_resources()
+            finally:
+                if not self.deleted:
+                    self.delete_resources()
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = [
+    'ExperimentJobTestCase',
+    'ExperimentQueueTestCase',
+]
@@ -0,0 +1,15 @@
+"""
+Unit tests of the prediction serving components (no server required).
+"""
+from .model_cache import *
+from .batching import *
+from .zip_inputs import *
+from .decoding import *
+from .engine import *
+from .result_cache import *
+from .tensors import *
+from .encoding import *
+from .warmup import *
+from .draining import *
+from .latency import *
+from .rate_limits import *
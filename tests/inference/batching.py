@@ -0,0 +1,83 @@
+"""
+Testing on the coalescing and splitting of requests by the micro-batching scheduler.
+"""
+from __future__ import annotations
+import unittest
+
+import torch
+
+from application.inference import BatchScheduler
+
+from tests.utils import *
+
+
+class _SumModel(torch.nn.Module):
+    """
+    Sums the features of each input (so that it accepts any input width), recording the batch sizes it runs on.
+    """
+
+    def __init__(self, fail: bool = False):
+        super().__init__()
+        self.fail = fail
+        self.batch_sizes: list[int] = []
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        self.batch_sizes.append(x.shape[0])
+        if self.fail:
+            raise RuntimeError("forward failed")
+        return x.sum(dim=1, keepdim=True)
+
+
+class BatchSchedulerTestCase(BaseTestCase):
+
+    key = 'batching-test-model'
+
+    def assertOutputs(self, inputs: list[torch.Tensor], futures: list):
+        for item_inputs, future in zip(inputs, futures):
+            self.assertTrue(torch.equal(future.result(timeout=5), item_inputs.sum(dim=1, keepdim=True)))
+
+    def test_concurrent_requests_are_coalesced(self):
+        scheduler = BatchScheduler(max_batch_size=8, max_wait_ms=500)
+        model = _SumModel()
+        inputs = [torch.rand(2, 3) for _ in range(4)]
+        futures = [scheduler.submit(self.key, model, item_inputs) for item_inputs in inputs]
+        self.assertOutputs(inputs, futures)
+        self.assertEqual(model.batch_sizes, [8])
+
+    def test_batches_are_split_at_max_batch_size(self):
+        scheduler = BatchScheduler(max_batch_size=4, max_wait_ms=500)
+        model = _SumModel()
+        inputs = [torch.rand(2, 3), torch.rand(2, 3), torch.rand(3, 3)]
+        futures = [scheduler.submit(self.key, model, item_inputs) for item_inputs in inputs]
+        self.assertOutputs(inputs, futures)
+        # requests are never split, and the one that does not fit goes into the next batch
+        self.assertEqual(model.batch_sizes, [4, 3])
+
+    def test_incompatible_shapes_are_not_coalesced(self):
+        scheduler = BatchScheduler(max_batch_size=8, max_wait_ms=100)
+        model = _SumModel()
+        inputs = [torch.rand(1, 3), torch.rand(1, 5), torch.rand(1, 3)]
+        futures = [scheduler.submit(self.key, model, item_inputs) for item_inputs in inputs]
+        self.assertOutputs(inputs, futures)
+        self.assertEqual(sorted(model.batch_sizes), [1, 2])
+
+    def test_large_requests_are_not_batched(self):
+        scheduler = BatchScheduler(max_batch_size=4)
+        model = _SumModel()
+        inputs = torch.rand(4, 3)
+        self.assertTrue(torch.equal(scheduler.run(model, inputs, key=self.key), inputs.sum(dim=1, keepdim=True)))
+        self.assertNotIn(self.key, scheduler.batchers)
+
+    def test_errors_reach_all_requests_of_a_batch(self):
+        scheduler = BatchScheduler(max_batch_size=4, max_wait_ms=500)
+        model = _SumModel(fail=True)
+        futures = [scheduler.submit(self.key, model, torch.rand(2, 3)) for _ in range(2)]
+        for future in futures:
+            self.assertIsInstance(future.exception(timeout=5), RuntimeError)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['BatchSchedulerTestCase']
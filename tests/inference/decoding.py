@@ -0,0 +1,75 @@
+"""
+Testing on the shared decode pool of prediction inputs.
+"""
+from __future__ import annotations
+import threading
+import unittest
+
+import torch
+
+from application.inference import DecodePool
+
+from tests.utils import *
+
+
+def _decode(data: bytes) -> torch.Tensor:
+    return torch.tensor(list(data), dtype=torch.float32)
+
+
+class DecodePoolTestCase(BaseTestCase):
+
+    items = [bytes([i, i + 1]) for i in range(10)]
+
+    def tearDown(self) -> None:
+        self.pool.shutdown(wait=True)
+        super().tearDown()
+
+    def test_threads(self):
+        self.pool = DecodePool(workers=4)
+        threads = set()
+
+        def decode(data: bytes) -> torch.Tensor:
+            threads.add(threading.current_thread().name)
+            return _decode(data)
+
+        batch = self.pool.submit(decode, self.items).result()
+        self.assertTrue(torch.equal(batch, torch.stack([_decode(item) for item in self.items])))    # input order
+        self.assertTrue(all(name.startswith('decode') for name in threads))
+        self.assertEqual(self.pool.stats(), {'workers': 4, 'pool_type': 'thread', 'started': True, 'items': 10})
+
+    def test_synchronous(self):
+        self.pool = DecodePool(workers=0)
+        threads = set()
+
+        def decode(data: bytes) -> torch.Tensor:
+            threads.add(threading.current_thread())
+            return _decode(data)
+
+        batch = self.pool.submit(decode, self.items).result()
+        self.assertEqual(tuple(batch.shape), (10, 2))
+        self.assertEqual(threads, {threading.current_thread()})
+        self.assertFalse(self.pool.stats()['started'])
+
+    def test_timings(self):
+        self.pool = DecodePool(workers=2)
+        timings = {}
+        self.pool.submit(_decode, self.items[:5]).result(timings)
+        self.pool.submit(_decode, self.items[5:]).result(timings)
+        self.assertEqual(set(timings.keys()), {'decode', 'decode_wait'})
+        self.assertTrue(all(value >= 0 for value in timings.values()))
+
+    def test_errors(self):
+        self.pool = DecodePool(workers=2)
+
+        def decode(data: bytes) -> torch.Tensor:
+            raise ValueError('Corrupted input')
+
+        with self.assertRaises(ValueError):
+            self.pool.submit(decode, self.items).result()
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['DecodePoolTestCase']
@@ -0,0 +1,51 @@
+"""
+Testing on the retirement of replaced model versions once their in-flight requests have drained.
+"""
+from __future__ import annotations
+import threading
+import unittest
+
+from application.inference import InflightTracker, RetiredVersionError
+
+from tests.utils import *
+
+
+class InflightTrackerTestCase(BaseTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tracker = InflightTracker(drain_timeout=5, retire_delay=0)
+        self.retired = threading.Event()
+
+    def test_retire_after_drain(self):
+        with self.tracker.track('v1'):
+            thread = self.tracker.retire('v1', self.retired.set)
+            self.assertFalse(self.retired.wait(timeout=0.2))
+            self.assertEqual(self.tracker.stats()['inflight'], {'v1': 1})
+        thread.join(timeout=5)
+        self.assertTrue(self.retired.is_set())
+        self.assertEqual(self.tracker.stats()['inflight'], {})
+        self.assertEqual(self.tracker.stats()['retiring'], [])
+
+    def test_retired_version_is_not_tracked(self):
+        self.tracker.retire('v1', self.retired.set).join(timeout=5)
+        self.assertTrue(self.retired.is_set())
+        with self.assertRaises(RetiredVersionError):
+            with self.tracker.track('v1'):
+                pass
+        self.assertEqual(self.tracker.stats()['inflight'], {})
+        with self.tracker.track('v2'):     # other versions are not affected
+            self.assertEqual(self.tracker.stats()['inflight'], {'v2': 1})
+
+    def test_drain_timeout(self):
+        self.tracker.drain_timeout = 0.1
+        with self.tracker.track('v1'):
+            self.tracker.retire('v1', self.retired.set).join(timeout=5)
+            self.assertTrue(self.retired.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['InflightTrackerTestCase']
@@ -0,0 +1,63 @@
+"""
+Testing on the binary encodings ('npy' and 'msgpack') of prediction results.
+"""
+from __future__ import annotations
+import io
+import struct
+import unittest
+
+import msgpack
+import numpy as np
+
+from application.inference import JSON, NPY, MSGPACK, results_to_npy, results_to_msgpack, validate_response_format
+
+from tests.utils import *
+
+
+class ResultEncodingTestCase(BaseTestCase):
+
+    files = ['a.png', 'dir/long_name.png']
+
+    def test_npy_class_ids(self):
+        array = np.load(io.BytesIO(results_to_npy(self.files, [3, 7])))
+        self.assertEqual(list(array['file']), self.files)
+        self.assertEqual(list(array['class_id']), [3, 7])
+
+    def test_npy_top_k(self):
+        class_ids, scores = [[3, 1], [7, 0]], [[0.75, 0.25], [0.5, 0.125]]
+        array = np.load(io.BytesIO(results_to_npy(self.files, class_ids, scores)))
+        self.assertEqual(array['class_ids'].tolist(), class_ids)
+        self.assertEqual(array['scores'].tolist(), scores)
+
+    def test_npy_empty(self):
+        array = np.load(io.BytesIO(results_to_npy([], [])))
+        self.assertEqual(len(array), 0)
+
+    def test_msgpack_length_prefix(self):
+        data = results_to_msgpack(self.files, [[3, 1], [7, 0]], [[0.75, 0.25], [0.5, 0.125]], timings={'total': 0.5})
+        length, = struct.unpack('>I', data[:4])
+        self.assertEqual(length, len(data) - 4)
+        payload = msgpack.unpackb(data[4:], raw=False)
+        self.assertEqual(payload['files'], self.files)
+        self.assertEqual(payload['class_ids'], [[3, 1], [7, 0]])
+        self.assertEqual(payload['scores'], [[0.75, 0.25], [0.5, 0.125]])
+        self.assertEqual(payload['timings'], {'total': 0.5})
+
+    def test_msgpack_without_scores(self):
+        payload = msgpack.unpackb(results_to_msgpack(self.files, [3, 7])[4:], raw=False)
+        self.assertIsNone(payload['scores'])
+        self.assertIsNone(payload['timings'])
+
+    def test_response_formats(self):
+        validate_response_format(JSON)
+        validate_response_format(NPY)
+        validate_response_format(MSGPACK)
+        with self.assertRaises(ValueError):
+            validate_response_format('xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['ResultEncodingTestCase']
@@ -0,0 +1,96 @@
+"""
+Testing on the execution of forward passes and the post-processing of their outputs.
+"""
+from __future__ import annotations
+import unittest
+
+import torch
+
+from application.inference import inference_engine
+
+from tests.utils import *
+
+
+class _ModeModel(torch.nn.Module):
+    """
+    Records the autograd and training mode of its forward passes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.linear = torch.nn.Linear(4, 3)
+        self.modes = []
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        self.modes.append((torch.is_inference_mode_enabled(), self.training))
+        return self.linear(x)
+
+
+class _MultiHeadModel(torch.nn.Module):
+    """
+    Multi-task model whose head t has t + 2 classes and adds t to its inputs' mean.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.task_labels = []
+
+    def forward(self, x: torch.Tensor, task_label: int) -> torch.Tensor:
+        self.task_labels.append(task_label)
+        return (x.mean(1, keepdim=True) + task_label).repeat(1, task_label + 2)
+
+
+class InferenceEngineTestCase(BaseTestCase):
+
+    logits = torch.tensor([[0.0, 2.0, 1.0], [3.0, 0.0, 1.0]])
+
+    def test_forward(self):
+        model = _ModeModel()
+        outputs = inference_engine.forward(model, torch.rand(2, 4))
+        self.assertEqual(model.modes, [(True, False)])
+        self.assertFalse(outputs.requires_grad)
+        self.assertEqual(inference_engine.device(model), torch.device('cpu'))
+
+    def test_argmax(self):
+        class_ids, scores = inference_engine.postprocess(self.logits)
+        self.assertEqual(class_ids.tolist(), [1, 0])
+        self.assertIsNone(scores)
+
+    def test_top_k(self):
+        class_ids, scores = inference_engine.postprocess(self.logits, top_k=2)
+        self.assertEqual(class_ids.tolist(), [[1, 2], [0, 2]])
+        expected = torch.softmax(self.logits, dim=1).sort(dim=1, descending=True).values[:, :2]
+        self.assertTrue(torch.allclose(scores, expected))
+
+    def test_top_k_clamped(self):
+        class_ids, scores = inference_engine.postprocess(self.logits, top_k=10)
+        self.assertEqual(tuple(class_ids.shape), (2, 3))
+        self.assertTrue(torch.allclose(scores.sum(1), torch.ones(2)))
+
+    def test_task_labels(self):
+        model = _MultiHeadModel()
+        inputs = torch.arange(4, dtype=torch.float32).unsqueeze(1)
+        outputs = inference_engine.forward(model, inputs, torch.tensor([1, 0, 1, 0]))
+        self.assertEqual(sorted(model.task_labels), [0, 1])     # a single forward per task label
+        self.assertEqual(tuple(outputs.shape), (4, 3))
+        self.assertEqual(outputs[:, 0].tolist(), [1.0, 1.0, 3.0, 3.0])    # original order
+        self.assertEqual(outputs[:, 2].tolist(), [1.0, float('-inf'), 3.0, float('-inf')])
+
+    def test_single_task_label(self):
+        model = _MultiHeadModel()
+        outputs = inference_engine.forward(model, torch.ones(3, 2), torch.tensor([2, 2, 2]))
+        self.assertEqual(model.task_labels, [2])
+        self.assertEqual(tuple(outputs.shape), (3, 4))
+
+    def test_unsupported_task_labels(self):
+        model = _MultiHeadModel()
+        model.multi_task = False
+        with self.assertRaises(ValueError):
+            inference_engine.forward(model, torch.ones(2, 2), torch.tensor([0, 1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['InferenceEngineTestCase']
@@ -0,0 +1,83 @@
+"""
+Testing on the percentiles of latency histograms and their aggregation per stage.
+"""
+from __future__ import annotations
+import unittest
+
+from application.inference import LatencyHistogram, LatencyRecorder, RequestSpans
+
+from tests.utils import *
+
+
+class LatencyHistogramTestCase(BaseTestCase):
+
+    precision = 0.01
+
+    def test_empty(self):
+        histogram = LatencyHistogram(self.precision)
+        self.assertIsNone(histogram.percentile(50))
+        self.assertIsNone(histogram.summary()['mean'])
+
+    def test_percentiles_are_bounded_upper_estimates(self):
+        histogram = LatencyHistogram(self.precision)
+        values = [i / 1000 for i in range(1, 1001)]     # 1 ms ... 1 s
+        for value in reversed(values):
+            histogram.record(value)
+        for q in (1, 50, 90, 95, 99, 100):
+            exact = values[max(1, -(-len(values) * q // 100)) - 1]
+            estimate = histogram.percentile(q)
+            self.assertGreaterEqual(estimate, exact)
+            self.assertLessEqual(estimate, exact * (1 + self.precision) ** 2)
+
+    def test_percentiles_do_not_exceed_max(self):
+        histogram = LatencyHistogram(self.precision)
+        for _ in range(10):
+            histogram.record(0.25)
+        self.assertEqual(histogram.percentile(0), 0.25)
+        self.assertEqual(histogram.percentile(100), 0.25)
+
+    def test_values_below_resolution(self):
+        histogram = LatencyHistogram(self.precision)
+        histogram.record(0.0)
+        histogram.record(1e-9)
+        self.assertEqual(histogram.count, 2)
+        self.assertLessEqual(histogram.percentile(100), 1e-9)
+
+    def test_summary(self):
+        histogram = LatencyHistogram(self.precision)
+        for value in (0.1, 0.2, 0.3):
+            histogram.record(value)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 3)
+        self.assertAlmostEqual(summary['mean'], 0.2)
+        self.assertEqual(summary['max'], 0.3)
+
+
+class LatencyRecorderTestCase(BaseTestCase):
+
+    def test_record_and_reset(self):
+        recorder = LatencyRecorder()
+        recorder.record('urn:a', {'load': 0.01, 'predict': 0.02})
+        recorder.record('urn:a', {'predict': 0.04})
+        stages = recorder.stats()['keys']['urn:a']
+        self.assertEqual(stages['load']['count'], 1)
+        self.assertEqual(stages['predict']['count'], 2)
+        recorder.reset()
+        self.assertEqual(recorder.stats()['keys'], {})
+
+    def test_spans_are_summed_per_stage(self):
+        spans = RequestSpans('urn:a')
+        spans.add('decode', 0.001)
+        spans.update({'decode': 0.002, 'forward': 0.003}, prefix='')
+        self.assertAlmostEqual(spans.spans['decode'], 0.003)
+        self.assertEqual(spans.server_timing(), 'decode;dur=3.000, forward;dur=3.000')
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = [
+    'LatencyHistogramTestCase',
+    'LatencyRecorderTestCase',
+]
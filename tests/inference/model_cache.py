@@ -0,0 +1,107 @@
+"""
+Testing on the bounds and eviction order of the model cache.
+"""
+from __future__ import annotations
+import unittest
+
+from application.inference import ModelCache
+
+from tests.utils import *
+
+
+class _SizedModel:
+    """
+    Stand-in for a model of another backend, whose size is given by its size_bytes attribute.
+    """
+
+    def __init__(self, size_bytes: int):
+        self.size_bytes = size_bytes
+
+
+class ModelCacheTestCase(BaseTestCase):
+
+    def test_max_entries(self):
+        cache = ModelCache(max_entries=2, max_bytes=1000)
+        cache.put('a', _SizedModel(10))
+        cache.put('b', _SizedModel(10))
+        cache.get('a')      # 'b' becomes the least recently used
+        cache.put('c', _SizedModel(10))
+        self.assertEqual(cache.stats()['keys'], ['a', 'c'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_max_bytes(self):
+        cache = ModelCache(max_entries=10, max_bytes=100)
+        cache.put('a', _SizedModel(40))
+        cache.put('b', _SizedModel(40))
+        cache.put('c', _SizedModel(40))
+        self.assertEqual(cache.stats()['keys'], ['b', 'c'])
+        self.assertEqual(cache.current_bytes, 80)
+
+    def test_oversized_model_is_not_cached(self):
+        cache = ModelCache(max_entries=10, max_bytes=100)
+        cache.put('a', _SizedModel(40))
+        model = _SizedModel(200)
+        self.assertIs(cache.put('b', model), model)
+        self.assertEqual(cache.stats()['keys'], ['a'])
+        self.assertEqual(cache.current_bytes, 40)
+
+    def test_version_mismatch_is_a_miss(self):
+        cache = ModelCache()
+        model = cache.put('a', _SizedModel(10), version=1)
+        self.assertIs(cache.get('a', version=1), model)
+        self.assertIsNone(cache.get('a', version=2))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_get_or_load_loads_once(self):
+        cache = ModelCache()
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return _SizedModel(10)
+
+        first = cache.get_or_load('a', loader, version=1)
+        second = cache.get_or_load('a', loader, version=1)
+        self.assertIs(first, second)
+        self.assertEqual(len(loads), 1)
+
+    def test_invalidate_prefix(self):
+        cache = ModelCache()
+        cache.put('urn:a', _SizedModel(10))
+        cache.put('urn:a:quantized', _SizedModel(10))
+        cache.put('urn:b', _SizedModel(10))
+        self.assertEqual(cache.invalidate_prefix('urn:a:'), 1)
+        self.assertEqual(cache.stats()['keys'], ['urn:a', 'urn:b'])
+        self.assertEqual(cache.current_bytes, 20)
+
+    def test_namespace_budget(self):
+        cache = ModelCache(max_entries=10, max_bytes=1000)
+        cache.set_budget('executions', 50)
+        cache.put('deployment', _SizedModel(40))
+        cache.put('exec:1', _SizedModel(30), namespace='executions')
+        cache.put('exec:2', _SizedModel(30), namespace='executions')
+        # only the namespace over budget evicts, and its own least recently used entry
+        self.assertEqual(cache.stats()['keys'], ['deployment', 'exec:2'])
+        self.assertEqual(cache.stats()['namespaces']['executions'], {'bytes': 30, 'max_bytes': 50})
+
+    def test_namespace_budget_caps_entry_size(self):
+        cache = ModelCache(max_entries=10, max_bytes=1000)
+        cache.set_budget('executions', 50)
+        cache.put('exec:1', _SizedModel(60), namespace='executions')
+        cache.put('deployment', _SizedModel(60))
+        self.assertEqual(cache.stats()['keys'], ['deployment'])
+
+    def test_lowering_budget_shrinks_namespace(self):
+        cache = ModelCache(max_entries=10, max_bytes=1000)
+        cache.put('exec:1', _SizedModel(30), namespace='executions')
+        cache.put('exec:2', _SizedModel(30), namespace='executions')
+        cache.set_budget('executions', 40)
+        self.assertEqual(cache.stats()['keys'], ['exec:2'])
+        self.assertEqual(cache.current_bytes, 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['ModelCacheTestCase']
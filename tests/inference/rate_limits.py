@@ -0,0 +1,93 @@
+"""
+Testing on token buckets and per-deployment concurrency caps of the rate limiter.
+"""
+from __future__ import annotations
+import unittest
+from unittest import mock
+
+from application.routes.auth import limits
+from application.routes.auth import TokenBucket, RateLimiter
+
+from tests.utils import *
+
+
+class _Clock:
+    """
+    Manually advanced replacement of time.monotonic().
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TokenBucketTestCase(BaseTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.clock = _Clock()
+        patcher = mock.patch.object(limits.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=1.0, burst=3.0)
+        self.assertEqual([bucket.acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.acquire(), 1.0)
+
+    def test_refill(self):
+        bucket = TokenBucket(rate=2.0, burst=2.0)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertAlmostEqual(bucket.acquire(), 0.5)
+        self.clock.now += 0.25
+        self.assertAlmostEqual(bucket.acquire(), 0.25)
+        self.clock.now += 0.25
+        self.assertEqual(bucket.acquire(), 0.0)
+
+    def test_refill_is_capped_at_burst(self):
+        bucket = TokenBucket(rate=10.0, burst=2.0)
+        self.clock.now += 60
+        self.assertEqual(bucket.refill(), 2.0)
+        self.assertEqual([bucket.acquire() for _ in range(2)], [0.0, 0.0])
+        self.assertGreater(bucket.acquire(), 0.0)
+
+
+class RateLimiterTestCase(BaseTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.clock = _Clock()
+        patcher = mock.patch.object(limits.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_limits_are_per_user_and_class(self):
+        limiter = RateLimiter(enabled=True, limits={RateLimiter.PREDICT: (1.0, 1.0), RateLimiter.UPLOAD: (0, 0)})
+        self.assertEqual(limiter.acquire('alice', RateLimiter.PREDICT), 0.0)
+        self.assertGreater(limiter.acquire('alice', RateLimiter.PREDICT), 0.0)
+        self.assertEqual(limiter.acquire('bob', RateLimiter.PREDICT), 0.0)
+        for _ in range(10):     # no limit
+            self.assertEqual(limiter.acquire('alice', RateLimiter.UPLOAD), 0.0)
+
+    def test_concurrency_slots(self):
+        limiter = RateLimiter(enabled=True, max_concurrency=1)
+        with limiter.slot('urn:a') as first:
+            self.assertTrue(first)
+            with limiter.slot('urn:a') as second:
+                self.assertFalse(second)
+            with limiter.slot('urn:b') as other:
+                self.assertTrue(other)
+        self.assertEqual(limiter.stats()['active'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = [
+    'TokenBucketTestCase',
+    'RateLimiterTestCase',
+]
@@ -0,0 +1,109 @@
+"""
+Testing on the content-addressed cache of prediction results: hits, order of partially
+cached results and invalidation of the results of a model.
+"""
+from __future__ import annotations
+import io
+import unittest
+
+import torch
+from werkzeug.datastructures import FileStorage
+
+from application.inference import PredictionResultCache, predict_files
+
+from tests.utils import *
+
+
+def _one_hot(data: bytes) -> torch.Tensor:
+    """
+    Transform of test inputs: the first byte of a file is its class id.
+    """
+    return torch.nn.functional.one_hot(torch.tensor(data[0]), 10).float()
+
+
+class _IdentityModel(torch.nn.Module):
+    """
+    Returns its inputs as logits, recording the inputs it runs on.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.forwarded = 0
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        self.forwarded += x.shape[0]
+        return x
+
+
+class ResultCacheTestCase(BaseTestCase):
+
+    namespace = 'urn:result-cache-test'
+    separator = ':'
+    inputs = {'a.png': 3, 'b.png': 7, 'c.png': 1}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.cache = PredictionResultCache(enabled=True, max_entries=100)
+        self.model = _IdentityModel()
+
+    def predict(self, names: list[str], namespace: str = namespace, version=('model.pt', 1), top_k: int = None):
+        files = [FileStorage(stream=io.BytesIO(bytes([self.inputs[name]])), filename=name) for name in names]
+        scope = self.cache.scope(namespace, version, 'transform', top_k=top_k)
+        scores = {} if top_k is not None else None
+        result = predict_files(self.model, files, _one_hot, chunk_size=2, top_k=top_k, scores=scores, result_cache=scope)
+        return result, scores
+
+    def test_disabled(self):
+        self.assertIsNone(PredictionResultCache(enabled=False).scope(self.namespace, 1, 'transform'))
+
+    def test_hits_skip_forward(self):
+        names = list(self.inputs.keys())
+        first, _ = self.predict(names)
+        self.assertEqual(first, self.inputs)
+        self.assertEqual(self.model.forwarded, 3)
+        second, _ = self.predict(names)
+        self.assertEqual(second, first)
+        self.assertEqual(self.model.forwarded, 3)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (3, 3, 3))
+
+    def test_partially_cached_results_keep_input_order(self):
+        self.predict(['b.png'])
+        result, _ = self.predict(['a.png', 'b.png', 'c.png'])
+        self.assertEqual(list(result.keys()), ['a.png', 'b.png', 'c.png'])
+        self.assertEqual(result, self.inputs)
+        self.assertEqual(self.model.forwarded, 3)     # b.png only once
+
+    def test_scores_are_cached(self):
+        first, first_scores = self.predict(['a.png', 'b.png'], top_k=2)
+        second, second_scores = self.predict(['a.png', 'b.png'], top_k=2)
+        self.assertEqual(self.model.forwarded, 2)
+        self.assertEqual(second, first)
+        self.assertEqual(second_scores, first_scores)
+        self.assertEqual(first['a.png'][0], 3)
+        self.predict(['a.png'])     # results without top_k are cached separately
+        self.assertEqual(self.model.forwarded, 3)
+
+    def test_new_version_misses(self):
+        self.predict(['a.png'])
+        self.predict(['a.png'], version=('model.pt', 2))
+        self.assertEqual(self.model.forwarded, 2)
+
+    def test_invalidation(self):
+        variant = self.namespace + self.separator + 'quantized'
+        other = 'urn:other-model'
+        for namespace in (self.namespace, variant, other):
+            self.predict(['a.png'], namespace=namespace)
+        self.assertEqual(self.cache.invalidate(self.namespace, self.separator), 2)
+        self.assertEqual(self.cache.stats()['entries'], 1)
+        forwarded = self.model.forwarded
+        self.predict(['a.png'])
+        self.predict(['a.png'], namespace=other)
+        self.assertEqual(self.model.forwarded, forwarded + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['ResultCacheTestCase']
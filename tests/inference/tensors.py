@@ -0,0 +1,87 @@
+"""
+Testing on the decoding of raw tensor and '.npy' prediction inputs.
+"""
+from __future__ import annotations
+import io
+import unittest
+
+import numpy as np
+import torch
+
+from application.inference import NPY, RAW, tensor_from_bytes
+
+from tests.utils import *
+
+
+def _npy_bytes(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+class TensorInputsTestCase(BaseTestCase):
+
+    shape = [3, 4, 4]
+
+    def test_npy_single_input(self):
+        array = np.random.rand(*self.shape).astype(np.float32)
+        tensor, batched = tensor_from_bytes(_npy_bytes(array), NPY, shape=self.shape)
+        self.assertFalse(batched)
+        self.assertTrue(np.array_equal(tensor.numpy(), array))
+
+    def test_npy_batch(self):
+        array = np.random.rand(5, *self.shape).astype(np.float32)
+        tensor, batched = tensor_from_bytes(_npy_bytes(array), NPY, shape=self.shape)
+        self.assertTrue(batched)
+        self.assertEqual(tuple(tensor.shape), (5, *self.shape))
+
+    def test_npy_shape_mismatch(self):
+        array = np.random.rand(5, 3, 8, 8).astype(np.float32)
+        with self.assertRaises(ValueError):
+            tensor_from_bytes(_npy_bytes(array), NPY, shape=self.shape)
+
+    def test_npy_fortran_order(self):
+        array = np.asfortranarray(np.random.rand(2, *self.shape).astype(np.float32))
+        tensor, _ = tensor_from_bytes(_npy_bytes(array), NPY, shape=self.shape)
+        self.assertTrue(np.array_equal(tensor.numpy(), array))
+
+    def test_npy_is_converted_to_float32(self):
+        array = np.random.rand(2, *self.shape)     # float64
+        tensor, _ = tensor_from_bytes(_npy_bytes(array), NPY, shape=self.shape)
+        self.assertEqual(tensor.dtype, torch.float32)
+        self.assertTrue(np.allclose(tensor.numpy(), array))
+
+    def test_npy_unsupported_dtype(self):
+        array = np.zeros((2, *self.shape), dtype=bool)
+        with self.assertRaises(ValueError):
+            tensor_from_bytes(_npy_bytes(array), NPY, shape=self.shape)
+
+    def test_raw_batch(self):
+        array = np.random.rand(3, *self.shape).astype(np.float32)
+        tensor, batched = tensor_from_bytes(array.tobytes(), RAW, shape=self.shape)
+        self.assertTrue(batched)
+        self.assertTrue(np.array_equal(tensor.numpy(), array))
+
+    def test_raw_is_converted_to_float32(self):
+        array = np.random.randint(0, 256, size=(2, *self.shape), dtype=np.uint8)
+        tensor, _ = tensor_from_bytes(array.tobytes(), RAW, shape=self.shape, dtype='uint8')
+        self.assertEqual(tensor.dtype, torch.float32)
+        self.assertTrue(np.array_equal(tensor.numpy(), array.astype(np.float32)))
+
+    def test_raw_errors(self):
+        data = np.zeros(self.shape, dtype=np.float32).tobytes()
+        with self.assertRaises(ValueError):    # no shape
+            tensor_from_bytes(data, RAW)
+        with self.assertRaises(ValueError):    # unknown dtype
+            tensor_from_bytes(data, RAW, shape=self.shape, dtype='complex64')
+        with self.assertRaises(ValueError):    # not a multiple of the input size
+            tensor_from_bytes(data[:-4], RAW, shape=self.shape)
+        with self.assertRaises(ValueError):    # unknown format
+            tensor_from_bytes(data, 'jpeg', shape=self.shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['TensorInputsTestCase']
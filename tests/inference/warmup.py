@@ -0,0 +1,68 @@
+"""
+Testing on the preloading and warm-up of deployed models.
+"""
+from __future__ import annotations
+import unittest
+
+import torch
+
+from application.inference import DeploymentWarmer
+
+from tests.utils import *
+
+
+class _ShapeModel(torch.nn.Module):
+    """
+    Records the shapes of the inputs it runs on.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.shapes = []
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        self.shapes.append(tuple(x.shape))
+        return x.flatten(1)
+
+
+class DeploymentWarmerTestCase(BaseTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.warmer = DeploymentWarmer(iterations=3)
+
+    def test_warm(self):
+        model = _ShapeModel()
+        record = self.warmer.warm('urn:model', lambda: model, input_shape=[1, 2, 2], batch_size=4)
+        self.assertEqual(model.shapes, [(4, 1, 2, 2)] * 3)
+        self.assertIsNone(record['error'])
+        for stage in ('load', 'first_forward', 'forward'):
+            self.assertGreaterEqual(record[stage], 0)
+        self.assertEqual(self.warmer.stats()['models']['urn:model']['input_shape'], [1, 2, 2])
+
+    def test_load_only(self):
+        model = _ShapeModel()
+        record = self.warmer.warm('urn:model', lambda: model)
+        self.assertEqual(model.shapes, [])
+        self.assertIsNotNone(record['load'])
+        self.assertIsNone(record['first_forward'])
+
+    def test_error(self):
+        def loader():
+            raise FileNotFoundError('Missing model file')
+
+        record = self.warmer.warm('urn:model', loader, input_shape=[2])
+        self.assertEqual(record['error'], 'FileNotFoundError: Missing model file')
+        self.assertIsNone(record['load'])
+
+    def test_forget(self):
+        self.warmer.warm('urn:model', _ShapeModel)
+        self.warmer.forget('urn:model')
+        self.assertEqual(self.warmer.stats()['models'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['DeploymentWarmerTestCase']
@@ -0,0 +1,98 @@
+"""
+Testing on the streaming of zip archives of prediction inputs.
+"""
+from __future__ import annotations
+import io
+import unittest
+import zipfile
+
+import torch
+from werkzeug.datastructures import FileStorage
+
+from application.inference import iter_zip_members, predict_files
+
+from tests.utils import *
+
+
+def _one_hot(data: bytes) -> torch.Tensor:
+    """
+    Transform of test inputs: the first byte of a file is its class id.
+    """
+    return torch.nn.functional.one_hot(torch.tensor(data[0]), 10).float()
+
+
+class _IdentityModel(torch.nn.Module):
+    """
+    Returns its inputs as logits, recording the batch sizes it runs on.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        self.batch_sizes.append(x.shape[0])
+        return x
+
+
+def _zip_upload(members: dict[str, bytes]) -> FileStorage:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for name, data in members.items():
+            zipf.writestr(name, data)
+    buffer.seek(0)
+    return FileStorage(stream=buffer, filename='files.zip')
+
+
+class _UnseekableStream(io.RawIOBase):
+
+    def __init__(self, data: bytes):
+        self.buffer = io.BytesIO(data)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def readinto(self, b) -> int:
+        data = self.buffer.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class ZipInputsTestCase(BaseTestCase):
+
+    members = {'a.png': bytes([3]), 'dir/b.png': bytes([7]), 'dir/sub/c.png': bytes([1])}
+
+    def test_members(self):
+        archive = _zip_upload({'dir/': b'', **self.members})
+        self.assertEqual(list(iter_zip_members(archive)), list(self.members.items()))    # without directories
+
+    def test_unseekable_stream(self):
+        data = _zip_upload(self.members).stream.read()
+        archive = FileStorage(stream=_UnseekableStream(data), filename='files.zip')
+        self.assertEqual(list(iter_zip_members(archive)), list(self.members.items()))
+
+    def test_predictions(self):
+        model = _IdentityModel()
+        result = predict_files(model, [_zip_upload(self.members)], _one_hot, mode='zip', chunk_size=2)
+        self.assertEqual(list(result.keys()), list(self.members.keys()))
+        self.assertEqual(result, {'a.png': 3, 'dir/b.png': 7, 'dir/sub/c.png': 1})
+        self.assertEqual(model.batch_sizes, [2, 1])
+
+    def test_multiple_archives(self):
+        archives = [_zip_upload({'a.png': bytes([3])}), _zip_upload({'b.png': bytes([7])})]
+        result = predict_files(_IdentityModel(), archives, _one_hot, mode='zip', chunk_size=4)
+        self.assertEqual(result, {'a.png': 3, 'b.png': 7})
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            predict_files(_IdentityModel(), [_zip_upload(self.members)], _one_hot, mode='tar', chunk_size=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+__all__ = ['ZipInputsTestCase']
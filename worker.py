@@ -0,0 +1,53 @@
+"""
+Standalone experiment worker: runs the queued experiment runs outside of the web server,
+connecting to the same MongoDB database and files directory. Any number of workers can be
+started on one or more hosts sharing the files directory; web servers run experiments too
+only if started with EXPERIMENT_QUEUE_CONSUMER=1 (each of their processes being a node).
+
+Usage: python worker.py [--concurrency N] [--node NAME]
+SIGINT/SIGTERM stop claiming new runs and wait for the running ones to complete.
+"""
+import signal
+import argparse
+from application import *
+from application.experiment_queue import experiment_runner
+
+
+class WorkerConfig(MongoConfig):
+    EXPERIMENT_QUEUE_CONSUMER = False   # runs are claimed by serve_forever() in the main thread
+    PREDICTION_PRELOAD_DEPLOYMENTS = False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Runs queued experiment runs.")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="Maximum number of concurrent runs (defaults to EXPERIMENT_NODE_CONCURRENCY).")
+    parser.add_argument('--node', type=str, default=None,
+                        help="Name of this worker in the queue (defaults to EXPERIMENT_NODE_NAME or <host>:<pid>).")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    app = create_app(WorkerConfig)
+    if args.concurrency is not None:
+        experiment_runner.concurrency = args.concurrency
+    if args.node is not None:
+        experiment_runner.node = args.node
+
+    def stop(signum, frame):
+        app.logger.info(f"Experiment worker '{experiment_runner.node}' stopping (waiting for running experiments)")
+        experiment_runner.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    app.logger.info(
+        f"Experiment worker '{experiment_runner.node}' started "
+        f"(concurrency = {experiment_runner.concurrency}, device = '{get_device()}')"
+    )
+    experiment_runner.serve_forever()
+    app.logger.info(f"Experiment worker '{experiment_runner.node}' stopped")
+
+
+if __name__ == '__main__':
+    main()